@@ -9,7 +9,7 @@ def next_move(game):
         message = f"Everyone, it is your turn to vote on the quest."
     elif game.game_stage == GameStage.CompleteQuest:
         players = []
-        for p in game.proposed_quest['players']:
+        for p in game.questers:
             players.append(p.username_link())
         message = f"{', '.join(players)}, you have been sent on a quest."
     elif game.game_stage == GameStage.Assassinate:
@@ -163,10 +163,12 @@ def game_info(game):
     quest_results = ''
     for key in range(0, 5):
         temp = f"{key + 1})"
-        if key > game.round or (key == game.round and game.game_stage not in (GameStage.Assassinate, GameStage.Lost, GameStage.Won)):
+        # a game lost to the hammer never played its last round
+        result = game.count_quest(key) if key <= game.round else None
+        if result is None or (key == game.round and game.game_stage not in (GameStage.Assassinate, GameStage.Lost, GameStage.Won)):
             quest_results = quest_results + "\n" + f"_{temp} {game.get_quester_count(round=key)} questers_"
         else:
-            passed, success, fails = game.count_quest(key)
+            passed, success, fails = result
             quest_results = quest_results + "\n" + f"*{temp} {('Passed' if passed else 'Failed')}* _({success}-{fails})_"
 
     return {
@@ -191,8 +193,8 @@ def quest_participants(game):
             "text": {
                 "type": "mrkdwn",
                 "text": ", ".join(list(map(lambda x: x.username_link(),
-                                           game.proposed_quest['players']))) +
-                        f" {'are' if len(game.proposed_quest['players']) > 1 else 'is'} {'tentatively ' if game.game_stage == GameStage.ChooseQuest else ''}proposed to go on the quest."
+                                           game.questers))) +
+                        f" {'are' if len(game.questers) > 1 else 'is'} {'tentatively ' if game.game_stage == GameStage.ChooseQuest else ''}proposed to go on the quest."
             }
         }
 
@@ -226,28 +228,3 @@ def divider():
     return {
             "type": "divider"
         }
-
-
-def get_game_board(game):
-    sections = [
-        admin(game) if game.debug else None,
-        next_move(game),
-        divider(),
-
-        quest_participants(game) if game.game_stage in [GameStage.VoteOnQuest, GameStage.ChooseQuest] else None,
-
-        vote() if game.game_stage == GameStage.VoteOnQuest
-        else complete_quest() if game.game_stage == GameStage.CompleteQuest
-        else choose_quest(game) if game.game_stage == GameStage.ChooseQuest
-        else assassinate(game) if game.game_stage == GameStage.Assassinate
-        else game_over(game),
-
-        divider(),
-        game_info(game),
-        info(game) if game.message else None,
-        push_down()
-    ]
-    sections = list(filter(None, sections))
-    return sections
-
-
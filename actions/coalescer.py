@@ -0,0 +1,148 @@
+"""Per-channel coalescing of board updates.
+
+A 10 player vote produces 10 near identical boards within a second or so.
+Instead of sending each one, a channel's update waits ``window`` seconds for
+the next click and is replaced by it, so only the latest board goes out. An
+update is never held back more than ``max_delay`` seconds after the first
+click it covers. Only one update per channel is in flight at a time, so a
+slow delivery can't be overtaken by an older board.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from actions import jobs
+from davalon import outbound
+from davalon.ratelimit import RateLimited
+
+logger = logging.getLogger(__name__)
+
+BOARD_UPDATE_WINDOW = getattr(settings, 'BOARD_UPDATE_WINDOW', 0.25)
+BOARD_UPDATE_MAX_DELAY = getattr(settings, 'BOARD_UPDATE_MAX_DELAY', 1.0)
+BOARD_UPDATE_MAX_ATTEMPTS = getattr(settings, 'BOARD_UPDATE_MAX_ATTEMPTS', 4)
+
+
+class PendingUpdate:
+    __slots__ = ('response_url', 'board', 'first', 'due', 'attempts')
+
+    def __init__(self, response_url, board, now, window):
+        self.response_url = response_url
+        self.board = board
+        self.first = now
+        self.due = now + window
+        self.attempts = 0
+
+
+class UpdateCoalescer:
+    def __init__(self, window=BOARD_UPDATE_WINDOW, max_delay=BOARD_UPDATE_MAX_DELAY,
+                 max_attempts=BOARD_UPDATE_MAX_ATTEMPTS, send=jobs.replace_board):
+        self.window = window
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.send = send
+        self._pending = {}
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._pid = None
+        self.submitted = 0
+        self.sent = 0
+
+    def submit(self, channel, response_url, board):
+        now = time.monotonic()
+        with self._condition:
+            self.submitted = self.submitted + 1
+            pending = self._pending.get(channel)
+            if pending:
+                # any response_url from the same message can replace it
+                pending.response_url = response_url
+                pending.board = board
+                pending.due = min(now + self.window, pending.first + self.max_delay)
+            else:
+                self._pending[channel] = PendingUpdate(response_url, board, now, self.window)
+            self._condition.notify()
+        self._start()
+
+    def cancel(self, channel):
+        """Drop the channel's pending update, e.g. when the board is being reposted."""
+        with self._condition:
+            self._pending.pop(channel, None)
+
+    def flush(self):
+        """Make every pending update due now."""
+        now = time.monotonic()
+        with self._condition:
+            for pending in self._pending.values():
+                pending.due = now
+            self._condition.notify()
+
+    def idle(self):
+        with self._condition:
+            return not self._pending and not self._in_flight
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._in_flight = set()
+            thread = threading.Thread(target=self._run, name='board-coalescer', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                ready = [channel for channel, pending in self._pending.items()
+                         if pending.due <= now and channel not in self._in_flight]
+                if not ready:
+                    waiting = [pending.due for channel, pending in self._pending.items()
+                               if channel not in self._in_flight]
+                    self._condition.wait(max(0, min(waiting) - now) if waiting else None)
+                    continue
+                updates = []
+                for channel in ready:
+                    updates.append((channel, self._pending.pop(channel)))
+                    self._in_flight.add(channel)
+
+            for channel, pending in updates:
+                if not outbound.submit(self._deliver, channel, pending, priority=outbound.PRIORITY_INTERACTIVE):
+                    self._done(channel, pending, failed=True)
+
+    def _deliver(self, channel, pending):
+        pending.attempts = pending.attempts + 1
+        try:
+            self.send(pending.response_url, pending.board)
+        except RateLimited as e:
+            pending.attempts = pending.attempts - 1
+            self._done(channel, pending, failed=True, retry_after=e.retry_after)
+        except Exception:
+            logger.warning("board update for %s failed", channel, exc_info=True)
+            self._done(channel, pending, failed=True)
+        else:
+            self._done(channel, pending)
+
+    def _done(self, channel, pending, failed=False, retry_after=None):
+        with self._condition:
+            self._in_flight.discard(channel)
+            if not failed:
+                self.sent = self.sent + 1
+            elif retry_after is not None:
+                # rate limited, whatever is newest goes once Slack lets us
+                newer = self._pending.get(channel)
+                if newer:
+                    newer.due = max(newer.due, time.monotonic() + retry_after)
+                else:
+                    pending.due = time.monotonic() + retry_after
+                    self._pending[channel] = pending
+            elif channel not in self._pending and pending.attempts < self.max_attempts:
+                # nothing newer to send instead, so try this one again
+                pending.due = time.monotonic() + outbound.OUTBOUND_RETRY_DELAY * (2 ** pending.attempts)
+                self._pending[channel] = pending
+            self._condition.notify()
+
+
+coalescer = UpdateCoalescer()
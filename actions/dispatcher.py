@@ -0,0 +1,138 @@
+"""Per-channel serialization of game updates.
+
+Every channel gets a mailbox. Work submitted for a channel is applied strictly
+in arrival order, one item at a time, against the channel's in-memory
+``Game``; different channels are drained in parallel on a shared worker pool.
+Simultaneous votes in one game therefore queue up instead of overwriting each
+other, and a busy game never holds up the others.
+
+The in-memory game is still saved through the game store with its token, so
+if another process changed the game in the meantime the save fails and the
+item is re-applied to a fresh copy. A game missing from the store is
+restored from the game journal.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from botcommands.journal import journal
+from botcommands.store import ConflictError, get_store
+from davalon import metrics
+
+logger = logging.getLogger(__name__)
+
+DISPATCHER_WORKERS = getattr(settings, 'DISPATCHER_WORKERS', 8)
+DISPATCHER_GAMES = getattr(settings, 'DISPATCHER_GAMES', 1000)
+
+
+class ChannelDispatcher:
+    def __init__(self, workers=DISPATCHER_WORKERS, max_games=DISPATCHER_GAMES, store=None):
+        self.max_games = max_games
+        self.store = store or get_store()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatcher')
+        self._mailboxes = {}
+        self._games = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, channel, mutate, on_commit=None):
+        """Queue ``mutate(game)`` for ``channel``.
+
+        ``on_commit(game)`` runs once the result has been saved, still in the
+        channel's turn, so anything it enqueues keeps the channel's order.
+        Returns a Future for ``mutate``'s return value; it is None if the
+        channel has no game.
+        """
+        future = Future()
+        with self._lock:
+            mailbox = self._mailboxes.get(channel)
+            if mailbox is None:
+                mailbox = deque()
+                self._mailboxes[channel] = mailbox
+                schedule = True
+            else:
+                schedule = False
+            mailbox.append((mutate, on_commit, future))
+        if schedule:
+            self._pool.submit(self._drain, channel)
+        return future
+
+    def forget(self, channel):
+        with self._lock:
+            self._games.pop(channel, None)
+
+    def _drain(self, channel):
+        while True:
+            with self._lock:
+                mailbox = self._mailboxes[channel]
+                if not mailbox:
+                    del self._mailboxes[channel]
+                    return
+                mutate, on_commit, future = mailbox.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._apply(channel, mutate, on_commit))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _apply(self, channel, mutate, on_commit):
+        for attempt in range(self.store.max_retries):
+            # taken out of the cache while in use, so a game left half changed
+            # by a failing mutate is reloaded next time
+            with self._lock:
+                cached = self._games.pop(channel, None)
+            game, token = cached if cached else self.store.load(channel)
+            if game is None and journal.restore(self.store, channel):
+                # lost from the store, e.g. by a restart
+                game, token = self.store.load(channel)
+            if game is None:
+                return None
+
+            result = mutate(game)
+            saved = self.store.save(channel, game, token)
+            if saved:
+                if saved is not True:
+                    self._remember(channel, game, saved)
+                if on_commit:
+                    try:
+                        on_commit(game)
+                    except Exception as e:
+                        metrics.count_error('commit_hook', e)
+                        logger.exception("commit hook failed for %s", channel)
+                return result
+        raise ConflictError(f"gave up updating {channel} after {self.store.max_retries} attempts")
+
+    def _remember(self, channel, game, token):
+        with self._lock:
+            self._games[channel] = (game, token)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher, _dispatcher_pid
+    if _dispatcher_pid != os.getpid():
+        with _dispatcher_lock:
+            if _dispatcher_pid != os.getpid():
+                _dispatcher = ChannelDispatcher()
+                _dispatcher_pid = os.getpid()
+    return _dispatcher
+
+
+def active_games():
+    """Games held in memory by this process's dispatcher."""
+    if _dispatcher_pid != os.getpid():
+        return 0
+    return len(_dispatcher._games)
+
+
+metrics.Gauge('davalon_active_games', "Games held in memory by the dispatcher.", function=active_games)
@@ -0,0 +1,87 @@
+"""Slack side effects of button clicks, run on the outbound workers.
+
+Each takes the ``team_id`` of the workspace it is for first, so it is sent
+with that workspace's bot token.
+"""
+from actions.dispatcher import get_dispatcher
+from botcommands.journal import journal
+from botcommands.store import game_key
+from davalon import outbound, transport
+from davalon.dm_channels import dm_channels
+from davalon.outbound import fan_out
+from davalon.slack_client import get_client
+
+
+def replace_board(response_url, board):
+    body = b'{"replace_original":true,"blocks":' + board.json + b'}'
+    r = transport.post(response_url, data=body, headers={'Content-Type': 'application/json'})
+    r.raise_for_status()
+
+
+def push_board_down(team_id, channel, response_url, message_ts, board):
+    r = transport.post(response_url, json={'replace_original': False, 'blocks': []})
+    r.raise_for_status()
+    client = get_client(team_id)
+    from slack.errors import SlackApiError  # loaded along with the client
+    try:
+        client.chat_delete(channel=channel, ts=message_ts)
+    except SlackApiError as e:
+        # already gone if this is a retry
+        if e.response.get('error') != 'message_not_found':
+            raise
+    response = client.chat_postMessage(channel=channel, blocks=board.blocks)
+    key = game_key(team_id, channel)
+
+    def set_message_ts(game):
+        game.slack_message_ts = response.data['ts']
+
+    def log_message_ts(game):
+        journal.snapshot(key, game)
+
+    get_dispatcher().submit(key, set_message_ts, log_message_ts)
+
+
+def post_message(team_id, channel, text):
+    get_client(team_id).chat_postMessage(channel=channel, text=text)
+
+
+def open_direct_message(team_id, user_id):
+    dm_channels.open(get_client(team_id), user_id)
+
+
+def send_direct_message(team_id, user_id, text):
+    client = get_client(team_id)
+    from slack.errors import SlackApiError  # loaded along with the client
+    userchannel = dm_channels.open(client, user_id)
+    try:
+        client.chat_postMessage(channel=userchannel, text=text)
+    except SlackApiError as e:
+        if e.response.get('error') != 'channel_not_found':
+            raise
+        # stale cache entry, open the channel again
+        dm_channels.forget(user_id, team_id)
+        userchannel = dm_channels.open(client, user_id)
+        client.chat_postMessage(channel=userchannel, text=text)
+
+
+def send_role_messages(team_id, channel, messages):
+    """Send every player their role at once, then report anyone who missed out.
+
+    DMs held up by a rate limit are sent later by the outbound workers, and
+    reported on their own if they never go out.
+
+    ``messages`` is a list of ``(user_id, username, text)`` tuples.
+    """
+    usernames = {user_id: username for user_id, username, text in messages}
+
+    def missed(args, error):
+        # a DM put back for a rate limit that never got through
+        outbound.submit(post_message, team_id, channel, f"Couldn't send roles to <@{usernames[args[1]]}>, "
+                                                        "start a new game with `/davalot force`")
+
+    errors = fan_out(send_direct_message, [(team_id, user_id, text) for user_id, username, text in messages],
+                     on_give_up=missed)
+    failed = [f"<@{username}>" for (user_id, username, text), error in zip(messages, errors) if error]
+    if failed:
+        post_message(team_id, channel, "Couldn't send roles to " + ", ".join(failed) + ", start a new game with `/davalot force`")
+    return failed
@@ -0,0 +1,166 @@
+"""Block Kit rendering straight to JSON bytes.
+
+Sections that never change (buttons, dividers) are serialized once at import.
+Sections that only embed the player list are compiled into a prefix and
+suffix around it, so the option list is serialized once per render rather
+than once per select menu. The rest are memoized by what they're drawn from
+(the players, the stage, the questers, the quests so far, the message), so a
+click only serializes the sections it changed: the options once per table,
+the quest results once per round. A board carries a fingerprint, so callers
+can tell when a click didn't change what's on screen.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from actions import board_management as board
+from botcommands import views as lobby
+from botcommands.models import GameStage
+from davalon.metrics import RENDER_MEMO_HITS, RENDER_SECONDS
+
+# sections kept, a few per live game
+RENDER_CACHE_SIZE = getattr(settings, 'RENDER_CACHE_SIZE', 4096)
+
+_OPTIONS = '\0options\0'
+
+
+class _Placeholder:
+    """Stands in for a game while compiling sections around its options."""
+
+    def get_player_quest_options(self):
+        return _OPTIONS
+
+
+def dump(section):
+    return json.dumps(section, separators=(',', ':')).encode('utf-8')
+
+
+def compile_around_options(section):
+    prefix, suffix = dump(section).split(dump(_OPTIONS))
+    return prefix, suffix
+
+
+DIVIDER = dump(board.divider())
+PUSH_DOWN = dump(board.push_down())
+VOTE = dump(board.vote())
+COMPLETE_QUEST = dump(board.complete_quest())
+CHOOSE_QUEST = compile_around_options(board.choose_quest(_Placeholder()))
+ASSASSINATE = compile_around_options(board.assassinate(_Placeholder()))
+ADMIN = compile_around_options(board.admin(_Placeholder()))
+
+LOBBY_HEADER = dump(lobby.lobby_header())
+LOBBY_DIVIDER = dump(lobby.lobby_divider())
+LOBBY_BUTTONS = dump(lobby.lobby_buttons())
+
+
+class Board:
+    __slots__ = ('json', 'fingerprint', '_blocks')
+
+    def __init__(self, fragments):
+        self.json = b'[' + b','.join(fragments) + b']'
+        self.fingerprint = hashlib.sha1(self.json).hexdigest()
+        self._blocks = None
+
+    @property
+    def blocks(self):
+        """The board as a list of dicts, for the Web API client."""
+        if self._blocks is None:
+            self._blocks = json.loads(self.json.decode('utf-8'))
+        return self._blocks
+
+
+_sections = OrderedDict()
+_sections_lock = threading.Lock()
+_MISSING = object()
+
+
+def memoized(key, build):
+    """The section ``build()`` serializes, reused while ``key`` is the same.
+
+    ``key`` must hold everything the section is drawn from.
+    """
+    with _sections_lock:
+        section = _sections.get(key, _MISSING)
+        if section is not _MISSING:
+            _sections.move_to_end(key)
+            RENDER_MEMO_HITS.inc()
+            return section
+    section = build()
+    with _sections_lock:
+        _sections[key] = section
+        while len(_sections) > RENDER_CACHE_SIZE:
+            _sections.popitem(last=False)
+    return section
+
+
+def _dump_or_none(section):
+    return dump(section) if section else None
+
+
+def game_fragments(game):
+    stage = game.game_stage
+    players = tuple((player.username, player.turn_order) for player in game.player_list)
+    questers = tuple(player.username for player in game.questers)
+    options = memoized(('options', players), lambda: dump(game.get_player_quest_options()))
+
+    def with_options(template):
+        return template[0] + options + template[1]
+
+    if game.game_stage == GameStage.VoteOnQuest:
+        controls = VOTE
+    elif game.game_stage == GameStage.CompleteQuest:
+        controls = COMPLETE_QUEST
+    elif game.game_stage == GameStage.ChooseQuest:
+        controls = with_options(CHOOSE_QUEST)
+    elif game.game_stage == GameStage.Assassinate:
+        controls = with_options(ASSASSINATE)
+    else:
+        game_over = board.game_over(game)
+        controls = dump(game_over) if game_over else None
+
+    return [
+        with_options(ADMIN) if game.debug else None,
+        memoized(('next_move', game.rules, stage, game.round, game.player_turn_index, players, questers),
+                 lambda: _dump_or_none(board.next_move(game))),
+        DIVIDER,
+
+        memoized(('quest_participants', stage, questers), lambda: dump(board.quest_participants(game)))
+        if stage in [GameStage.VoteOnQuest, GameStage.ChooseQuest] else None,
+
+        controls,
+
+        DIVIDER,
+        memoized(('game_info', game.rules, stage, game.round, game.player_turn_index, players,
+                  tuple(game.quest_played), tuple(game.quest_failed)),
+                 lambda: dump(board.game_info(game))),
+        memoized(('info', game.message), lambda: dump(board.info(game))) if game.message else None,
+        PUSH_DOWN
+    ]
+
+
+def lobby_fragments(game):
+    sections = memoized(('lobby', game.rules, tuple(player.username for player in game.player_list),
+                         frozenset(game.character_list)),
+                        lambda: (dump(lobby.lobby_status(game)), dump(lobby.lobby_roster(game)),
+                                 dump(lobby.lobby_character_select(game))))
+    return [
+        LOBBY_HEADER,
+        *sections,
+        LOBBY_DIVIDER,
+        LOBBY_BUTTONS
+    ]
+
+
+def render(game):
+    """Return the game's current ``Board``, lobby or in play."""
+    start = time.perf_counter()
+    if game.game_stage == GameStage.Lobby:
+        fragments = lobby_fragments(game)
+    else:
+        fragments = game_fragments(game)
+    rendered = Board(list(filter(None, fragments)))
+    RENDER_SECONDS.observe(time.perf_counter() - start)
+    return rendered
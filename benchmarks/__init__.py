@@ -0,0 +1,20 @@
+"""Benchmarks, run from the repository root, e.g. ``python -m benchmarks.dispatcher``."""
+import os
+import tempfile
+
+
+def setup_django(scratch=False):
+    """Set Django up; with ``scratch`` the database, journal and game store live in a new, migrated, temporary directory."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'davalon.settings')
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    if scratch:
+        directory = tempfile.mkdtemp(prefix='davalot-benchmark-')
+        os.environ['GAME_JOURNAL_PATH'] = os.path.join(directory, 'journal.sqlite3')
+        os.environ['GAME_STORE_PATH'] = os.path.join(directory, 'store.sqlite3')
+        from django.conf import settings
+        settings.DATABASES['default']['NAME'] = os.path.join(directory, 'db.sqlite3')
+    import django
+    django.setup()
+    if scratch:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
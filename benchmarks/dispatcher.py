@@ -0,0 +1,112 @@
+"""N players click "Approve Quest" at the same moment.
+
+Compares the plain get-mutate-set the actions view used to do, a
+dispatcher per process retrying compare-and-swap saves against the others
+(``--processes`` of them, holding no games), and a single per-channel
+dispatcher, counting votes that were lost.
+
+    python -m benchmarks.dispatcher --clickers 200 --channels 4 --latency 0.002 --processes 8
+"""
+import argparse
+import threading
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+from actions.dispatcher import ChannelDispatcher  # noqa: E402
+from botcommands.models import Game, User  # noqa: E402
+from botcommands.store import LocalGameStore  # noqa: E402
+
+
+class SlowStore(LocalGameStore):
+    """LocalGameStore with a simulated network round trip on every call."""
+
+    def __init__(self, latency, **options):
+        super().__init__(**options)
+        self.latency = latency
+
+    def load(self, channel):
+        time.sleep(self.latency)
+        return super().load(channel)
+
+    def save(self, channel, game, token):
+        time.sleep(self.latency)
+        return super().save(channel, game, token)
+
+    def set(self, channel, game):
+        time.sleep(self.latency)
+        super().set(channel, game)
+
+
+def new_games(store, channels, clickers):
+    for channel in channels:
+        game = Game()
+        game.channel_id = channel
+        game.seat_players([User({'username': f"player{i}", 'id': f"U{i}"}) for i in range(clickers)])
+        store.set(channel, game)
+
+
+def click(i):
+    def vote(game):
+        game.record_vote(game.seats[f"player{i}"], True)
+    return vote
+
+
+def run(clickers, channels, mode, latency, processes):
+    store = SlowStore(latency, max_retries=1000)
+    channel_ids = [f"C{c}" for c in range(channels)]
+    new_games(store, channel_ids, clickers)
+    if mode == 'dispatcher':
+        dispatchers = [ChannelDispatcher(store=store)]
+    elif mode == 'cas':
+        dispatchers = [ChannelDispatcher(max_games=0, store=store) for i in range(processes)]
+    else:
+        dispatchers = []
+    futures = []
+    start = threading.Barrier(clickers + 1)
+
+    def clicker(i):
+        channel = channel_ids[i % channels]
+        start.wait()
+        if dispatchers:
+            futures.append(dispatchers[i % len(dispatchers)].submit(channel, click(i)))
+        else:
+            game = store.get(channel)
+            click(i)(game)
+            store.set(channel, game)
+
+    threads = [threading.Thread(target=clicker, args=(i,)) for i in range(clickers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - began
+
+    recorded = sum(store.get(channel).votes_for for channel in channel_ids)
+    return recorded, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--clickers', type=int, default=200)
+    parser.add_argument('--channels', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.001, help="simulated store round trip, seconds")
+    parser.add_argument('--processes', type=int, default=8, help="dispatchers sharing the store, cas mode")
+    args = parser.parse_args()
+
+    print(f"{args.clickers} concurrent clicks over {args.channels} channel(s), {args.latency * 1000:.1f}ms store latency")
+    for mode in ('get/set', 'cas', 'dispatcher'):
+        recorded, elapsed = run(args.clickers, args.channels, mode, args.latency, args.processes)
+        print(f"{mode:>10}: {recorded}/{args.clickers} votes recorded, "
+              f"{args.clickers - recorded} lost, {elapsed * 1000:.1f}ms, "
+              f"{args.clickers / elapsed:.0f} clicks/s")
+
+
+if __name__ == '__main__':
+    main()
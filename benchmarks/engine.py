@@ -0,0 +1,135 @@
+"""Throughput of the rules engine on its own, no Django or Slack.
+
+Plays random games with ``botcommands.engine``: a leader proposes random
+questers, players approve with ``--approve`` probability, evil questers fail
+half the time. Reports whole games per second, then replays the recorded
+games to measure transitions per second overall and time per action kind.
+Games end when the assassin is up or the game is decided.
+
+    python -m benchmarks.engine --games 2000 --players 5-10
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from botcommands import engine
+from botcommands.engine import Action, Character, GameStage, GameState
+
+CHARACTER_SETS = [
+    (),
+    (Character.Percival, Character.Morgana),
+    (Character.Percival, Character.Morgana, Character.Mordred),
+    (Character.Percival, Character.Morgana, Character.Oberon),
+]
+FINISHED = (GameStage.Won, GameStage.Lost, GameStage.Assassinate)
+
+
+def new_game(players, rng):
+    """The actions that fill a lobby, with a random set of special characters."""
+    actions = [Action(engine.JOIN, f"player{i}", f"U{i}") for i in range(players)]
+    extras = [c for c in rng.choice(CHARACTER_SETS) if c != Character.Morgana]
+    if players < 7:
+        extras = [c for c in extras if c.good]
+    for character in extras:
+        actions.append(Action(engine.TOGGLE_CHARACTER, None, character.id))
+    actions.append(Action(engine.START, None))
+    return actions
+
+
+def next_actions(state, rng, approve):
+    """The actions a table of random players takes next."""
+    stage = state.game_stage
+    if stage == GameStage.ChooseQuest:
+        leader = state.player_list[state.player_turn_index].username
+        questers = rng.sample(state.player_list, state.get_quester_count())
+        return [Action(engine.TOGGLE_QUESTER, leader, quester.username) for quester in questers] \
+            + [Action(engine.SEND_QUEST, leader)]
+    if stage == GameStage.VoteOnQuest:
+        return [Action(engine.VOTE, player.username, rng.random() < approve) for player in state.player_list]
+    if stage == GameStage.CompleteQuest:
+        return [Action(engine.QUEST, quester.username, not (quester.character.evil and rng.random() < 0.5))
+                for quester in state.questers]
+    return []
+
+
+def play(players, seed, approve):
+    """Play one game, returning its final state and every action applied."""
+    # the engine gets its own rng, so a replay deals the same roles
+    rng = random.Random(seed)
+    players_rng = random.Random(seed + 1)
+    state = GameState()
+    log = []
+    for action in new_game(players, players_rng):
+        engine.apply(state, action, rng)
+        log.append(action)
+    while state.game_stage not in FINISHED:
+        for action in next_actions(state, players_rng, approve):
+            engine.apply(state, action, rng)
+            log.append(action)
+    return state, log
+
+
+def replay(seed, log):
+    rng = random.Random(seed)
+    state = GameState()
+    for action in log:
+        engine.apply(state, action, rng)
+    return state
+
+
+def replay_timed(seed, log, timings, counts):
+    rng = random.Random(seed)
+    state = GameState()
+    clock = time.perf_counter_ns
+    for action in log:
+        began = clock()
+        engine.apply(state, action, rng)
+        timings[action.kind] = timings[action.kind] + clock() - began
+        counts[action.kind] = counts[action.kind] + 1
+
+
+def player_range(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--players', type=player_range, default=(5, 10), help="players per game, e.g. 5-10")
+    parser.add_argument('--approve', type=float, default=0.7, help="chance each vote approves")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    setups = [(rng.randint(*args.players), rng.random()) for i in range(args.games)]
+
+    began = time.perf_counter()
+    games = [(players, seed) + play(players, seed, args.approve) for players, seed in setups]
+    elapsed = time.perf_counter() - began
+    outcomes = defaultdict(int)
+    for players, seed, state, log in games:
+        outcomes[state.game_stage.name] = outcomes[state.game_stage.name] + 1
+    transitions = sum(len(log) for players, seed, state, log in games)
+    print(f"{args.games} games of {args.players[0]}-{args.players[1]} players: {elapsed:.2f}s, "
+          f"{args.games / elapsed:.0f} games/s ({transitions / args.games:.1f} actions per game)")
+    print("  outcomes: " + ", ".join(f"{name} {count}" for name, count in sorted(outcomes.items())))
+
+    began = time.perf_counter()
+    for players, seed, state, log in games:
+        replay(seed, log)
+    elapsed = time.perf_counter() - began
+    print(f"replay: {transitions} transitions in {elapsed:.2f}s, {transitions / elapsed:.0f} transitions/s")
+
+    timings = defaultdict(int)
+    counts = defaultdict(int)
+    for players, seed, state, log in games:
+        replay_timed(seed, log, timings, counts)
+    print(f"  {'action':<18} {'count':>8} {'mean':>10}")
+    for kind in sorted(timings, key=timings.get, reverse=True):
+        print(f"  {kind:<18} {counts[kind]:>8} {timings[kind] / counts[kind] / 1000:>8.2f}us")
+
+
+if __name__ == '__main__':
+    main()
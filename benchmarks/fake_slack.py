@@ -0,0 +1,137 @@
+"""A local stand-in for the Slack endpoints the app calls.
+
+Serves ``/api/<method>`` Web API calls and ``/response/<anything>``
+response_url posts over HTTP/1.1 with keep-alive. ``handshake`` seconds are
+spent on every new connection, to stand in for the TCP and TLS setup a real
+call to Slack pays, and ``latency`` seconds on every request. A ``throttle``
+fraction of requests is answered with a 429 and ``retry_after``.
+
+    server = FakeSlack(latency=0.05).start()
+    client = PooledWebClient('xoxb-test', base_url=server.api_url)
+"""
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # a burst of new connections would otherwise overflow the default
+    # backlog of 5 and wait a second for the SYN to be retried
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.fake.connection_opened()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, headers, data = self.server.fake.handle(self.path, self.headers, body)
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeSlack:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, handshake=0.0, throttle=0.0, retry_after=1):
+        self.latency = latency
+        self.handshake = handshake
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._ts = 0
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return self.url + '/api/'
+
+    def response_url(self, name='1'):
+        return f"{self.url}/response/{name}"
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever, name='fake-slack', daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections = self.connections + 1
+        if self.handshake:
+            time.sleep(self.handshake)
+
+    def handle(self, path, headers, body):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.throttle and random.random() < self.throttle:
+            self._count('429')
+            return 429, {'Retry-After': str(self.retry_after)}, {'ok': False, 'error': 'ratelimited'}
+        if path.startswith('/response/'):
+            self._count('response_url')
+            return 200, {}, {'ok': True}
+
+        method = path.split('/api/', 1)[-1].split('?', 1)[0]
+        self._count(method)
+        request = self._parse(headers, body)
+        if method == 'im.open':
+            return 200, {}, {'ok': True, 'channel': {'id': 'D' + str(request.get('user', ''))}}
+        if method in ('chat.postMessage', 'chat.update', 'chat.delete'):
+            return 200, {}, {'ok': True, 'channel': request.get('channel'), 'ts': self._next_ts()}
+        return 200, {}, {'ok': True}
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls[name] + 1
+
+    def _next_ts(self):
+        with self._lock:
+            self._ts = self._ts + 1
+            return f"{int(time.time())}.{self._ts:06d}"
+
+    @staticmethod
+    def _parse(headers, body):
+        if not body:
+            return {}
+        if 'json' in (headers.get('Content-Type') or ''):
+            return json.loads(body.decode('utf-8'))
+        return dict(parse_qsl(body.decode('utf-8')))
@@ -0,0 +1,136 @@
+"""Per-request overhead of the Slack endpoints, fast path vs the full stack.
+
+Calls the WSGI application directly with Slack-shaped requests, once with
+``davalon.fastpath`` first in ``MIDDLEWARE`` and once without it, so every
+request goes through all the middleware and URL resolution. Clicks are
+on a channel with no game so the work behind the request stays small, and
+the event is a retry of one already handled.
+
+    python -m benchmarks.handler --requests 5000
+"""
+import argparse
+import io
+import json
+import time
+from urllib.parse import urlencode
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from slack.web.classes.interactions import MessageInteractiveEvent  # noqa: E402
+from actions.views import parse_payload  # noqa: E402
+from botcommands.journal import journal  # noqa: E402
+
+FAST_PATH = 'davalon.fastpath.SlackFastPathMiddleware'
+
+
+def click_body():
+    payload = {
+        'type': 'block_actions',
+        'team': {'id': 'TBENCH', 'domain': 'bench'},
+        'user': {'id': 'UBENCH', 'name': 'bench', 'username': 'bench', 'team_id': 'TBENCH'},
+        'api_app_id': 'ABENCH',
+        'token': settings.SLACK_VERIFICATION_TOKEN,
+        'container': {'type': 'message', 'message_ts': '1.000001', 'channel_id': 'CNOGAME'},
+        'trigger_id': '1.trigger',
+        'channel': {'id': 'CNOGAME', 'name': 'nogame'},
+        'message': {'type': 'message', 'ts': '1.000001'},
+        'response_url': 'http://127.0.0.1:1/response',
+        'actions': [{'action_id': 'approve_quest', 'block_id': 'vote', 'type': 'button',
+                     'value': 'approve_quest', 'action_ts': '1.1'}],
+    }
+    return urlencode({'payload': json.dumps(payload)}).encode(), payload
+
+
+def event_body():
+    return json.dumps({
+        'token': settings.SLACK_VERIFICATION_TOKEN,
+        'team_id': 'TBENCH',
+        'type': 'event_callback',
+        'event_id': 'EvBENCH',
+        'event': {'type': 'message', 'user': 'UBENCH', 'text': 'ok', 'channel': 'CBENCH',
+                  'ts': '1.1', 'event_ts': '1.1'},
+    }).encode()
+
+
+def environ(path, body, content_type):
+    return {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'HTTP_HOST': 'testserver',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+
+
+def measure(name, call, requests):
+    call()
+    timings = []
+    for i in range(requests):
+        began = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    mean = sum(timings) / len(timings)
+    print(f"{name:>40}: mean {mean * 1e6:8.1f}us  p50 {timings[len(timings) // 2] * 1e6:8.1f}us  "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1e6:8.1f}us")
+    return mean
+
+
+def request(handler, path, body, content_type):
+    def call():
+        status = []
+        response = handler(environ(path, body, content_type), lambda s, headers: status.append(s))
+        b''.join(response)
+        response.close()
+        assert status[0].startswith('200'), status
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    # no game to recover, keep the dispatcher's side of each click small
+    journal.path = None
+    full_middleware = [m for m in settings.MIDDLEWARE if m != FAST_PATH]
+    with override_settings(MIDDLEWARE=full_middleware):
+        full = WSGIHandler()
+    with override_settings(MIDDLEWARE=[FAST_PATH] + full_middleware):
+        fast = WSGIHandler()
+
+    click, payload = click_body()
+    form = 'application/x-www-form-urlencoded'
+    event = event_body()
+    raw = json.dumps(payload)
+
+    print(f"{args.requests} requests each")
+    for name, path, body, content_type in (('/actions/ click', '/actions/', click, form),
+                                           ('/events/ retried event', '/events/', event, 'application/json')):
+        slow = measure(name + ', full stack', request(full, path, body, content_type), args.requests)
+        quick = measure(name + ', fast path', request(fast, path, body, content_type), args.requests)
+        print(f"{'':>40}  {slow / quick:.1f}x less overhead")
+    slow = measure('MessageInteractiveEvent', lambda: MessageInteractiveEvent(json.loads(raw)), args.requests)
+    quick = measure('parse_payload', lambda: parse_payload(raw), args.requests)
+    print(f"{'':>40}  {slow / quick:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
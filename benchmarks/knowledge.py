@@ -0,0 +1,84 @@
+"""Role reveals for every composition the rules allow.
+
+For every choice of special characters and every number of players it fits,
+deals ``--deals`` random games and checks ``botcommands.knowledge`` against
+a pairwise scan of the same ``SIGHT`` rules, and that Merlin never sees
+Mordred, Oberon sees no one and no one sees themselves. Then times the
+bitmasks, the scan and writing every DM.
+
+    python -m benchmarks.knowledge --deals 200
+"""
+import argparse
+import random
+import time
+
+from botcommands.engine import STANDARD, Character, User
+from botcommands.knowledge import SIGHT, knowledge, role_messages
+
+
+def deal(cast, rng):
+    roles = list(cast.all)
+    rng.shuffle(roles)
+    players = []
+    for seat, character in enumerate(roles):
+        player = User({'username': f"player{seat}", 'id': f"U{seat}"})
+        player.character = character
+        players.append(player)
+    return players
+
+
+def scan(players):
+    """Every player against every other, the way the masks are checked."""
+    masks = []
+    for viewer in players:
+        rule = SIGHT.get(viewer.character)
+        mask = 0
+        for seat, other in enumerate(players):
+            if other is not viewer and rule and other.character in rule.characters:
+                mask = mask | (1 << seat)
+        masks.append(mask)
+    return masks
+
+
+def check(players, masks):
+    assert masks == scan(players), (players, masks)
+    for seat, (player, mask) in enumerate(zip(players, masks)):
+        assert not mask & (1 << seat)
+        if player.character == Character.Oberon:
+            assert not mask
+        if player.character == Character.Merlin:
+            assert all(players[i].character != Character.Mordred for i in range(len(players)) if mask & (1 << i))
+
+
+def measure(name, func, games, repeat):
+    began = time.perf_counter()
+    for i in range(repeat):
+        for players in games:
+            func(players)
+    elapsed = time.perf_counter() - began
+    print(f"{name:>14}: {elapsed / (repeat * len(games)) * 1e6:7.2f}us per game")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--deals', type=int, default=200, help="games dealt per composition")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    games = []
+    for (chosen, players), cast in sorted(STANDARD.casts.items(), key=lambda item: item[0][1]):
+        for i in range(args.deals):
+            games.append(deal(cast, rng))
+    for players in games:
+        check(players, knowledge(players))
+    print(f"{len(STANDARD.casts)} compositions, {len(games)} games checked")
+
+    measure('bitmasks', knowledge, games, args.repeat)
+    measure('pairwise scan', scan, games, args.repeat)
+    measure('role DMs', role_messages, games, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
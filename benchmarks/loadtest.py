@@ -0,0 +1,277 @@
+"""Many simultaneous full games against the app, with Slack faked locally.
+
+Every game gets its own channel and is played start to finish by its own
+thread: ``/davalot`` to open the lobby, players join, start, then quests are
+proposed, voted on and completed until the game is decided. Requests are
+shaped like Slack's (a form encoded slash command, a ``block_actions``
+``payload``, Events API JSON including retried deliveries) and go through the
+full Django stack in-process. The app's Slack calls go to a local fake that
+adds ``--latency`` per request and answers ``--throttle`` of them with a 429.
+
+Each level of ``--games`` is run in turn, reporting throughput and latency per
+endpoint, and how much Slack traffic the games caused.
+
+    python -m benchmarks.loadtest --games 1,10,50 --latency 0.05 --throttle 0.02
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from benchmarks.fake_slack import FakeSlack
+
+_fake_slack = FakeSlack()
+os.environ['SLACK_API_URL'] = _fake_slack.api_url
+os.environ.setdefault('SLACK_BOT_USER_TOKEN', 'xoxb-loadtest')
+
+from benchmarks import setup_django  # noqa: E402
+
+setup_django(scratch=True)
+
+from django.conf import settings  # noqa: E402
+from django.test import Client  # noqa: E402
+from actions.coalescer import coalescer  # noqa: E402
+from actions.dispatcher import get_dispatcher  # noqa: E402
+from botcommands.models import GameStage  # noqa: E402
+from botcommands.store import game_key, get_store  # noqa: E402
+from davalon.metrics import ERRORS  # noqa: E402
+from davalon.outbound import outbound  # noqa: E402
+
+TEAM_ID = 'TLOADTEST'
+FINISHED = (GameStage.Won, GameStage.Lost, GameStage.Assassinate)
+
+
+class Recorder:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.timings[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors[endpoint] + 1
+
+
+class GameDriver(threading.Thread):
+    def __init__(self, number, players, recorder, server, duplicates, rng):
+        super().__init__(name=f"game-{number}", daemon=True)
+        self.channel = f"CLOAD{number:05d}"
+        self.players = [f"player{number}x{i}" for i in range(players)]
+        self.recorder = recorder
+        self.server = server
+        self.duplicates = duplicates
+        self.rng = rng
+        self.client = Client()
+        self.events = 0
+        self.finished = False
+        self.failure = None
+
+    def run(self):
+        try:
+            self.play()
+        except Exception as e:
+            self.failure = e
+
+    def post(self, endpoint, path, data, **kwargs):
+        began = time.perf_counter()
+        try:
+            ok = self.client.post(path, data, **kwargs).status_code == 200
+        except Exception:
+            ok = False
+        self.recorder.record(endpoint, time.perf_counter() - began, ok)
+
+    def command(self, user, text=''):
+        self.post('/commands/start/', '/commands/start/', {
+            'token': settings.SLACK_VERIFICATION_TOKEN,
+            'team_id': TEAM_ID,
+            'channel_id': self.channel,
+            'channel_name': self.channel.lower(),
+            'user_id': 'U' + user,
+            'user_name': user,
+            'command': '/davalot',
+            'text': text,
+            'response_url': self.server.response_url(self.channel + '/command'),
+            'trigger_id': f"{time.time()}.trigger",
+        })
+
+    def click(self, user, action_id, selected=None):
+        if selected is None:
+            action = {'action_id': action_id, 'block_id': action_id, 'type': 'button',
+                      'value': action_id, 'action_ts': str(time.time())}
+        else:
+            action = {'action_id': action_id, 'block_id': action_id, 'type': 'static_select',
+                      'selected_option': {'text': {'type': 'plain_text', 'text': selected}, 'value': selected},
+                      'action_ts': str(time.time())}
+        payload = {
+            'type': 'block_actions',
+            'team': {'id': TEAM_ID, 'domain': 'loadtest'},
+            'user': {'id': 'U' + user, 'name': user, 'username': user, 'team_id': TEAM_ID},
+            'api_app_id': 'ALOADTEST',
+            'token': settings.SLACK_VERIFICATION_TOKEN,
+            'container': {'type': 'message', 'message_ts': '1.000001', 'channel_id': self.channel,
+                          'is_ephemeral': False},
+            'trigger_id': f"{time.time()}.trigger",
+            'channel': {'id': self.channel, 'name': self.channel.lower()},
+            'message': {'type': 'message', 'ts': '1.000001'},
+            'response_url': self.server.response_url(self.channel),
+            'actions': [action],
+        }
+        self.post('/actions/', '/actions/', {'payload': json.dumps(payload)})
+
+    def message(self, user, text):
+        self.events = self.events + 1
+        body = json.dumps({
+            'token': settings.SLACK_VERIFICATION_TOKEN,
+            'team_id': TEAM_ID,
+            'api_app_id': 'ALOADTEST',
+            'type': 'event_callback',
+            'event_id': f"Ev{self.channel}{self.events}",
+            'event_time': int(time.time()),
+            'event': {'type': 'message', 'user': 'U' + user, 'text': text, 'channel': self.channel,
+                      'ts': f"{time.time():.6f}", 'event_ts': f"{time.time():.6f}", 'channel_type': 'channel'},
+        })
+        self.post('/events/', '/events/', body, content_type='application/json')
+        retries = 0
+        while retries < 3 and self.rng.random() < self.duplicates:
+            retries = retries + 1
+            self.post('/events/ (retry)', '/events/', body, content_type='application/json',
+                      HTTP_X_SLACK_RETRY_NUM=str(retries), HTTP_X_SLACK_RETRY_REASON='http_timeout')
+
+    def settle(self):
+        """Wait for this game's clicks to be applied and return the game."""
+        key = game_key(TEAM_ID, self.channel)
+        get_dispatcher().submit(key, lambda game: None).result()
+        return get_store().get(key)
+
+    def play(self):
+        rng = self.rng
+        host = self.players[0]
+        self.command(host, 'force')
+        self.message(host, 'hi everyone')
+        for player in self.players[1:]:
+            self.click(player, 'action_join_game_lobby')
+        if rng.random() < 0.5:
+            self.click(host, 'toggle_character', 'percival')
+        self.click(host, 'start_game')
+        game = self.settle()
+
+        while game and game.game_stage not in FINISHED:
+            leader = next(p for p in game.player_list if p.turn_order == game.player_turn_index)
+            questers = rng.sample(game.player_list, game.get_quester_count())
+            for quester in questers:
+                self.click(leader.username, 'toggle_quest_user', quester.username)
+            self.click(leader.username, 'send_quest')
+            self.settle()
+
+            voters = list(game.player_list)
+            rng.shuffle(voters)
+            for voter in voters:
+                self.click(voter.username, 'approve_quest')
+            game = self.settle()
+
+            for quester in game.questers:
+                evil = quester.character.evil if quester.character else False
+                self.click(quester.username, 'fail_quest' if evil and rng.random() < 0.5 else 'succeed_quest')
+            game = self.settle()
+            if rng.random() < 0.3:
+                self.message(rng.choice(self.players), 'hi, good quest')
+        self.finished = bool(game)
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def drain():
+    for i in range(2):
+        coalescer.flush()
+        while not coalescer.idle():
+            time.sleep(0.01)
+        outbound.join()
+
+
+def error_counts():
+    return {values: series.value for values, series in ERRORS._items()}
+
+
+def run_level(games, args, server, offset):
+    recorder = Recorder()
+    calls = dict(server.calls)
+    errors = error_counts()
+    rng = random.Random(args.seed + offset)
+    drivers = [GameDriver(offset + i, rng.randint(*args.players), recorder, server, args.duplicates,
+                          random.Random(rng.random()))
+               for i in range(games)]
+
+    began = time.perf_counter()
+    for driver in drivers:
+        driver.start()
+    for driver in drivers:
+        driver.join()
+    elapsed = time.perf_counter() - began
+    drain()
+    drained = time.perf_counter() - began
+
+    finished = sum(1 for driver in drivers if driver.finished)
+    print(f"\n{games} concurrent game(s): {finished} finished in {elapsed:.2f}s "
+          f"({finished / elapsed:.2f} games/s), Slack caught up after {drained:.2f}s")
+    for driver in drivers:
+        if driver.failure:
+            print(f"  {driver.name} gave up: {driver.failure!r}")
+    print(f"  {'endpoint':<20} {'requests':>8} {'req/s':>8} {'p50':>9} {'p99':>9} {'max':>9} {'errors':>7}")
+    for endpoint, timings in sorted(recorder.timings.items()):
+        timings.sort()
+        print(f"  {endpoint:<20} {len(timings):>8} {len(timings) / elapsed:>8.1f} "
+              f"{percentile(timings, 0.5) * 1000:>7.2f}ms {percentile(timings, 0.99) * 1000:>7.2f}ms "
+              f"{timings[-1] * 1000:>7.2f}ms {recorder.errors[endpoint] / len(timings):>6.1%}")
+    sent = {name: count - calls.get(name, 0) for name, count in server.calls.items() if count - calls.get(name, 0)}
+    print(f"  Slack calls: {', '.join(f'{name} {count}' for name, count in sorted(sent.items()))}")
+    caught = {values: count - errors.get(values, 0) for values, count in error_counts().items()
+              if count - errors.get(values, 0)}
+    print(f"  errors caught in the app: {sum(caught.values())} "
+          f"{', '.join(f'{where} {kind} {count}' for (where, kind), count in sorted(caught.items()))}")
+
+
+def player_range(value):
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', default='1,5,20', help="comma separated numbers of concurrent games")
+    parser.add_argument('--players', type=player_range, default=(5, 10), help="players per game, e.g. 5-10")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per fake Slack request")
+    parser.add_argument('--handshake', type=float, default=0.0, help="seconds per new connection")
+    parser.add_argument('--throttle', type=float, default=0.0, help="fraction of Slack calls answered 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After sent with a 429")
+    parser.add_argument('--duplicates', type=float, default=0.2, help="chance an event is delivered again")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # failures are counted and reported, not logged one by one
+    logging.disable(logging.CRITICAL)
+    server = _fake_slack
+    server.latency = args.latency
+    server.handshake = args.handshake
+    server.throttle = args.throttle
+    server.retry_after = args.retry_after
+    server.start()
+
+    print(f"fake Slack: {args.latency * 1000:.0f}ms per request, {args.throttle:.0%} rate limited, "
+          f"{args.players[0]}-{args.players[1]} players per game")
+    offset = 0
+    for games in [int(n) for n in args.games.split(',')]:
+        run_level(games, args, server, offset)
+        offset = offset + games
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""What sharded serving saves per click, and how evenly it spreads games.
+
+Spreads ``--keys`` game keys over ``--shards`` shards on the hash ring and
+reports the busiest and quietest shard's share, then how many keys move
+when a shard is added, against plain ``hash % shards``. Then applies
+``--clicks`` votes through the dispatcher to ``--games`` mid-game games in
+a ``TieredGameStore``: once reloading the game for every click, as a
+process must when other processes may have written it since, and once
+applying clicks to the game the dispatcher holds, as a shard worker can.
+Finally times the router's look at a click to find its shard.
+
+    python -m benchmarks.shards --shards 4 --games 200 --clicks 20000
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+from actions.dispatcher import ChannelDispatcher  # noqa: E402
+from benchmarks.handler import click_body  # noqa: E402
+from benchmarks.state import mid_game, play  # noqa: E402
+from botcommands.store import TieredGameStore  # noqa: E402
+from davalon.shards import HashRing, _hash, shard_key  # noqa: E402
+
+
+def spread(keys, shards):
+    ring = HashRing(range(shards))
+    counts = [0] * shards
+    for key in keys:
+        counts[ring.node_for(key)] = counts[ring.node_for(key)] + 1
+    return min(counts) / len(keys), max(counts) / len(keys)
+
+
+def moved(keys, shards):
+    """Fraction of keys on another shard once one is added, ring and modulo."""
+    before, after = HashRing(range(shards)), HashRing(range(shards + 1))
+    ring = sum(before.node_for(key) != after.node_for(key) for key in keys)
+    modulo = sum(_hash(key) % shards != _hash(key) % (shards + 1) for key in keys)
+    return ring / len(keys), modulo / len(keys)
+
+
+def clicks(store, games, count, held, rng):
+    channels = [f"T1:C{i}" for i in range(len(games))]
+    for channel, game in zip(channels, games):
+        store.set(channel, game)
+    dispatcher = ChannelDispatcher(store=store, max_games=len(games) if held else 0)
+    work = [(rng.choice(channels), rng.random() < 0.5) for i in range(count)]
+
+    def vote(approve):
+        return lambda game: game.record_vote(0, approve)
+
+    began = time.perf_counter()
+    futures = [dispatcher.submit(channel, vote(approve)) for channel, approve in work]
+    for future in futures:
+        future.result()
+    return time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keys = [f"T{rng.randrange(1000)}:C{rng.getrandbits(40):X}" for i in range(args.keys)]
+    low, high = spread(keys, args.shards)
+    print(f"{args.keys} games on {args.shards} shards: {low:.1%} to {high:.1%} each "
+          f"(even would be {1 / args.shards:.1%})")
+    ring, modulo = moved(keys, args.shards)
+    print(f"adding a shard moves {ring:.1%} of games on the ring, {modulo:.1%} with hash % shards")
+
+    print(f"{args.clicks} clicks over {args.games} games")
+    for name, held in (('reloading every click', False), ('held by the dispatcher', True)):
+        games = [play(rng.randint(5, 10), rng.random(), 0.7, mid_game) for i in range(args.games)]
+        elapsed = clicks(TieredGameStore(max_games=args.games), games, args.clicks, held, random.Random(args.seed))
+        print(f"{name:>24}: {elapsed / args.clicks * 1e6:6.1f}us per click, {args.clicks / elapsed:8.0f} clicks/s")
+
+    body, payload = click_body()
+    began = time.perf_counter()
+    for i in range(args.clicks):
+        shard_key('/actions/', body)
+    elapsed = time.perf_counter() - began
+    print(f"{'routing a click':>24}: {elapsed / args.clicks * 1e6:6.1f}us")
+
+
+if __name__ == '__main__':
+    main()
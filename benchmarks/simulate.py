@@ -0,0 +1,300 @@
+"""Self-play of whole games through the rules, for balance and throughput.
+
+Plays ``--games`` games for every number of players in ``--players`` and
+every set of special characters in ``--characters`` the rules deal at it.
+Each game is a lobby filled, characters chosen and the roles dealt, then
+proposals, votes, quests and the assassination, all as actions applied by
+``botcommands.engine``, so the quest sizes, fail counts, hammer and
+assassination are the real rules'. Players follow ``--policy``:
+
+- ``random``: propose anyone, approve with ``--approve`` probability, evil
+  fail half the quests they're on, and the assassin picks anyone they
+  don't know is evil.
+- ``scripted``: play the role with what it shows them
+  (``botcommands.knowledge``). See ``ScriptedPolicy``.
+
+Games are played in chunks of ``--chunk``, each with its own rng seeded from
+``--seed`` and the chunk, on a pool of ``--workers`` processes, so a seed
+gives the same tables however many workers play it. Prints good's win rate
+and how evil won, by three failed quests, the hammer or finding Merlin, for
+each number of players and characters, then games and actions per
+second. ``--rules`` plays a variant, a JSON file described like
+``engine.STANDARD_RULES``.
+
+    python -m benchmarks.simulate --games 100000 --players 5-10 --policy scripted --workers 8
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.engine import player_range
+from botcommands import engine
+from botcommands.engine import ALWAYS_PRESENT, QUESTS, STANDARD_RULES, Action, Character, GameStage, GameState, Ruleset
+from botcommands.knowledge import knowledge, seats
+
+# chosen on top of Merlin and the Assassin, who are in every game
+CHARACTER_SETS = {
+    'basic': (),
+    'percival': (Character.Percival, Character.Morgana),
+    'mordred': (Character.Mordred,),
+    'oberon': (Character.Oberon,),
+    'percival+mordred': (Character.Percival, Character.Morgana, Character.Mordred),
+    'percival+oberon': (Character.Percival, Character.Morgana, Character.Oberon),
+    'mordred+oberon': (Character.Mordred, Character.Oberon),
+    'all': (Character.Percival, Character.Morgana, Character.Mordred, Character.Oberon),
+}
+
+FINISHED = (GameStage.Won, GameStage.Lost)
+OUTCOMES = ('good', 'quests', 'hammer', 'merlin')
+
+NAMES = [f"player{i}" for i in range(32)]
+
+
+def _mask(state, players):
+    mask = 0
+    for player in players:
+        mask = mask | 1 << state.seats[player.username]
+    return mask
+
+
+def _suspicion(state):
+    """How evil each seat looks from the quests so far.
+
+    A quest's fail cards are shared between its questers, and a quest
+    without any clears them.
+    """
+    scores = [0.0] * len(state.player_list)
+    for round_num in range(state.round):
+        played = state.quest_played[round_num]
+        if played:
+            fails = state.quest_fails[round_num]
+            share = fails / (state.quest_succeeds[round_num] + fails) if fails else -1.0
+            for seat in seats(played):
+                scores[seat] = scores[seat] + share
+    return scores
+
+
+def _ranked(seats, scores, rng):
+    """``seats`` least suspect first, ties in random order."""
+    seats = list(seats)
+    rng.shuffle(seats)
+    seats.sort(key=scores.__getitem__)
+    return seats
+
+
+class RandomPolicy:
+    def __init__(self, approve=0.7, fail=0.5):
+        self.approve = approve
+        self.fail = fail
+
+    def propose(self, state, seat, seen, rng):
+        return rng.sample(range(len(state.player_list)), state.get_quester_count())
+
+    def vote(self, state, seat, seen, rng):
+        return rng.random() < self.approve
+
+    def quest(self, state, seat, seen, rng):
+        return state.player_list[seat].character.good or rng.random() >= self.fail
+
+    def target(self, state, seat, seen, rng):
+        return rng.choice([other for other in range(len(state.player_list))
+                           if other != seat and not seen[seat] >> other & 1])
+
+
+class ScriptedPolicy:
+    """Players who play their role.
+
+    Everyone rates the others by ``_suspicion``, themselves above anyone,
+    and the players they know are evil, which for good players only Merlin
+    does, below anyone. Leaders propose the quest they rate best: good
+    players a quest of whoever looks good, evil players themselves and
+    whoever looks good. Good players approve any quest no worse than what
+    they'd propose, evil players any quest with one of their own on it,
+    and everyone the last proposal before the hammer. Evil fail a quest
+    once between the ones they know of. The assassin picks whoever looks
+    most good.
+    """
+
+    def _scores(self, state, seat, seen):
+        scores = _suspicion(state)
+        player = state.player_list[seat]
+        if player.character == Character.Merlin or player.character.evil:
+            for other in seats(seen[seat]):
+                scores[other] = math.inf
+        scores[seat] = -math.inf
+        return scores
+
+    def propose(self, state, seat, seen, rng):
+        ranked = _ranked(range(len(state.player_list)), self._scores(state, seat, seen), rng)
+        return ranked[:state.get_quester_count()]
+
+    def vote(self, state, seat, seen, rng):
+        if state.hammer_index == state.player_turn_index:
+            return True
+        team = _mask(state, state.questers)
+        if state.player_list[seat].character.evil:
+            return bool(team & (seen[seat] | 1 << seat))
+        scores = self._scores(state, seat, seen)
+        best = sorted(scores)[len(state.questers) - 1]
+        return all(scores[member] <= best for member in seats(team))
+
+    def quest(self, state, seat, seen, rng):
+        if state.player_list[seat].character.good:
+            return True
+        # the first of them by seat fails it
+        partners = _mask(state, state.questers) & seen[seat] & ((1 << seat) - 1)
+        return bool(partners)
+
+    def target(self, state, seat, seen, rng):
+        others = [other for other in range(len(state.player_list)) if other != seat]
+        return _ranked(others, self._scores(state, seat, seen), rng)[0]
+
+
+POLICIES = {
+    'random': lambda args: RandomPolicy(args.approve),
+    'scripted': lambda args: ScriptedPolicy(),
+}
+
+
+def play(game_class, players, characters, policy, rng):
+    """Play one game to the end, returning it and the number of actions applied."""
+    state = game_class()
+    applied = 0
+
+    def act(kind, username=None, value=None):
+        nonlocal applied
+        engine.apply(state, Action(kind, username, value))
+        applied = applied + 1
+
+    for name in NAMES[:players]:
+        act(engine.JOIN, name, name)
+    for character in characters:
+        # a pair comes in together with its first
+        if character not in state.character_list:
+            act(engine.TOGGLE_CHARACTER, None, character.id)
+    act(engine.START, None, rng.getrandbits(32))
+
+    seen = knowledge(state.player_list)
+    table = state.player_list
+    while state.game_stage not in FINISHED:
+        stage = state.game_stage
+        if stage == GameStage.ChooseQuest:
+            leader = table[state.player_turn_index].username
+            for seat in policy.propose(state, state.player_turn_index, seen, rng):
+                act(engine.TOGGLE_QUESTER, leader, table[seat].username)
+            act(engine.SEND_QUEST, leader)
+        elif stage == GameStage.VoteOnQuest:
+            for seat, player in enumerate(table):
+                act(engine.VOTE, player.username, policy.vote(state, seat, seen, rng))
+        elif stage == GameStage.CompleteQuest:
+            for player in list(state.questers):
+                act(engine.QUEST, player.username, policy.quest(state, state.seats[player.username], seen, rng))
+        elif stage == GameStage.Assassinate:
+            seat = next(seat for seat, player in enumerate(table) if player.character == Character.Assassin)
+            act(engine.TOGGLE_TARGET, table[seat].username, table[policy.target(state, seat, seen, rng)].username)
+            act(engine.ASSASSINATE, table[seat].username)
+    return state, applied
+
+
+def outcome(state):
+    if state.game_stage == GameStage.Won:
+        return 'good'
+    if state.assassination_target is not None:
+        return 'merlin'
+    failed = sum(1 for round_num in range(QUESTS)
+                 if state.quest_played[round_num] and not state.count_quest(round_num)[0])
+    return 'quests' if failed >= 3 else 'hammer'
+
+
+_game_classes = {}
+
+
+def game_class(rules):
+    """A ``GameState`` playing by the rules described, made once per process."""
+    if rules['name'] not in _game_classes:
+        _game_classes[rules['name']] = type('SimulatedGame', (GameState,), {'__slots__': (), 'rules': Ruleset(rules)})
+    return _game_classes[rules['name']]
+
+
+def play_chunk(task):
+    """Play a chunk of games in a worker; the outcomes, actions applied and seconds taken."""
+    rules, players, name, seed, games, policy = task
+    rng = random.Random(seed)
+    cls = game_class(rules)
+    outcomes = Counter()
+    applied = 0
+    began = time.perf_counter()
+    for i in range(games):
+        state, actions = play(cls, players, CHARACTER_SETS[name], policy, rng)
+        result = outcome(state)
+        outcomes[result] = outcomes[result] + 1
+        applied = applied + actions
+    return players, name, outcomes, applied, time.perf_counter() - began
+
+
+def tasks(args, rules):
+    ruleset = Ruleset(rules)
+    for players in range(args.players[0], args.players[1] + 1):
+        for name in args.characters:
+            if (frozenset(ALWAYS_PRESENT + CHARACTER_SETS[name]), players) not in ruleset.casts:
+                continue
+            for chunk, start in enumerate(range(0, args.games, args.chunk)):
+                seed = f"{args.seed}/{rules['name']}/{players}/{name}/{chunk}"
+                yield rules, players, name, seed, min(args.chunk, args.games - start), args.policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=10000, help="games per players and characters")
+    parser.add_argument('--players', type=player_range, default=(5, 10), help="players per game, e.g. 5-10")
+    parser.add_argument('--characters', nargs='+', choices=list(CHARACTER_SETS), default=list(CHARACTER_SETS))
+    parser.add_argument('--policy', choices=list(POLICIES), default='random')
+    parser.add_argument('--approve', type=float, default=0.7, help="chance each vote approves, random policy")
+    parser.add_argument('--rules', help="JSON file describing the rules, the standard rules if not given")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk', type=int, default=1000, help="games per task")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rules = STANDARD_RULES
+    if args.rules:
+        with open(args.rules) as f:
+            rules = json.load(f)
+    args.policy = POLICIES[args.policy](args)
+    work = list(tasks(args, rules))
+    if not work:
+        parser.error("the rules deal none of those characters for those players")
+
+    results = {}
+    applied = 0
+    busy = 0
+    began = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for players, name, outcomes, actions, elapsed in pool.map(play_chunk, work):
+            results.setdefault((players, name), Counter()).update(outcomes)
+            applied = applied + actions
+            busy = busy + elapsed
+    elapsed = time.perf_counter() - began
+
+    print(f"{'players':>7} {'characters':<17} {'games':>8} {'good won':>9} "
+          + " ".join(f"{'evil by ' + name:>15}" for name in OUTCOMES[1:]))
+    order = list(CHARACTER_SETS)
+    for players, name in sorted(results, key=lambda key: (key[0], order.index(key[1]))):
+        outcomes = results[players, name]
+        games = sum(outcomes.values())
+        print(f"{players:7} {name:<17} {games:8} {outcomes['good'] / games:9.1%} "
+              + " ".join(f"{outcomes[kind] / games:15.1%}" for kind in OUTCOMES[1:]))
+
+    games = sum(sum(outcomes.values()) for outcomes in results.values())
+    print(f"{games} games, {applied} actions in {elapsed:.2f}s on {args.workers} worker(s): "
+          f"{games / elapsed:.0f} games/s, {applied / elapsed:.0f} actions/s "
+          f"({applied / busy:.0f} actions/s per worker)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Cold start: from ``manage.py runserver`` to the first request served.
+
+Starts the server in a fresh process and times how long from launching it
+until it has answered its first request, and how long that request took,
+over ``--runs`` runs each of:
+
+  event         an Events API ``url_verification``, nothing behind it
+  command       a ``/davalot`` slash command, which posts the lobby to Slack
+  idle command  the same, sent ``--idle`` seconds after the server is up
+  command cold  ``command`` with ``WARM_UP_ON_START`` turned off
+  idle cold     ``idle command`` with ``WARM_UP_ON_START`` turned off
+
+The idle wait is left out of the launch to served time.
+
+Slack is faked locally, adding ``--handshake`` seconds to every new
+connection for the TCP and TLS setup a real one would cost.
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from benchmarks.fake_slack import FakeSlack
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = 'startup-benchmark'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def event_request(url, run):
+    body = b'{"token": "%s", "type": "url_verification", "challenge": "c"}' % TOKEN.encode()
+    return urllib.request.Request(url + '/events/', data=body, headers={'Content-Type': 'application/json'})
+
+
+def command_request(url, run):
+    body = urlencode({'token': TOKEN, 'channel_id': f"CSTARTUP{run}", 'user_name': 'startup',
+                      'user_id': 'USTARTUP', 'text': 'force'}).encode()
+    return urllib.request.Request(url + '/commands/start/', data=body)
+
+
+def wait_for_port(port, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=timeout).close()
+            return
+        except ConnectionError:
+            time.sleep(0.005)
+    raise RuntimeError("server didn't start within %ss" % timeout)
+
+
+def first_request(make_request, run, env, idle=0.0, timeout=30):
+    """Seconds from launching the server until it has answered a request,
+    and seconds the request itself took."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    began = time.perf_counter()
+    server = subprocess.Popen([sys.executable, 'manage.py', 'runserver', '--noreload', f"127.0.0.1:{port}"],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, timeout)
+        time.sleep(idle)
+        sent = time.perf_counter()
+        with urllib.request.urlopen(make_request(url, run), timeout=timeout) as response:
+            response.read()
+        done = time.perf_counter()
+        return done - began, done - sent
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--handshake', type=float, default=0.1, help="seconds per new connection to Slack")
+    parser.add_argument('--idle', type=float, default=2.0, help="seconds before the idle requests are sent")
+    args = parser.parse_args()
+
+    slack = FakeSlack(handshake=args.handshake).start()
+    journal = tempfile.NamedTemporaryFile(suffix='.sqlite3')
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='davalon.settings', SLACK_API_URL=slack.api_url,
+               SLACK_VERIFICATION_TOKEN=TOKEN, GAME_JOURNAL_PATH=journal.name)
+    env.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    # the default configuration, whatever this shell has set
+    env.pop('WARM_UP_ON_START', None)
+    cold = dict(env, WARM_UP_ON_START='0')
+
+    cases = [
+        ('event', event_request, env, 0.0),
+        ('command', command_request, env, 0.0),
+        ('idle command', command_request, env, args.idle),
+        ('command cold', command_request, cold, 0.0),
+        ('idle cold', command_request, cold, args.idle),
+    ]
+    print(f"{args.runs} runs each, {args.handshake * 1000:.0f}ms per new Slack connection")
+    print(f"{'':>12}  {'launch to served':>16}  {'request':>9}")
+    for name, make_request, case_env, idle in cases:
+        runs = [first_request(make_request, run, case_env, idle) for run in range(args.runs)]
+        served = statistics.mean(total for total, request in runs) - idle
+        request = statistics.mean(request for total, request in runs)
+        print(f"{name:>12}  {served * 1000:14.1f}ms  {request * 1000:7.1f}ms")
+    slack.stop()
+    journal.close()
+
+
+if __name__ == '__main__':
+    main()
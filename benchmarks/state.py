@@ -0,0 +1,103 @@
+"""Memory held per game, and the cost of the lookups every click makes.
+
+Plays ``--games`` random games with the engine benchmark's players, keeping
+each one's ``Game`` at three points: a full lobby, mid-game (the third quest
+being voted on) and finished. The memory the kept games hold is measured
+with ``tracemalloc`` and reported per game, which is what a process holding
+that many concurrent games pays for them. Then times finding a player,
+counting a vote and counting a quest on mid-game states.
+
+    python -m benchmarks.state --games 2000 --players 5-10
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks import setup_django
+
+setup_django()
+
+from benchmarks.engine import FINISHED, new_game, next_actions, player_range  # noqa: E402
+from botcommands import engine  # noqa: E402
+from botcommands.engine import GameStage  # noqa: E402
+from botcommands.models import Game  # noqa: E402
+
+
+def play(players, seed, approve, until):
+    """Play a game until ``until(state)`` holds, or it's over."""
+    rng = random.Random(seed)
+    players_rng = random.Random(seed + 1)
+    state = Game()
+    for action in new_game(players, players_rng):
+        if action.kind == engine.START and until(state):
+            return state
+        engine.apply(state, action, rng)
+    while not until(state) and state.game_stage not in FINISHED:
+        for action in next_actions(state, players_rng, approve):
+            engine.apply(state, action, rng)
+            if until(state):
+                return state
+    return state
+
+
+def lobby(state):
+    return state.game_stage == GameStage.Lobby and len(state.player_list) > 0
+
+
+def mid_game(state):
+    return state.round >= 2 and state.game_stage == GameStage.VoteOnQuest
+
+
+def finished(state):
+    return False
+
+
+def footprint(setups, approve, until):
+    """Bytes held per game, and the games."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = [play(players, seed, approve, until) for players, seed in setups]
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held / len(games), games
+
+
+def measure(name, call, games, repeat):
+    began = time.perf_counter()
+    for i in range(repeat):
+        for game in games:
+            call(game)
+    elapsed = time.perf_counter() - began
+    print(f"{name:>24}: {elapsed / repeat / len(games) * 1e9:8.0f}ns per call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=2000)
+    parser.add_argument('--players', type=player_range, default=(5, 10), help="players per game, e.g. 5-10")
+    parser.add_argument('--approve', type=float, default=0.7, help="chance each vote approves")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    setups = [(rng.randint(*args.players), rng.random()) for i in range(args.games)]
+
+    print(f"{args.games} games of {args.players[0]}-{args.players[1]} players")
+    for name, until in (('lobby', lobby), ('mid-game', mid_game), ('finished', finished)):
+        per_game, games = footprint(setups, args.approve, until)
+        print(f"{name:>24}: {per_game:8.0f} bytes per game, {per_game * 10000 / 2 ** 20:6.1f}MiB per 10k games")
+
+    per_game, games = footprint(setups, args.approve, mid_game)
+    measure('find_player_by_username',
+            lambda game: game.find_player_by_username(game.player_list[-1].username), games, args.repeat)
+    measure('count_votes', lambda game: game.count_votes(), games, args.repeat)
+    measure('count_quest', lambda game: game.count_quest(0), games, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Recording finished games, and reading stats as the history grows.
+
+Plays random games to the end, ``--players`` each drawn from ``--users``
+users of one workspace, and records ``--games`` of them into a fresh
+in-memory database. Reports the time to record a game, and the time for a
+``/davalot stats`` reply at each tenth of the way, which stays flat because
+it only ever reads the running totals.
+
+    python -m benchmarks.stats --games 10000 --users 200 --players 5-10
+"""
+import argparse
+import random
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from benchmarks.engine import player_range  # noqa: E402
+from benchmarks.state import finished, play  # noqa: E402
+from botcommands import engine  # noqa: E402
+from botcommands.engine import Action, Character, GameStage  # noqa: E402
+from stats.records import record_game, summarize  # noqa: E402
+from stats.reports import stats_message  # noqa: E402
+
+
+def finished_game(players, seed, users, rng):
+    game = play(players, seed, 0.7, finished)
+    if game.game_stage == GameStage.Assassinate:
+        assassin = next(player for player in game.player_list if player.character == Character.Assassin)
+        target = rng.choice([player for player in game.player_list if player.character.good])
+        engine.apply(game, Action(engine.TOGGLE_TARGET, assassin.username, target.username))
+        engine.apply(game, Action(engine.ASSASSINATE, assassin.username, None))
+    # the same users turn up game after game
+    for player, user in zip(game.player_list, rng.sample(users, len(game.player_list))):
+        player.id, player.username = user
+    game.seat_players(game.player_list)
+    game.team_id, game.channel_id = 'T1', 'C1'
+    return game
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--players', type=player_range, default=(5, 10))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    users = [(f"U{i:08X}", f"user{i}") for i in range(args.users)]
+    templates = [summarize(finished_game(rng.randint(*args.players), rng.random(), users, rng)) for i in range(500)]
+
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        step = max(args.games // 10, 1)
+        recording = 0
+        for i in range(args.games):
+            summary = templates[i % len(templates)]._replace(game_id=f"{i:032x}")
+            began = time.perf_counter()
+            record_game(summary)
+            recording = recording + time.perf_counter() - began
+            if (i + 1) % step == 0:
+                began = time.perf_counter()
+                for user_id, username in users[:50]:
+                    stats_message('T1', user_id)
+                reply = (time.perf_counter() - began) / min(len(users), 50)
+                print(f"{i + 1:8} games: {recording / (i + 1) * 1e3:6.2f}ms per game recorded, "
+                      f"{reply * 1e3:6.2f}ms per stats reply")
+    finally:
+        connection.creation.destroy_test_db(':memory:', verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
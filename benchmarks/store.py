@@ -0,0 +1,78 @@
+"""The tiered game store under more games than it keeps in memory.
+
+Puts ``--games`` mid-game games in a ``TieredGameStore`` holding at most
+``--hot`` in memory, in a throwaway SQLite file, then makes ``--clicks``
+load-and-save round trips. Most go to a small set of busy games and
+``--cold`` of them to any game, so some are served from memory and the
+rest reloaded from disk. Reports the time per round trip each way, how
+often games were spilled and reloaded, and how long listing the active
+games in a stage takes.
+
+    python -m benchmarks.store --games 5000 --hot 1000 --clicks 20000 --cold 0.1
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+from benchmarks.state import mid_game, play  # noqa: E402
+from botcommands.models import GameStage  # noqa: E402
+from botcommands.store import TieredGameStore  # noqa: E402
+from davalon.metrics import GAME_STORE_EVENTS  # noqa: E402
+
+
+def run(store, args):
+    rng = random.Random(args.seed)
+    templates = [play(rng.randint(5, 10), rng.random(), 0.7, mid_game) for i in range(50)]
+    keys = [f"T{i % 7}:C{i}" for i in range(args.games)]
+
+    began = time.perf_counter()
+    for i, key in enumerate(keys):
+        game = templates[i % len(templates)]
+        game.team_id, game.channel_id = key.split(':')
+        store.set(key, game)
+    elapsed = time.perf_counter() - began
+    print(f"{args.games} games in at most {args.hot} in memory: {elapsed / args.games * 1e6:.1f}us per set")
+
+    busy = keys[-args.hot // 2:]
+    timings = {True: [], False: []}
+    for i in range(args.clicks):
+        key = rng.choice(keys) if rng.random() < args.cold else rng.choice(busy)
+        hot = store.make_key(key) in store._hot
+        began = time.perf_counter()
+        game, token = store.load(key)
+        store.save(key, game, token)
+        timings[hot].append(time.perf_counter() - began)
+    for hot, name in ((True, 'in memory'), (False, 'from disk')):
+        if timings[hot]:
+            mean = sum(timings[hot]) / len(timings[hot])
+            print(f"{name:>12}: {len(timings[hot]):6} clicks, {mean * 1e6:7.1f}us per load and save")
+    events = {values[0]: series.value for values, series in GAME_STORE_EVENTS._items()}
+    print(f"  spilled {events.get('spill', 0):.0f}, reloaded {events.get('reload', 0):.0f}")
+
+    began = time.perf_counter()
+    listed = store.active_games(stage=GameStage.VoteOnQuest)
+    elapsed = time.perf_counter() - began
+    print(f"listing {len(listed)} games voting on a quest: {elapsed * 1e3:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--games', type=int, default=5000)
+    parser.add_argument('--hot', type=int, default=1000, help="games kept in memory")
+    parser.add_argument('--clicks', type=int, default=20000)
+    parser.add_argument('--cold', type=float, default=0.1, help="share of clicks on any game, not a busy one")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(TieredGameStore(path=os.path.join(directory, 'store.sqlite3'), max_games=args.hot), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-call latency of outbound Slack traffic, pooled vs not.
+
+Runs against a local fake Slack that charges ``--handshake`` seconds for
+every new connection, roughly what TCP plus TLS setup to slack.com costs.
+
+    python -m benchmarks.transport --calls 200 --handshake 0.03
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks import setup_django
+
+setup_django()
+
+import requests  # noqa: E402
+from slack import WebClient  # noqa: E402
+from benchmarks.fake_slack import FakeSlack  # noqa: E402
+from davalon import transport  # noqa: E402
+from davalon.web_client import PooledWebClient  # noqa: E402
+
+
+def measure(server, name, call, calls):
+    connections = server.connections
+    timings = []
+    for i in range(calls):
+        began = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - began)
+    timings.sort()
+    print(f"{name:>32}: mean {statistics.mean(timings) * 1000:7.2f}ms  "
+          f"p50 {timings[len(timings) // 2] * 1000:7.2f}ms  "
+          f"p99 {timings[int(len(timings) * 0.99) - 1] * 1000:7.2f}ms  "
+          f"{server.connections - connections} connection(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--handshake', type=float, default=0.03, help="seconds per new connection")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per request")
+    args = parser.parse_args()
+
+    server = FakeSlack(latency=args.latency, handshake=args.handshake).start()
+    response_url = server.response_url()
+    body = {'replace_original': True, 'blocks': []}
+    stock = WebClient('xoxb-benchmark', base_url=server.api_url)
+    pooled = PooledWebClient('xoxb-benchmark', base_url=server.api_url)
+
+    print(f"{args.calls} sequential calls, {args.handshake * 1000:.0f}ms per new connection")
+    measure(server, "requests.post(response_url)", lambda: requests.post(response_url, json=body), args.calls)
+    measure(server, "transport.post(response_url)", lambda: transport.post(response_url, json=body), args.calls)
+    measure(server, "WebClient.chat_postMessage", lambda: stock.chat_postMessage(channel='C1', text='hi'), args.calls)
+    measure(server, "PooledWebClient.chat_postMessage", lambda: pooled.chat_postMessage(channel='C1', text='hi'), args.calls)
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
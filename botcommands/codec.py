@@ -0,0 +1,172 @@
+"""Compact, versioned serialization of ``Game`` for the game store.
+
+A game is written as a two byte header (format version, flags) followed by
+compact JSON. Characters and stages are small ints, and every reference to a
+player (quest picks, votes, quest cards, assassination target) is the
+player's seat, their index in ``player_list``. Older deploys could store
+references to people who weren't playing by username; those are dropped
+when read, as the game only holds players. Bodies over
+``COMPRESS_THRESHOLD`` bytes are zlib compressed when that makes them smaller.
+
+When the layout changes, bump ``VERSION`` and add a function to
+``MIGRATIONS`` that upgrades a decoded body from the previous version, so
+games saved by an older deploy still load.
+"""
+import json
+import uuid
+import zlib
+
+from botcommands.engine import QUESTS
+from botcommands.models import Character, Game, GameStage, User
+
+VERSION = 3
+
+FLAG_ZLIB = 0x01
+
+COMPRESS_THRESHOLD = 512
+
+# Append only, the index is what gets stored
+CHARACTERS = (
+    Character.Merlin,
+    Character.Servant,
+    Character.Percival,
+    Character.Assassin,
+    Character.Morgana,
+    Character.Oberon,
+    Character.Mordred,
+    Character.Minion,
+)
+CHARACTER_IDS = {character: i for i, character in enumerate(CHARACTERS)}
+
+STAGES = {stage.value: stage for stage in GameStage}
+
+
+def _add_board_version(body):
+    # version 2 added the game id, board version and board fingerprint
+    return body + [uuid.uuid4().hex, 0, None]
+
+
+def _add_team(body):
+    # version 3 added the workspace's team id
+    return body + [None]
+
+
+# version -> function upgrading a body of that version to the next one
+MIGRATIONS = {
+    1: _add_board_version,
+    2: _add_team,
+}
+
+
+class CodecError(Exception):
+    pass
+
+
+def _is_seat(game, ref):
+    # anything but a seat was someone who wasn't playing
+    return isinstance(ref, int) and 0 <= ref < len(game.player_list)
+
+
+def _seats(game, refs):
+    return [ref for ref in refs if _is_seat(game, ref)]
+
+
+def _decode_results(game, results):
+    return [(ref, bool(result)) for ref, result in results if _is_seat(game, ref)]
+
+
+def _encode_results(game, results):
+    return [[game.seats[player.username], int(result)] for player, result in results]
+
+
+def to_body(game):
+    target = game.assassination_target
+    return [
+        game.channel_id,
+        game.slack_message_ts,
+        game.admin_user,
+        game.game_stage.value,
+        game.player_turn_index,
+        game.hammer_index,
+        game.round,
+        [[player.username,
+          player.id,
+          CHARACTER_IDS[player.character] if player.character else None,
+          player.turn_order] for player in game.player_list],
+        sorted(CHARACTER_IDS[character] for character in game.character_list),
+        [game.seats[player.username] for player in game.questers],
+        _encode_results(game, game.votes()),
+        [_encode_results(game, game.quest_cards(i)) for i in range(QUESTS)],
+        game.seats.get(target.username) if target else None,
+        game.message,
+        game.game_id,
+        game.version,
+        game.board_fingerprint,
+        game.team_id,
+    ]
+
+
+def from_body(body):
+    (channel_id, slack_message_ts, admin_user, stage, player_turn_index, hammer_index, round_num,
+     players, characters, quest_players, votes, quest_results, target, message,
+     game_id, version, board_fingerprint, team_id) = body
+
+    game = Game()
+    game.channel_id = channel_id
+    game.slack_message_ts = slack_message_ts
+    game.admin_user = admin_user
+    game.game_stage = STAGES[stage]
+    game.player_turn_index = player_turn_index
+    game.hammer_index = hammer_index
+    game.round = round_num
+
+    game.seat_players([User({'username': username, 'id': user_id,
+                             'character': CHARACTERS[character] if character is not None else None,
+                             'turn_order': turn_order})
+                       for username, user_id, character, turn_order in players])
+
+    game.character_list = set(CHARACTERS[i] for i in characters)
+    game.questers = [game.player_list[seat] for seat in _seats(game, quest_players)]
+    for seat, approve in _decode_results(game, votes):
+        game.record_vote(seat, approve)
+    for quest_num, results in enumerate(quest_results):
+        for seat, succeed in _decode_results(game, results):
+            game.record_quest_card(quest_num, seat, succeed)
+    game.assassination_target = game.player_list[target] if _is_seat(game, target) else None
+    game.message = message
+    game.game_id = game_id
+    game.version = version
+    game.board_fingerprint = board_fingerprint
+    game.team_id = team_id
+    return game
+
+
+def encode(game, compress=True):
+    body = json.dumps(to_body(game), separators=(',', ':')).encode('utf-8')
+    flags = 0
+    if compress and len(body) > COMPRESS_THRESHOLD:
+        compressed = zlib.compress(body)
+        if len(compressed) < len(body):
+            body = compressed
+            flags = flags | FLAG_ZLIB
+    return bytes((VERSION, flags)) + body
+
+
+def decode(value):
+    if len(value) < 2:
+        raise CodecError("truncated game")
+    version, flags = value[0], value[1]
+    if version > VERSION:
+        raise CodecError(f"can't read game format version {version}")
+
+    body = value[2:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    body = json.loads(body.decode('utf-8'))
+
+    while version < VERSION:
+        if version not in MIGRATIONS:
+            raise CodecError(f"no migration from game format version {version}")
+        body = MIGRATIONS[version](body)
+        version = version + 1
+    return from_body(body)
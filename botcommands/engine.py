@@ -0,0 +1,586 @@
+"""The rules of Avalon, free of Django and Slack.
+
+A game is a ``GameState`` and everything that can happen to it is an
+``Action``. ``apply(state, action)`` checks the action is allowed, applies it
+and returns the state, changed in place:
+
+    state = GameState()
+    state = apply(state, Action(JOIN, 'alice', 'U1'))
+    ...
+    state = apply(state, Action(START, 'alice'), rng=random.Random(1))
+
+Illegal actions raise ``IllegalAction`` and leave the state as it was.
+``botcommands.models.Game`` is a ``GameState`` with the app's settings, and
+the actions view turns button clicks into ``Action``s.
+
+The numbers behind the rules (team sizes, quest sizes, how many fails sink a
+quest, which characters come as a pair) are a ``Ruleset``, compiled once
+from a plain description such as ``STANDARD_RULES`` into tables the game
+looks up. A variant is another description passed to ``register_ruleset``.
+"""
+import random
+from collections import namedtuple
+from enum import Enum
+from itertools import combinations
+
+Char = namedtuple('Char', ['id', 'name', 'team'])
+
+
+class Character(Enum):
+    Merlin = Char('merlin', 'Merlin', 'Blue')
+    Servant = Char('servant', 'Loyal Servant of Arthur', 'Blue')
+    Percival = Char('percival', 'Percival', 'Blue')
+    Assassin = Char('assassin', 'Assassin',  'Red')
+    Morgana = Char('morgana', 'Morgana', 'Red')
+    Oberon = Char('oberon', 'Oberon', 'Red')
+    Mordred = Char('mordred', 'Mordred', 'Red')
+    Minion = Char('minion', 'Minion of Mordred', 'Red')
+
+    @staticmethod
+    def from_id(id):
+        for character in Character.all():
+            if character.id == id:
+                return character
+
+    @property
+    def name(self):
+        return self.value.name
+
+    @property
+    def id(self):
+        return self.value.id
+
+    @property
+    def team(self):
+        return self.value.team
+
+    @property
+    def good(self):
+        return self.value.team.lower() == 'blue'
+
+    @property
+    def evil(self):
+        return not self.good
+
+    @staticmethod
+    def all():
+        return [Character.Merlin,
+                Character.Percival,
+                Character.Servant,
+                Character.Assassin,
+                Character.Mordred,
+                Character.Morgana,
+                Character.Oberon,
+                Character.Minion]
+
+
+class GameStage(Enum):
+    Lobby = 0
+    ChooseQuest = 1
+    VoteOnQuest = 2
+    CompleteQuest = 3
+    Assassinate = 4
+    Lost = 5
+    Won = 6
+
+
+class User:
+    __slots__ = ('username', 'id', 'character', 'turn_order')
+
+    # default constructor
+    def __init__(self, dictionary):
+        self.username = None
+        self.id = None
+        self.character = None
+        self.turn_order = None
+        for key in dictionary:
+            setattr(self, key, dictionary[key])
+
+    def username_link(self):
+        return f"<@{self.username}>"
+
+
+# Every table is by number of players, and the description only holds
+# lists, ints and strings so a variant can come from JSON
+STANDARD_RULES = {
+    'name': 'standard',
+    # good and evil players
+    'teams': {5: [3, 2], 6: [4, 2], 7: [4, 3], 8: [5, 3], 9: [6, 3], 10: [6, 4]},
+    # players sent on each of the five quests
+    'questers': {
+        5: [2, 3, 2, 3, 3],
+        6: [2, 3, 4, 3, 4],
+        7: [2, 3, 3, 4, 4],
+        8: [3, 4, 4, 5, 5],
+        9: [3, 4, 4, 5, 5],
+        10: [3, 4, 4, 5, 5],
+    },
+    # fail cards it takes to fail each quest, one where not given
+    'fails': {7: [1, 1, 1, 2, 1], 8: [1, 1, 1, 2, 1], 9: [1, 1, 1, 2, 1], 10: [1, 1, 1, 2, 1]},
+    # characters only ever in a game together
+    'pairs': [['percival', 'morgana']],
+}
+
+QUESTS = 5
+
+# Characters chosen in the lobby, the rest of each team is filled with
+# servants and minions. The order is the order they are dealt from.
+SPECIAL_CHARACTERS = (Character.Merlin, Character.Percival, Character.Assassin,
+                      Character.Mordred, Character.Morgana, Character.Oberon)
+
+# in every game, so they can't be toggled off
+ALWAYS_PRESENT = (Character.Merlin, Character.Assassin)
+
+# The roles dealt for a choice of characters and number of players
+Cast = namedtuple('Cast', ['good', 'evil', 'servants', 'minions', 'all'])
+
+
+class Ruleset:
+    def __init__(self, description):
+        self.name = description['name']
+        # keys may be strings when the description was JSON
+        teams = {int(players): tuple(sizes) for players, sizes in description['teams'].items()}
+        questers = {int(players): tuple(sizes) for players, sizes in description['questers'].items()}
+        fails = {int(players): tuple(counts) for players, counts in description.get('fails', {}).items()}
+        for players, (good, evil) in teams.items():
+            if good + evil != players:
+                raise ValueError(f"{self.name}: teams for {players} players don't add up")
+            if len(questers.get(players, ())) != QUESTS or max(questers[players]) > players:
+                raise ValueError(f"{self.name}: needs {QUESTS} quests of at most {players} for {players} players")
+
+        self.min_players = min(teams)
+        self.max_players = max(teams)
+        self.teams = teams
+        self.questers = questers
+        self.fails = {players: fails.get(players, (1,) * QUESTS) for players in teams}
+
+        self.partners = {}
+        for pair in description.get('pairs', ()):
+            characters = tuple(Character.from_id(id) for id in pair)
+            for character in characters:
+                self.partners[character] = characters
+
+        # every choice of characters that fits some game, the fewest players
+        # it needs and what is dealt for each number of players it fits
+        self.min_players_for = {}
+        self.casts = {}
+        for size in range(len(SPECIAL_CHARACTERS) + 1):
+            for chosen in combinations(SPECIAL_CHARACTERS, size):
+                if any(not set(self.partners.get(character, ())).issubset(chosen) for character in chosen):
+                    continue
+                good = tuple(character for character in chosen if character.good)
+                evil = tuple(character for character in chosen if character.evil)
+                for players in sorted(teams):
+                    good_count, evil_count = teams[players]
+                    if len(good) > good_count or len(evil) > evil_count:
+                        continue
+                    servants = good_count - len(good)
+                    minions = evil_count - len(evil)
+                    self.min_players_for.setdefault(frozenset(chosen), players)
+                    self.casts[frozenset(chosen), players] = Cast(
+                        good, evil, servants, minions,
+                        chosen + (Character.Servant,) * servants + (Character.Minion,) * minions)
+
+
+RULESETS = {}
+
+
+def register_ruleset(description):
+    ruleset = Ruleset(description)
+    RULESETS[ruleset.name] = ruleset
+    return ruleset
+
+
+STANDARD = register_ruleset(STANDARD_RULES)
+
+
+class GameState:
+    """A game, laid out by seat.
+
+    ``player_list`` is in seat order, which is the turn order once the game
+    has started, and ``seats`` maps each username to its seat. Who has voted
+    and approved, and who has played and failed each quest, are bitmasks
+    over seats with running tallies beside them, so counting a vote or a
+    quest doesn't go back over the cards. Every mutable value is made per
+    game in ``__init__``.
+    """
+    __slots__ = ('channel_id', 'admin_user', 'game_stage', 'player_turn_index', 'hammer_index', 'round',
+                 'player_list', 'seats', 'character_list', 'questers', 'voted', 'approved', 'votes_for',
+                 'votes_against', 'quest_played', 'quest_failed', 'quest_succeeds', 'quest_fails',
+                 'assassination_target', 'message')
+
+    rules = STANDARD
+
+    # lets anyone act out of turn, for trying a game out alone
+    debug = False
+
+    def __init__(self):
+        self.channel_id = None
+        self.admin_user = None
+        self.game_stage = GameStage.Lobby
+        self.player_turn_index = 0
+        self.hammer_index = None
+        self.round = 0
+        self.player_list = []
+        self.seats = {}
+        self.character_list = set(ALWAYS_PRESENT)
+        self.reset_proposed_quest()
+        self.quest_played = [0] * QUESTS
+        self.quest_failed = [0] * QUESTS
+        self.quest_succeeds = [0] * QUESTS
+        self.quest_fails = [0] * QUESTS
+        self.assassination_target = None
+        self.message = None
+
+    def seat_players(self, players):
+        """Make ``players`` the table, in seat order."""
+        self.player_list = players
+        self.seats = {player.username: seat for seat, player in enumerate(players)}
+
+    def record_vote(self, seat, approve):
+        bit = 1 << seat
+        if self.voted & bit:
+            # changing a vote takes back the one before
+            if self.approved & bit:
+                self.votes_for = self.votes_for - 1
+            else:
+                self.votes_against = self.votes_against - 1
+        self.voted = self.voted | bit
+        if approve:
+            self.approved = self.approved | bit
+            self.votes_for = self.votes_for + 1
+        else:
+            self.approved = self.approved & ~bit
+            self.votes_against = self.votes_against + 1
+
+    def votes(self):
+        """``(player, approved)`` for everyone who has voted, by seat."""
+        return [(player, bool(self.approved >> seat & 1))
+                for seat, player in enumerate(self.player_list) if self.voted >> seat & 1]
+
+    def record_quest_card(self, round_num, seat, succeed):
+        bit = 1 << seat
+        if self.quest_played[round_num] & bit:
+            if self.quest_failed[round_num] & bit:
+                self.quest_fails[round_num] = self.quest_fails[round_num] - 1
+            else:
+                self.quest_succeeds[round_num] = self.quest_succeeds[round_num] - 1
+        self.quest_played[round_num] = self.quest_played[round_num] | bit
+        if succeed:
+            self.quest_failed[round_num] = self.quest_failed[round_num] & ~bit
+            self.quest_succeeds[round_num] = self.quest_succeeds[round_num] + 1
+        else:
+            self.quest_failed[round_num] = self.quest_failed[round_num] | bit
+            self.quest_fails[round_num] = self.quest_fails[round_num] + 1
+
+    def quest_cards(self, round_num):
+        """``(player, succeeded)`` for everyone who has played on the quest, by seat."""
+        played = self.quest_played[round_num]
+        failed = self.quest_failed[round_num]
+        return [(player, not failed >> seat & 1)
+                for seat, player in enumerate(self.player_list) if played >> seat & 1]
+
+    def count_quest(self, round_num):
+        if not self.quest_played[round_num]:
+            return None
+
+        fails = self.quest_fails[round_num]
+        succeeds = self.quest_succeeds[round_num]
+        return fails < self.rules.fails[len(self.player_list)][round_num], succeeds, fails
+
+    def next_round(self):
+        total_fails = 0
+        total_passes = 0
+        for i in range(0, (self.round + 1)):
+            if self.quest_played[i]:
+                result, succeed_count, fail_count = self.count_quest(i)
+                if result:
+                    total_passes = total_passes + 1
+                else:
+                    total_fails = total_fails + 1
+
+        self.reset_proposed_quest()
+
+        if total_passes >= 3:
+            self.game_stage = GameStage.Assassinate
+        elif total_fails >= 3:
+            self.game_stage = GameStage.Lost
+        else:
+            self.game_stage = GameStage.ChooseQuest
+            self.round = self.round + 1
+            self.player_turn_index = self.player_turn_index + 1
+            if self.player_turn_index >= len(self.player_list):
+                self.player_turn_index = 0
+            self.hammer_index = (self.player_turn_index + 4)
+            if self.hammer_index >= len(self.player_list):
+                self.hammer_index = self.hammer_index - len(self.player_list)
+
+    def count_votes(self):
+        return self.votes_for > self.votes_against
+
+    def find_player_by_username(self, username):
+        seat = self.seats.get(username)
+        if seat is not None:
+            return self.player_list[seat]
+
+    def get_min_players(self):
+        """The fewest players the chosen characters need, None if no game fits them."""
+        return self.rules.min_players_for.get(frozenset(self.character_list))
+
+    def get_quester_count(self, round=None):
+        return self.rules.questers[len(self.player_list)][self.round if round is None else round]
+
+    def reset_proposed_quest(self):
+        self.questers = []
+        self.voted = 0
+        self.approved = 0
+        self.votes_for = 0
+        self.votes_against = 0
+
+    def get_characters(self):
+        """The roles to deal, for the players so far or the fewest the game needs."""
+        chosen = frozenset(self.character_list)
+        min_players = self.rules.min_players_for.get(chosen)
+        if min_players is None:
+            return None
+        players = min(max(min_players, len(self.player_list)), self.rules.max_players)
+        cast = self.rules.casts[chosen, players]
+        return {'good': list(cast.good), 'bad': list(cast.evil), 'minions': cast.minions,
+                'servants': cast.servants, 'all': list(cast.all)}
+
+
+class IllegalAction(Exception):
+    pass
+
+
+# Action kinds, and the value each is applied with
+JOIN = 'join'                      # the player's user id
+LEAVE = 'leave'
+TOGGLE_CHARACTER = 'toggle_character'  # a Character id
+START = 'start'                    # optional seed for dealing the roles
+TOGGLE_QUESTER = 'toggle_quester'  # a username
+SEND_QUEST = 'send_quest'
+VOTE = 'vote'                      # True to approve
+QUEST = 'quest'                    # True to succeed
+ACT_AS = 'act_as'                  # a username
+TOGGLE_TARGET = 'toggle_target'    # a username
+ASSASSINATE = 'assassinate'
+
+Action = namedtuple('Action', ['kind', 'username', 'value'])
+Action.__new__.__defaults__ = (None,)
+
+
+def verify_user_turn(state, username):
+    seat = state.seats.get(username)
+    if seat is None:
+        raise IllegalAction("not in this game")
+    is_valid = False
+    if state.game_stage == GameStage.ChooseQuest:
+        is_valid = seat == state.player_turn_index
+    elif state.game_stage == GameStage.VoteOnQuest:
+        is_valid = True
+    elif state.game_stage == GameStage.CompleteQuest:
+        for quester in state.questers:
+            if quester.username == username:
+                is_valid = True
+    elif state.game_stage == GameStage.Assassinate:
+        is_valid = state.player_list[seat].character == Character.Assassin
+
+    if not is_valid and not state.debug:
+        raise IllegalAction("not your turn")
+    return seat
+
+
+def verify_lobby(state):
+    # seats are fixed once the roles are dealt
+    if state.game_stage != GameStage.Lobby:
+        raise IllegalAction("the game has already started")
+
+
+def verify_stage(state, stage):
+    # a click on a board from earlier in the game
+    if state.game_stage != stage:
+        raise IllegalAction(f"can't do that during {state.game_stage.name}")
+
+
+def join(state, username, user_id):
+    verify_lobby(state)
+    new_player_list = []
+    for player in state.player_list:
+        if player.username != username:
+            new_player_list.append(player)
+    new_player_list.append(User({'username': username, 'id': user_id}))
+    state.seat_players(new_player_list)
+
+
+def leave(state, username):
+    verify_lobby(state)
+    new_player_list = []
+    for player in state.player_list:
+        if player.username != username:
+            new_player_list.append(player)
+    state.seat_players(new_player_list)
+
+
+def toggle_character(state, character_id):
+    verify_lobby(state)
+    character = Character.from_id(character_id)
+    if character not in SPECIAL_CHARACTERS:
+        raise IllegalAction(f"unknown character {character_id}")
+    if character in ALWAYS_PRESENT:
+        raise IllegalAction(f"every game has {character.name}")
+    together = state.rules.partners.get(character, (character,))
+    if character in state.character_list:
+        state.character_list.difference_update(together)
+    else:
+        state.character_list.update(together)
+
+
+def start(state, rng=random):
+    verify_lobby(state)
+    number_of_players = len(state.player_list)
+    min_players = state.get_min_players()
+    if min_players is None:
+        raise IllegalAction("Too many special characters!")
+    if number_of_players < min_players:
+        raise IllegalAction("Not enough players!")
+    if number_of_players > state.rules.max_players:
+        raise IllegalAction("Too many players!")
+
+    state.player_turn_index = 0
+    state.hammer_index = 4
+    state.game_stage = GameStage.ChooseQuest
+
+    possible_characters = state.get_characters()
+    rng.shuffle(possible_characters['all'])
+    rng.shuffle(state.player_list)
+    for i in range(len(state.player_list)):
+        state.player_list[i].turn_order = i
+        state.player_list[i].character = possible_characters['all'][i]
+    state.seat_players(state.player_list)
+
+    state.message = "_Roles have been sent, check your DMs_"
+
+
+def toggle_quester(state, username, selected_user):
+    verify_stage(state, GameStage.ChooseQuest)
+    verify_user_turn(state, username)
+
+    new_quester = state.find_player_by_username(selected_user)
+    if new_quester is None:
+        raise IllegalAction(f"{selected_user} is not in this game")
+    current_quest = state.questers
+    exists = False
+    updated_quest_list = []
+    for i in current_quest:
+        if i.username == selected_user:
+            exists = True
+        else:
+            updated_quest_list.append(i)
+    if not exists:
+        updated_quest_list.append(new_quester)
+    state.questers = updated_quest_list
+
+
+def send_quest(state, username):
+    verify_stage(state, GameStage.ChooseQuest)
+    verify_user_turn(state, username)
+    if len(state.questers) == state.get_quester_count():
+        state.game_stage = GameStage.VoteOnQuest
+
+
+def vote(state, username, approve):
+    verify_stage(state, GameStage.VoteOnQuest)
+    seat = verify_user_turn(state, username)
+    state.record_vote(seat, approve)
+
+    if state.votes_for + state.votes_against == len(state.player_list):
+        vote_summary = "for:"
+        for player in state.questers:
+            vote_summary = vote_summary + " " + player.username_link()
+        for player, approved in state.votes():
+            vote_summary = vote_summary + f"\n{player.username_link()} : *{'Approved' if approved else 'Rejected'}*"
+        if state.count_votes():
+            # vote passed
+            state.game_stage = GameStage.CompleteQuest
+            state.message = f"Vote *passed* {vote_summary}"
+        else:
+            state.message = f"Vote *did not pass*\n{vote_summary}"
+            state.reset_proposed_quest()
+            if state.hammer_index != state.player_turn_index:
+                state.player_turn_index = state.player_turn_index + 1
+                if state.player_turn_index >= len(state.player_list):
+                    state.player_turn_index = 0
+                state.game_stage = GameStage.ChooseQuest
+            else:
+                state.game_stage = GameStage.Lost
+
+
+def quest(state, username, succeed):
+    verify_stage(state, GameStage.CompleteQuest)
+    seat = verify_user_turn(state, username)
+    voter = state.player_list[seat]
+    state.record_quest_card(state.round, seat, voter.character.good or succeed)
+    if state.quest_succeeds[state.round] + state.quest_fails[state.round] == state.get_quester_count():
+        quest_succeeded, succeeds, fails = state.count_quest(state.round)
+        if quest_succeeded:
+            state.message = "*Quest SUCCEEDED!*"
+        else:
+            state.message = "*Quest FAILED!*"
+
+        state.next_round()
+
+
+def act_as(state, username):
+    state.admin_user = username
+
+
+def toggle_target(state, username, selected_user):
+    verify_stage(state, GameStage.Assassinate)
+    verify_user_turn(state, username)
+    state.assassination_target = state.find_player_by_username(selected_user)
+
+
+def assassinate(state, username):
+    verify_stage(state, GameStage.Assassinate)
+    verify_user_turn(state, username)
+    if not state.assassination_target:
+        return
+
+    merlin_id = None
+    for user in state.player_list:
+        if user.character == Character.Merlin:
+            merlin_id = user.id
+
+    state.game_stage = GameStage.Lost if state.assassination_target.id == merlin_id else GameStage.Won
+
+
+def apply(state, action, rng=random):
+    """Apply ``action`` to ``state`` and return it."""
+    kind, username, value = action
+    if kind == JOIN:
+        join(state, username, value)
+    elif kind == LEAVE:
+        leave(state, username)
+    elif kind == TOGGLE_CHARACTER:
+        toggle_character(state, value)
+    elif kind == START:
+        # a seeded deal replays the same way from a log
+        start(state, rng if value is None else random.Random(value))
+    elif kind == TOGGLE_QUESTER:
+        toggle_quester(state, username, value)
+    elif kind == SEND_QUEST:
+        send_quest(state, username)
+    elif kind == VOTE:
+        vote(state, username, value)
+    elif kind == QUEST:
+        quest(state, username, value)
+    elif kind == ACT_AS:
+        act_as(state, value)
+    elif kind == TOGGLE_TARGET:
+        toggle_target(state, username, value)
+    elif kind == ASSASSINATE:
+        assassinate(state, username)
+    else:
+        raise IllegalAction(f"unknown action {kind}")
+    return state
@@ -0,0 +1,261 @@
+"""A durable log of every game, so games survive the cache.
+
+The game store is only a cache: a restart or an eviction loses whatever game
+was in it. Every engine ``Action`` a click applies is therefore also appended
+to a per-channel log in SQLite, and every ``GAME_JOURNAL_SNAPSHOT_EVERY``
+versions, or when something outside the engine changes a game, a compact
+snapshot of the whole game is written and the log before it dropped. A lost
+game is recovered by replaying its log on top of its last snapshot.
+
+Writes are behind: appends are queued in memory and a background thread
+commits them in batches every ``GAME_JOURNAL_FLUSH_INTERVAL`` seconds, so a
+click never waits on the disk. A crash loses at most that last interval.
+
+The log is plain ``sqlite3`` rather than models: it may be its own file
+(``GAME_JOURNAL_PATH``) whatever database Django uses, and it is written
+only by that one thread, in batches, on a connection it keeps open, which
+the ORM's per-thread connections and per-row saves would undo.
+
+An event that no longer applies, say after a change to the rules, ends the
+replay: the game comes back at the last version that applied in full.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from itertools import groupby
+
+from django.conf import settings
+from botcommands import codec, engine
+
+logger = logging.getLogger(__name__)
+
+
+def _default_path():
+    database = settings.DATABASES.get('default', {})
+    if database.get('ENGINE') == 'django.db.backends.sqlite3':
+        return database.get('NAME')
+    return None
+
+
+GAME_JOURNAL_PATH = getattr(settings, 'GAME_JOURNAL_PATH', None) or _default_path()
+GAME_JOURNAL_SNAPSHOT_EVERY = getattr(settings, 'GAME_JOURNAL_SNAPSHOT_EVERY', 50)
+GAME_JOURNAL_FLUSH_INTERVAL = getattr(settings, 'GAME_JOURNAL_FLUSH_INTERVAL', 0.5)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS game_snapshot (
+    channel TEXT PRIMARY KEY,
+    game_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS game_event (
+    channel TEXT NOT NULL,
+    game_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    kind TEXT,
+    username TEXT,
+    value TEXT,
+    PRIMARY KEY (channel, game_id, version, seq)
+);
+"""
+
+_STOP = ('stop', None)
+
+
+def new_seed():
+    """A seed for a logged ``START``, so replaying it deals the same roles."""
+    return random.getrandbits(63)
+
+
+class GameJournal:
+    def __init__(self, path=GAME_JOURNAL_PATH, snapshot_every=GAME_JOURNAL_SNAPSHOT_EVERY,
+                 flush_interval=GAME_JOURNAL_FLUSH_INTERVAL):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._snapshot_versions = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._schema_ready = False
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        if not self._schema_ready:
+            connection.executescript(SCHEMA)
+            self._schema_ready = True
+        return connection
+
+    def append(self, channel, game, actions):
+        """Log the ``actions`` that took ``game`` to its current version.
+
+        Called once the new version has been saved, in the channel's turn.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            game_id, since = self._snapshot_versions.get(channel, (None, None))
+        if game_id != game.game_id or game.version - since >= self.snapshot_every:
+            self.snapshot(channel, game)
+            return
+        rows = [(channel, game.game_id, game.version, seq, kind, username, json.dumps(value))
+                for seq, (kind, username, value) in enumerate(actions)]
+        # a click that changed nothing still moves the version on
+        self._put(('events', rows or [(channel, game.game_id, game.version, 0, None, None, 'null')]))
+
+    def snapshot(self, channel, game):
+        """Log the whole game, for changes made outside the engine."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._snapshot_versions[channel] = (game.game_id, game.version)
+        self._put(('snapshot', (channel, game.game_id, game.version, codec.encode(game), time.time())))
+
+    def forget(self, channel, game_id):
+        """Drop the log of a game that has ended or expired, so it can't be restored."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._snapshot_versions.get(channel, (None,))[0] == game_id:
+                del self._snapshot_versions[channel]
+        self._put(('forget', (channel, game_id)))
+
+    def recover(self, channel):
+        """Rebuild the channel's game from the log, or return None."""
+        if not self.enabled:
+            return None
+        self.flush()
+        connection = self.connect()
+        try:
+            row = connection.execute(
+                'SELECT game_id, version, data FROM game_snapshot WHERE channel = ?', (channel,)).fetchone()
+            if not row:
+                return None
+            game_id, version, data = row
+            events = connection.execute(
+                'SELECT version, kind, username, value FROM game_event '
+                'WHERE channel = ? AND game_id = ? AND version > ? ORDER BY version, seq',
+                (channel, game_id, version)).fetchall()
+        finally:
+            connection.close()
+
+        game = self.replay(channel, bytes(data), events)
+        # forces the next board out, whatever was on screen before
+        game.board_fingerprint = None
+        if events and game.version < events[-1][0]:
+            # starts the log again from here, without the events that failed
+            self.snapshot(channel, game)
+        else:
+            with self._lock:
+                self._snapshot_versions.setdefault(channel, (game_id, version))
+        logger.info("recovered game in %s at version %s from %d event(s)", channel, game.version, len(events))
+        return game
+
+    def replay(self, channel, data, events):
+        """The snapshot ``data`` with ``events`` applied, up to the last version that applies."""
+        game = codec.decode(data)
+        game.character_list = set(game.character_list)
+        for event_version, group in groupby(events, key=lambda event: event[0]):
+            try:
+                for _, kind, username, value in group:
+                    if kind:
+                        engine.apply(game, engine.Action(kind, username, json.loads(value)))
+            except engine.IllegalAction as e:
+                logger.warning("stopped replaying %s at version %s: %s", channel, event_version, e)
+                # the version may be partly applied, so go again without it
+                return self.replay(channel, data, [event for event in events if event[0] < event_version])
+            game.version = event_version
+        return game
+
+    def restore(self, store, channel):
+        """Put the channel's game back into ``store`` from the log."""
+        game = self.recover(channel)
+        if game is None:
+            return False
+        store.set(channel, game)
+        return True
+
+    def flush(self):
+        """Block until everything appended so far is committed."""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        done.wait()
+
+    def stop(self):
+        if self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._pid = None
+
+    def _put(self, item):
+        self._start()
+        self._queue.put(item)
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name='game-journal', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        connection = self.connect()
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # gather whatever else arrives within the interval into one commit
+            while items[-1][0] not in ('flush', 'stop'):
+                try:
+                    items.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(connection, items)
+            except Exception:
+                logger.exception("couldn't write %d journal item(s)", len(items))
+            for kind, payload in items:
+                if kind == 'flush':
+                    payload.set()
+            if items[-1] is _STOP:
+                connection.close()
+                return
+
+    @staticmethod
+    def _write(connection, items):
+        with connection:
+            for kind, payload in items:
+                if kind == 'events':
+                    connection.executemany('INSERT OR REPLACE INTO game_event VALUES (?, ?, ?, ?, ?, ?, ?)', payload)
+                elif kind == 'snapshot':
+                    channel = payload[0]
+                    connection.execute('INSERT OR REPLACE INTO game_snapshot VALUES (?, ?, ?, ?, ?)', payload)
+                    # everything logged before the snapshot, and older games, are no longer
+                    # needed; after a replay that stopped short that includes later versions
+                    connection.execute('DELETE FROM game_event WHERE channel = ?', (channel,))
+                elif kind == 'forget':
+                    connection.execute('DELETE FROM game_snapshot WHERE channel = ? AND game_id = ?', payload)
+                    connection.execute('DELETE FROM game_event WHERE channel = ? AND game_id = ?', payload)
+
+
+journal = GameJournal()
@@ -0,0 +1,74 @@
+"""Who each player learns about at the start of a game.
+
+What a character is shown is declared in ``SIGHT``: the characters they see
+and how the role DM words it. ``knowledge`` turns a dealt game into one
+bitmask per seat, bit ``i`` set when that player sees the player in seat
+``i``, in one pass over the seats per character seen, and ``role_messages``
+writes every player's DM from those masks.
+"""
+from collections import namedtuple
+
+from botcommands.engine import Character
+
+EVIL = frozenset(character for character in Character if character.evil)
+
+# characters seen, and the line added to the DM: the wording when one
+# player is seen, when several are, and what goes between their names
+Sight = namedtuple('Sight', ['characters', 'one', 'many', 'joiner'])
+
+_EVIL_SIGHT = Sight(EVIL - {Character.Oberon},
+                    "\n_Other Evil Players:_ \n{players}", "\n_Other Evil Players:_ \n{players}", "\n")
+
+SIGHT = {
+    # Mordred is hidden from Merlin
+    Character.Merlin: Sight(EVIL - {Character.Mordred},
+                            "\n_Evil Players:_ \n{players}", "\n_Evil Players:_ \n{players}", "\n"),
+    # Morgana appears to Percival as Merlin
+    Character.Percival: Sight(frozenset({Character.Merlin, Character.Morgana}),
+                              "\n_Merlin is_ {players}", "\n_Merlin is either_ {players}", " _or_ "),
+    # evil know each other, except Oberon, who neither sees nor is seen by them
+    Character.Assassin: _EVIL_SIGHT,
+    Character.Morgana: _EVIL_SIGHT,
+    Character.Mordred: _EVIL_SIGHT,
+    Character.Minion: _EVIL_SIGHT,
+}
+
+
+def knowledge(players, sight=SIGHT):
+    """One bitmask per seat of the seats that player sees."""
+    holders = {}
+    for seat, player in enumerate(players):
+        holders[player.character] = holders.get(player.character, 0) | (1 << seat)
+
+    seen = {}
+    for character in holders:
+        rule = sight.get(character)
+        mask = 0
+        if rule:
+            for shown in rule.characters:
+                mask = mask | holders.get(shown, 0)
+        seen[character] = mask
+    return [seen[player.character] & ~(1 << seat) for seat, player in enumerate(players)]
+
+
+def seats(mask):
+    seat = 0
+    while mask:
+        if mask & 1:
+            yield seat
+        mask = mask >> 1
+        seat = seat + 1
+
+
+def role_messages(players, sight=SIGHT):
+    """``(user_id, username, text)`` of every player's role DM."""
+    messages = []
+    for player, mask in zip(players, knowledge(players, sight)):
+        text = "Your character is: *" + player.character.name + "*\nTeam is *" + player.character.team + "*"
+        rule = sight.get(player.character)
+        if rule and mask:
+            links = [players[seat].username_link() for seat in seats(mask)]
+            template = rule.one if len(links) == 1 else rule.many
+            text = text + template.format(players=rule.joiner.join(links))
+        messages.append((player.id, player.username, text))
+    return messages
@@ -0,0 +1,407 @@
+"""Where games live between requests.
+
+Every click is a read-modify-write of the channel's ``Game``. Stores hand out
+a token with each ``load`` and ``save`` only succeeds if nobody else has
+written the game since, so the dispatcher (``actions.dispatcher``) can retry
+instead of losing a vote when two workers handle clicks for the same channel
+at once.
+
+Games are kept under ``game_key(team_id, channel)``, as one deployment serves
+many workspaces and a channel shared between them has the same id in each.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from botcommands import codec
+from botcommands.codec import STAGES
+from botcommands.journal import journal
+from botcommands.models import GameStage
+from davalon.metrics import GAME_SIZE_BYTES, GAME_STORE_EVENTS, STORE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GAME_STORE = getattr(settings, 'GAME_STORE', {'BACKEND': 'botcommands.store.LocalGameStore'})
+
+
+class ConflictError(Exception):
+    pass
+
+
+def game_key(team_id, channel):
+    return f"{team_id}:{channel}" if team_id else channel
+
+
+class GameStore:
+    def __init__(self, key_prefix='game:', timeout=6 * 60 * 60, max_retries=20):
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def make_key(self, channel):
+        return self.key_prefix + channel
+
+    def dumps(self, game):
+        value = codec.encode(game)
+        GAME_SIZE_BYTES.observe(len(value))
+        return value
+
+    def loads(self, value):
+        try:
+            return codec.decode(value)
+        except Exception:
+            # unreadable (e.g. pickled by an older deploy), treat as no game
+            logger.warning("discarding unreadable game", exc_info=True)
+            return None
+
+    def load(self, channel):
+        """Return ``(game, token)``, or ``(None, None)`` if there is no game."""
+        raise NotImplementedError
+
+    def save(self, channel, game, token):
+        """Write ``game`` if it is unchanged since ``load`` returned ``token``.
+
+        Returns False on a conflict. Otherwise returns the token for the game
+        just written, or True if the backend can't tell what it is.
+        """
+        raise NotImplementedError
+
+    def set(self, channel, game):
+        raise NotImplementedError
+
+    def get(self, channel):
+        return self.load(channel)[0]
+
+
+class LocalGameStore(GameStore):
+    """In-process store with memcached's gets/cas semantics.
+
+    A stand-in for memcached when running locally and in benchmarks. Games
+    are kept serialized so callers never share a mutable ``Game``.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry and entry[2] and entry[2] < time.monotonic():
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key, value):
+        self._counter = self._counter + 1
+        expires = time.monotonic() + self.timeout if self.timeout else None
+        self._entries[key] = (self._counter, value, expires)
+
+    @STORE_SECONDS.labels('load').time()
+    def load(self, channel):
+        with self._lock:
+            entry = self._live_entry(self.make_key(channel))
+        if not entry:
+            return None, None
+        return self.loads(entry[1]), entry[0]
+
+    @STORE_SECONDS.labels('save').time()
+    def save(self, channel, game, token):
+        value = self.dumps(game)
+        key = self.make_key(channel)
+        with self._lock:
+            entry = self._live_entry(key)
+            if not entry or entry[0] != token:
+                return False
+            self._store(key, value)
+            return self._counter
+
+    @STORE_SECONDS.labels('set').time()
+    def set(self, channel, game):
+        value = self.dumps(game)
+        with self._lock:
+            self._store(self.make_key(channel), value)
+
+
+# A live game as listed in the registry, ``key`` being its ``game_key``
+GameRecord = namedtuple('GameRecord', ['key', 'team_id', 'channel', 'stage', 'last_active'])
+
+_Entry = namedtuple('_Entry', ['token', 'value', 'stage', 'expires'])
+
+TIERED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS game_spill (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    stage INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS game_spill_expires ON game_spill (expires);
+CREATE TABLE IF NOT EXISTS game_registry (
+    key TEXT PRIMARY KEY,
+    team_id TEXT,
+    channel TEXT,
+    stage INTEGER NOT NULL,
+    last_active REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS game_registry_channel ON game_registry (channel);
+CREATE INDEX IF NOT EXISTS game_registry_stage ON game_registry (stage, last_active);
+CREATE INDEX IF NOT EXISTS game_registry_expires ON game_registry (expires);
+"""
+
+
+class TieredGameStore(GameStore):
+    """In-process store bounded to ``max_games``, spilling the rest to SQLite.
+
+    The most recently used games are kept serialized in memory. Past
+    ``max_games`` the least recently used is written to the ``game_spill``
+    table and read back, and moved back into memory, next time it's loaded.
+    How long a game lives after its last change depends on its stage:
+    ``finished_timeout`` once it's won or lost, ``lobby_timeout`` while
+    nobody has started it, ``timeout`` otherwise.
+
+    An expired game's journal is dropped with it, so a click on its old
+    board can't bring it back.
+
+    Every live game is listed in ``game_registry`` by channel, stage and last
+    activity, see ``active_games``. A row is rewritten when the game changes
+    stage, otherwise at most every ``registry_interval`` seconds, so clicks
+    don't all write to disk. Without a ``path`` the tables are in memory.
+    """
+
+    def __init__(self, path=None, max_games=1000, finished_timeout=15 * 60, lobby_timeout=60 * 60,
+                 registry_interval=60, sweep_interval=60, **options):
+        super().__init__(**options)
+        self.path = path or ':memory:'
+        self.max_games = max_games
+        self.timeouts = {GameStage.Won: finished_timeout, GameStage.Lost: finished_timeout,
+                         GameStage.Lobby: lobby_timeout}
+        self.registry_interval = registry_interval
+        self.sweep_interval = sweep_interval
+        self._hot = OrderedDict()
+        self._registered = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._connection = None
+        self._pid = None
+        self._next_sweep = 0
+
+    def _db(self):
+        # one connection per process, only used with the lock held
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA synchronous=NORMAL')
+            self._connection.executescript(TIERED_SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def _expires(self, stage, now):
+        timeout = self.timeouts.get(stage, self.timeout)
+        return now + timeout if timeout else float('inf')
+
+    def _expire(self, key, value):
+        GAME_STORE_EVENTS.labels('expire').inc()
+        game = self.loads(value)
+        if game is not None:
+            journal.forget(key[len(self.key_prefix):], game.game_id)
+
+    def _hot_entry(self, key, now):
+        entry = self._hot.get(key)
+        if entry and entry.expires < now:
+            del self._hot[key]
+            self._expire(key, entry.value)
+            return None
+        return entry
+
+    def _unspill(self, key, now):
+        """Move the key's game from disk back into memory, returning its entry."""
+        db = self._db()
+        row = db.execute('SELECT data, stage, expires FROM game_spill WHERE key = ?', (key,)).fetchone()
+        if not row:
+            return None
+        with db:
+            db.execute('DELETE FROM game_spill WHERE key = ?', (key,))
+        data, stage, expires = row
+        if expires < now:
+            self._expire(key, bytes(data))
+            return None
+        GAME_STORE_EVENTS.labels('reload').inc()
+        return self._put(key, bytes(data), STAGES[stage], expires)
+
+    def _put(self, key, value, stage, expires):
+        self._counter = self._counter + 1
+        entry = _Entry(self._counter, value, stage, expires)
+        self._hot[key] = entry
+        self._hot.move_to_end(key)
+        return entry
+
+    def _spill(self):
+        victims = []
+        while len(self._hot) > self.max_games:
+            victims.append(self._hot.popitem(last=False))
+        if victims:
+            with self._db() as db:
+                db.executemany('INSERT OR REPLACE INTO game_spill VALUES (?, ?, ?, ?)',
+                               [(key, entry.value, entry.stage.value, entry.expires) for key, entry in victims])
+            GAME_STORE_EVENTS.labels('spill').inc(len(victims))
+
+    def _register(self, channel, game, now):
+        registered = self._registered.get(channel)
+        if registered and registered[0] == game.game_stage and now - registered[1] < self.registry_interval:
+            return
+        self._registered[channel] = (game.game_stage, now)
+        with self._db() as db:
+            db.execute('INSERT OR REPLACE INTO game_registry VALUES (?, ?, ?, ?, ?, ?)',
+                       (channel, game.team_id, game.channel_id, game.game_stage.value, now,
+                        self._expires(game.game_stage, now)))
+
+    def _sweep(self, now):
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        for key in [key for key, entry in self._hot.items() if entry.expires < now]:
+            self._expire(key, self._hot.pop(key).value)
+        for key in [key for key, (stage, written) in self._registered.items()
+                    if written + (self.timeouts.get(stage, self.timeout) or float('inf')) < now]:
+            del self._registered[key]
+        db = self._db()
+        expired = db.execute('SELECT key, data FROM game_spill WHERE expires < ?', (now,)).fetchall()
+        with db:
+            db.execute('DELETE FROM game_spill WHERE expires < ?', (now,))
+            db.execute('DELETE FROM game_registry WHERE expires < ?', (now,))
+        for key, data in expired:
+            # a spilled copy left behind by a newer game in memory isn't the game's end
+            if key not in self._hot:
+                self._expire(key, bytes(data))
+
+    def _write(self, channel, game, value):
+        now = time.time()
+        self._put(self.make_key(channel), value, game.game_stage, self._expires(game.game_stage, now))
+        self._register(channel, game, now)
+        self._spill()
+        self._sweep(now)
+        return self._counter
+
+    @STORE_SECONDS.labels('load').time()
+    def load(self, channel):
+        key = self.make_key(channel)
+        now = time.time()
+        with self._lock:
+            entry = self._hot_entry(key, now)
+            if entry:
+                self._hot.move_to_end(key)
+            else:
+                entry = self._unspill(key, now)
+                if entry:
+                    self._spill()
+        if not entry:
+            return None, None
+        return self.loads(entry.value), entry.token
+
+    @STORE_SECONDS.labels('save').time()
+    def save(self, channel, game, token):
+        value = self.dumps(game)
+        key = self.make_key(channel)
+        with self._lock:
+            entry = self._hot_entry(key, time.time())
+            if not entry or entry.token != token:
+                return False
+            return self._write(channel, game, value)
+
+    @STORE_SECONDS.labels('set').time()
+    def set(self, channel, game):
+        value = self.dumps(game)
+        with self._lock:
+            self._write(channel, game, value)
+
+    def active_games(self, stage=None, team_id=None, channel=None, idle_for=None):
+        """``GameRecord``s for live games, the most recently active first.
+
+        ``last_active`` may be up to ``registry_interval`` seconds behind.
+        """
+        now = time.time()
+        query = 'SELECT key, team_id, channel, stage, last_active FROM game_registry WHERE expires >= ?'
+        params = [now]
+        if stage is not None:
+            query = query + ' AND stage = ?'
+            params.append(stage.value)
+        if team_id is not None:
+            query = query + ' AND team_id = ?'
+            params.append(team_id)
+        if channel is not None:
+            query = query + ' AND channel = ?'
+            params.append(channel)
+        if idle_for is not None:
+            query = query + ' AND last_active <= ?'
+            params.append(now - idle_for)
+        with self._lock:
+            rows = self._db().execute(query + ' ORDER BY last_active DESC', params).fetchall()
+        return [GameRecord(key, team, channel_id, STAGES[stage_id], last_active)
+                for key, team, channel_id, stage_id, last_active in rows]
+
+
+class MemcachedGameStore(GameStore):
+    """Store shared by every worker process, using memcached's gets/cas."""
+
+    def __init__(self, servers, **options):
+        import memcache
+
+        super().__init__(**options)
+        # the client is thread local; cas ids are handed out as tokens instead
+        # of being left in its cache
+        self._client = memcache.Client(servers, cache_cas=True)
+
+    @STORE_SECONDS.labels('load').time()
+    def load(self, channel):
+        key = self.make_key(channel)
+        value = self._client.gets(key)
+        # python3-memcached records gets() cas ids under the bytes key but
+        # looks them up by the str key in cas(), so move it across ourselves
+        token = self._client.cas_ids.pop(key.encode(), None)
+        if value is None:
+            return None, None
+        return self.loads(value), token
+
+    @STORE_SECONDS.labels('save').time()
+    def save(self, channel, game, token):
+        if token is None:
+            return False
+        key = self.make_key(channel)
+        value = self.dumps(game)
+        self._client.cas_ids[key] = token
+        try:
+            if not self._client.cas(key, value, self.timeout):
+                return False
+        finally:
+            self._client.cas_ids.pop(key, None)
+
+        # cas doesn't return the new cas id; read it back, and only trust it if
+        # nobody has written over our value since
+        current = self._client.gets(key)
+        new_token = self._client.cas_ids.pop(key.encode(), None)
+        return new_token if current == value and new_token else True
+
+    @STORE_SECONDS.labels('set').time()
+    def set(self, channel, game):
+        self._client.set(self.make_key(channel), self.dumps(game), self.timeout)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = import_string(GAME_STORE['BACKEND'])
+                _store = backend(**GAME_STORE.get('OPTIONS', {}))
+    return _store
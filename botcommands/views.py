@@ -1,16 +1,20 @@
 import math
+import re
 
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from django.core.cache import caches
 from django.conf import settings
-from slack import WebClient
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from botcommands.journal import journal
 from botcommands.models import Game, User, Character
+from botcommands.store import game_key, get_store
+from davalon.slack_client import get_client
+from stats.reports import stats_message
 
 SLACK_VERIFICATION_TOKEN = getattr(settings, 'SLACK_VERIFICATION_TOKEN', None)
-SLACK_BOT_USER_TOKEN = getattr(settings, 'SLACK_BOT_USER_TOKEN', None)
-Client = WebClient(SLACK_BOT_USER_TOKEN)
+
+# a user mentioned in a command's text, as Slack escapes it
+MENTION = re.compile(r'<@([0-9A-Za-z]+)(?:\|[^>]*)?>')
 
 
 def character_options(game):
@@ -24,37 +28,49 @@ def character_options(game):
         }, [Character.Mordred, Character.Percival, Character.Oberon, Character.Morgana]))
 
 
-def get_lobby_block_content(game):
-    players = "\n".join(list(map(lambda x: x.username_link(), game.player_list)))
-    if not players:
-        players = "_no one has joined_"
-
-    characters_map = game.get_characters()
-    characters = "\n".join(list(map(lambda x: x.value.name, characters_map['good']))) \
-                 + "\n" + str(characters_map['servants']) + " Loyal Servant(s) of Arthur\n\n" + \
-                 "\n".join(list(map(lambda x: x.value.name, characters_map['bad'])))
-
-    if characters_map['minions'] > 0:
-        characters = characters + "\n" + str(characters_map['minions']) + " Minion(s) of Mordred"
-
-    min_players = game.get_min_players()
-
-    return [
-        {
+def lobby_header():
+    return {
             "type": "section",
             "text": {
                 "type": "mrkdwn",
                 "text": "*Game lobby is open!*"
             }
-        },
-        {
+        }
+
+
+def lobby_status(game):
+    min_players = game.get_min_players()
+    if min_players is None:
+        required = "too many special characters to start"
+    else:
+        required = f"{min_players} required to start"
+
+    return {
             "type": "section",
             "text": {
                 "type": "mrkdwn",
-                "text": f"{len(game.player_list)} player(s) ready, {min_players} required to start"
+                "text": f"{len(game.player_list)} player(s) ready, {required}"
             }
-        },
-        {
+        }
+
+
+def lobby_roster(game):
+    players = "\n".join(list(map(lambda x: x.username_link(), game.player_list)))
+    if not players:
+        players = "_no one has joined_"
+
+    characters_map = game.get_characters()
+    if characters_map is None:
+        characters = "\n".join(list(map(lambda x: x.value.name, game.character_list)))
+    else:
+        characters = "\n".join(list(map(lambda x: x.value.name, characters_map['good']))) \
+                     + "\n" + str(characters_map['servants']) + " Loyal Servant(s) of Arthur\n\n" + \
+                     "\n".join(list(map(lambda x: x.value.name, characters_map['bad'])))
+
+        if characters_map['minions'] > 0:
+            characters = characters + "\n" + str(characters_map['minions']) + " Minion(s) of Mordred"
+
+    return {
             "type": "section",
             "fields": [
                 {
@@ -66,8 +82,11 @@ def get_lobby_block_content(game):
                     "text": "*Characters*\n"+characters
                 }
             ]
-        },
-        {
+        }
+
+
+def lobby_character_select(game):
+    return {
             "type": "actions",
             "elements": [
                 {
@@ -81,11 +100,17 @@ def get_lobby_block_content(game):
                     "options": character_options(game)
                 }
             ]
-        },
-        {
+        }
+
+
+def lobby_divider():
+    return {
             "type": "divider"
-        },
-        {
+        }
+
+
+def lobby_buttons():
+    return {
             "type": "actions",
             "elements": [
                 {
@@ -120,25 +145,57 @@ def get_lobby_block_content(game):
                 }
             ]
         }
+
+
+def get_lobby_block_content(game):
+    return [
+        lobby_header(),
+        lobby_status(game),
+        lobby_roster(game),
+        lobby_character_select(game),
+        lobby_divider(),
+        lobby_buttons()
     ]
 
 
-class BotCommands(APIView):
-    command = None
+@csrf_exempt
+@require_POST
+def slack_start_command(request):
+    """``/commands/start/``, usually served ahead of the middleware by ``davalon.fastpath``."""
+    reply = BotCommands(command='start').handle(request.POST)
+    if reply:
+        return JsonResponse(reply)
+    return HttpResponse()
 
-    def post(self, request, *args, **kwargs):
-        data = request.data
 
+class BotCommands:
+    def __init__(self, command=None):
+        self.command = command
+
+    def handle(self, data):
+        """The reply to the command, if it has one beyond the lobby it posts."""
         if self.command == 'start':
+            text = data.get('text', '').strip()
+            if text.lower().startswith('stats'):
+                return self.handle_stats(data, text)
             self.handle_start(data)
 
-        return Response(status=status.HTTP_200_OK)
+    def handle_stats(self, data, text):
+        # `/davalot stats` for your own, `/davalot stats @someone` for theirs
+        mention = MENTION.search(text)
+        user_id = mention.group(1) if mention else data.get('user_id')
+        return {
+            'response_type': 'ephemeral',
+            'text': stats_message(data.get('team_id') or '', user_id),
+        }
 
     def handle_start(self, data):
         # Must be channel/group
 
         # text = event_message.get('text')  #
+        team_id = data.get('team_id')
         channel = data.get('channel_id')
+        key = game_key(team_id, channel)
         user = data.get('user_name')
         user_id = data.get('user_id')
         message = 'DAvalot lobby is open!'
@@ -146,7 +203,7 @@ class BotCommands(APIView):
         if 'text' in data:
             forced = data['text'].lower() == 'force'
 
-        current_game = caches['default'].get(channel)
+        current_game = get_store().get(key)
         if current_game and not forced:
             # Client.chat_postMessage(channel=channel, text="Use `/davalot force` to cancel existing session")
             return True
@@ -155,16 +212,17 @@ class BotCommands(APIView):
 
         # create new game
         game = Game()
+        game.team_id = team_id
         game.channel_id = channel
-        game.player_list = [User({'username': user, 'id': user_id})]
-        game.character_list = [Character.Merlin, Character.Assassin]
+        game.seat_players([User({'username': user, 'id': user_id})])
 
         # send start message
         block_content = get_lobby_block_content(game)
-        response = Client.chat_postMessage(channel=channel, text=message, blocks=block_content)
+        response = get_client(team_id).chat_postMessage(channel=channel, text=message, blocks=block_content)
 
         game.slack_message_ts = response.data['ts']
-        caches['default'].set(channel, game)
+        get_store().set(key, game)
+        journal.snapshot(key, game)
 
         return True
 
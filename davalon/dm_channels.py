@@ -0,0 +1,73 @@
+"""User id -> direct message channel id, per workspace.
+
+A user's IM channel with the bot never changes, so it is opened once and
+remembered: in a small per-process LRU and, so other workers and later games
+can reuse it, in the shared ``default`` cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DM_CHANNEL_CACHE_SIZE = getattr(settings, 'DM_CHANNEL_CACHE_SIZE', 5000)
+DM_CHANNEL_CACHE_TTL = getattr(settings, 'DM_CHANNEL_CACHE_TTL', 7 * 24 * 60 * 60)
+
+
+class DMChannelCache:
+    def __init__(self, maxsize=DM_CHANNEL_CACHE_SIZE, ttl=DM_CHANNEL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(user_id, team_id):
+        # the same user can have a different IM channel with each workspace's bot
+        return f"dm:{team_id}:{user_id}" if team_id else f"dm:{user_id}"
+
+    def get(self, user_id, team_id=None):
+        key = self._key(user_id, team_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                channel_id, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return channel_id
+                del self._entries[key]
+
+        channel_id = caches['default'].get(key)
+        if channel_id:
+            self._remember(key, channel_id)
+        return channel_id
+
+    def set(self, user_id, channel_id, team_id=None):
+        key = self._key(user_id, team_id)
+        caches['default'].set(key, channel_id, self.ttl)
+        self._remember(key, channel_id)
+
+    def forget(self, user_id, team_id=None):
+        key = self._key(user_id, team_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        caches['default'].delete(key)
+
+    def open(self, client, user_id):
+        channel_id = self.get(user_id, client.team_id)
+        if not channel_id:
+            channel_id = client.im_open(user=user_id).data['channel']['id']
+            self.set(user_id, channel_id, client.team_id)
+        return channel_id
+
+    def _remember(self, key, channel_id):
+        with self._lock:
+            self._entries[key] = (channel_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+dm_channels = DMChannelCache()
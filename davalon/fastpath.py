@@ -0,0 +1,28 @@
+"""Short cut for Slack's webhooks past the rest of the middleware.
+
+Slack posts to a handful of fixed URLs, authenticated by their payload
+rather than by sessions or cookies, so the session, CSRF, auth, messages and
+clickjacking middleware and URL resolution are all wasted on them. Put first
+in ``MIDDLEWARE``, this hands POSTs to those URLs straight to their views;
+everything else, the admin included, goes through the full stack as before.
+"""
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SLACK_FAST_PATHS = getattr(settings, 'SLACK_FAST_PATHS', {
+    '/actions/': 'actions.views.slack_action',
+    '/events/': 'events.views.slack_event',
+    '/commands/start/': 'botcommands.views.slack_start_command',
+})
+
+
+class SlackFastPathMiddleware:
+    def __init__(self, get_response, paths=None):
+        self.get_response = get_response
+        self.views = {path: import_string(view) for path, view in (paths or SLACK_FAST_PATHS).items()}
+
+    def __call__(self, request):
+        view = self.views.get(request.path_info)
+        if view is not None and request.method == 'POST':
+            return view(request)
+        return self.get_response(request)
@@ -0,0 +1,245 @@
+"""Background delivery of outbound Slack calls.
+
+Request handlers only mutate game state and ``submit`` the Slack side effects
+here, so the HTTP response goes back to Slack well inside its 3 second
+interaction deadline no matter how slow the Slack API is.
+
+Jobs are taken in priority order, so board updates players are waiting on go
+out ahead of notices and background lookups. A job that hits a Slack rate
+limit is put back for the time Slack asked for, without using up one of its
+retries, and the worker moves on to other work. So is each call of a
+``fan_out`` that's rate limited, as its own job, rather than waiting on the
+worker that fanned out.
+"""
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import count
+
+from django.conf import settings
+from davalon.metrics import count_error
+from davalon.ratelimit import RateLimited
+
+logger = logging.getLogger(__name__)
+
+OUTBOUND_WORKERS = getattr(settings, 'OUTBOUND_WORKERS', 4)
+OUTBOUND_QUEUE_SIZE = getattr(settings, 'OUTBOUND_QUEUE_SIZE', 1000)
+OUTBOUND_MAX_RETRIES = getattr(settings, 'OUTBOUND_MAX_RETRIES', 3)
+OUTBOUND_RETRY_DELAY = getattr(settings, 'OUTBOUND_RETRY_DELAY', 0.5)
+OUTBOUND_FAN_OUT_WORKERS = getattr(settings, 'OUTBOUND_FAN_OUT_WORKERS', 10)
+OUTBOUND_MAX_THROTTLES = getattr(settings, 'OUTBOUND_MAX_THROTTLES', 20)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DEFAULT = 5
+PRIORITY_BACKGROUND = 10
+_STOP = float('inf')
+
+
+class Job:
+    def __init__(self, func, args, kwargs, priority=PRIORITY_DEFAULT, on_give_up=None):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.on_give_up = on_give_up
+        self.attempts = 0
+        self.throttles = 0
+
+    def run(self):
+        self.attempts = self.attempts + 1
+        return self.func(*self.args, **self.kwargs)
+
+    def give_up(self, error):
+        if self.on_give_up is None:
+            return
+        try:
+            self.on_give_up(error)
+        except Exception as e:
+            count_error('outbound', e)
+            logger.exception("give up hook failed for %r", self)
+
+    def __repr__(self):
+        return f"Job({getattr(self.func, '__name__', self.func)}, attempt {self.attempts})"
+
+
+class OutboundQueue:
+    """A bounded priority queue of jobs drained by a pool of daemon worker threads.
+
+    Lower ``priority`` values run first, in submission order within a
+    priority. Failed jobs are retried with exponential backoff up to ``max_retries``
+    times. Workers are started lazily on first submit, and restarted if the
+    process has been forked since.
+    """
+
+    def __init__(self, workers=OUTBOUND_WORKERS, maxsize=OUTBOUND_QUEUE_SIZE,
+                 max_retries=OUTBOUND_MAX_RETRIES, retry_delay=OUTBOUND_RETRY_DELAY,
+                 max_throttles=OUTBOUND_MAX_THROTTLES):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_throttles = max_throttles
+        self._queue = queue.PriorityQueue(maxsize=maxsize)
+        self._order = count()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._pending_retries = 0
+
+    def start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.PriorityQueue(maxsize=self.maxsize)
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"outbound-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def submit(self, func, *args, priority=PRIORITY_DEFAULT, **kwargs):
+        self.start()
+        return self._put(Job(func, args, kwargs, priority))
+
+    def submit_later(self, delay, func, *args, priority=PRIORITY_DEFAULT, on_give_up=None, **kwargs):
+        """Queue ``func(*args, **kwargs)`` in ``delay`` seconds.
+
+        ``on_give_up(error)`` is called if it's still failing once out of
+        retries, or still rate limited.
+        """
+        self.start()
+        self._retry_later(Job(func, args, kwargs, priority, on_give_up), delay)
+
+    def join(self):
+        """Block until every submitted job, including retries, has finished."""
+        while True:
+            self._queue.join()
+            with self._lock:
+                if not self._pending_retries:
+                    return
+            threading.Event().wait(self.retry_delay / 2)
+
+    def stop(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            for _ in self._threads:
+                self._queue.put((_STOP, next(self._order), None))
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+            self._pid = None
+
+    def _put(self, job):
+        try:
+            self._queue.put_nowait((job.priority, next(self._order), job))
+        except queue.Full:
+            logger.error("outbound queue full, dropping %r", job)
+            return False
+        return True
+
+    def _retry(self, job):
+        with self._lock:
+            self._pending_retries = self._pending_retries - 1
+        self._put(job)
+
+    def _retry_later(self, job, delay):
+        with self._lock:
+            self._pending_retries = self._pending_retries + 1
+        timer = threading.Timer(delay, self._retry, [job])
+        timer.daemon = True
+        timer.start()
+
+    def _work(self):
+        while True:
+            priority, order, job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                job.run()
+            except RateLimited as e:
+                # not the job's fault, so it doesn't count as an attempt
+                job.attempts = job.attempts - 1
+                job.throttles = job.throttles + 1
+                if job.throttles > self.max_throttles:
+                    logger.error("giving up on %r, still rate limited", job)
+                    job.give_up(e)
+                else:
+                    logger.info("%r rate limited, retrying in %.1fs", job, e.retry_after)
+                    self._retry_later(job, e.retry_after)
+            except Exception as e:
+                count_error('outbound', e)
+                if job.attempts > self.max_retries:
+                    logger.exception("giving up on %r", job)
+                    job.give_up(e)
+                else:
+                    delay = self.retry_delay * (2 ** (job.attempts - 1))
+                    logger.warning("%r failed, retrying in %.1fs", job, delay, exc_info=True)
+                    self._retry_later(job, delay)
+            finally:
+                self._queue.task_done()
+
+
+outbound = OutboundQueue()
+
+_fan_out_pool = None
+_fan_out_pid = None
+_fan_out_lock = threading.Lock()
+
+
+def submit(func, *args, priority=PRIORITY_DEFAULT, **kwargs):
+    return outbound.submit(func, *args, priority=priority, **kwargs)
+
+
+def _get_fan_out_pool():
+    global _fan_out_pool, _fan_out_pid
+    with _fan_out_lock:
+        if _fan_out_pid != os.getpid():
+            _fan_out_pool = ThreadPoolExecutor(max_workers=OUTBOUND_FAN_OUT_WORKERS,
+                                               thread_name_prefix='fan-out')
+            _fan_out_pid = os.getpid()
+        return _fan_out_pool
+
+
+def _call_with_retries(func, args, retries):
+    attempt = 0
+    while True:
+        try:
+            func(*args)
+            return None
+        except RateLimited as e:
+            return e
+        except Exception as e:
+            if attempt >= retries:
+                logger.warning("%s%r failed", getattr(func, '__name__', func), args, exc_info=True)
+                return e
+            threading.Event().wait(OUTBOUND_RETRY_DELAY * (2 ** attempt))
+            attempt = attempt + 1
+
+
+def fan_out(func, arg_list, retries=1, priority=PRIORITY_DEFAULT, on_give_up=None):
+    """Call ``func(*args)`` for each entry of ``arg_list`` concurrently.
+
+    Returns a list lined up with ``arg_list`` holding ``None`` for each call
+    that succeeded and the last exception raised for each one that didn't.
+    A call that's rate limited is also ``None``: it's queued as a job of its
+    own for when Slack said to try again, and ``on_give_up(args, error)`` is
+    called if that never gets through.
+    """
+    pool = _get_fan_out_pool()
+    futures = [pool.submit(_call_with_retries, func, args, retries) for args in arg_list]
+    results = []
+    for args, future in zip(arg_list, futures):
+        error = future.result()
+        if isinstance(error, RateLimited):
+            outbound.submit_later(error.retry_after, func, *args, priority=priority,
+                                  on_give_up=partial(on_give_up, args) if on_give_up else None)
+            error = None
+        results.append(error)
+    return results
@@ -0,0 +1,132 @@
+"""Client side rate limiting for the Slack Web API.
+
+Slack limits each Web API method per workspace by tier, and
+``chat.postMessage`` additionally to about one message per second per
+channel. Calls take a token from the workspace's bucket for the method and,
+where a channel is given, from the channel's bucket first. A short wait is slept off in place;
+anything longer raises ``RateLimited`` so the outbound queue can put the job
+back and get on with other work. A 429 from Slack closes the bucket for the
+``Retry-After`` it sent.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+# Requests per minute allowed by Slack's rate limit tiers
+TIERS = {1: 1, 2: 20, 3: 50, 4: 100}
+
+SLACK_METHOD_TIERS = getattr(settings, 'SLACK_METHOD_TIERS', {
+    'chat.delete': 3,
+    'chat.update': 3,
+    'conversations.open': 3,
+    'im.open': 3,
+    'oauth.access': 4,
+})
+# Methods limited per channel: (messages per second, burst)
+SLACK_CHANNEL_LIMITS = getattr(settings, 'SLACK_CHANNEL_LIMITS', {
+    'chat.postMessage': (1.0, 3),
+})
+SLACK_RATE_LIMIT_MAX_WAIT = getattr(settings, 'SLACK_RATE_LIMIT_MAX_WAIT', 1.0)
+
+
+class RateLimited(Exception):
+    def __init__(self, key, retry_after):
+        super().__init__(f"{key} rate limited for {retry_after:.2f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0
+
+    def wait_time(self, now):
+        """Seconds until a token is available, 0 if one is available now."""
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens = self.tokens - 1
+
+
+class RateLimiter:
+    def __init__(self, method_tiers=SLACK_METHOD_TIERS, channel_limits=SLACK_CHANNEL_LIMITS,
+                 max_wait=SLACK_RATE_LIMIT_MAX_WAIT):
+        self.method_tiers = method_tiers
+        self.channel_limits = channel_limits
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket_keys(self, method, channel, team):
+        keys = []
+        if method in self.method_tiers:
+            keys.append((team, method, None))
+        if channel and method in self.channel_limits:
+            keys.append((team, method, channel))
+        return keys
+
+    def _bucket(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            team, method, channel = key
+            if channel is None:
+                per_minute = TIERS[self.method_tiers[method]]
+                bucket = TokenBucket(per_minute / 60.0, per_minute, now)
+            else:
+                rate, burst = self.channel_limits[method]
+                bucket = TokenBucket(rate, burst, now)
+            self._buckets[key] = bucket
+        return bucket
+
+    def acquire(self, method, channel=None, team=None):
+        """Take a token for a call, sleeping up to ``max_wait`` for one."""
+        keys = self._bucket_keys(method, channel, team)
+        if not keys:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                buckets = [self._bucket(key, now) for key in keys]
+                wait = max(bucket.wait_time(now) for bucket in buckets)
+                if not wait:
+                    for bucket in buckets:
+                        bucket.take()
+                    return
+            if wait > self.max_wait:
+                raise RateLimited(method, wait)
+            time.sleep(wait)
+
+    def block(self, method, channel, retry_after, team=None):
+        """Honor a 429: no calls to ``method`` until ``retry_after`` seconds pass."""
+        with self._lock:
+            now = time.monotonic()
+            key = (team, method, channel) if channel and method in self.channel_limits else (team, method, None)
+            if key[2] is None and method not in self.method_tiers:
+                # a method we don't track yet, limit it from now on
+                self.method_tiers = dict(self.method_tiers)
+                self.method_tiers[method] = 4
+            bucket = self._bucket(key, now)
+            bucket.blocked_until = max(bucket.blocked_until, now + retry_after)
+
+
+def retry_after(headers, default=1.0):
+    try:
+        return float(headers.get('Retry-After', default))
+    except (TypeError, ValueError):
+        return default
+
+
+limiter = RateLimiter()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import json
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -22,6 +23,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SLACK_CLIENT_SECRET = os.environ.get('SLACK_CLIENT_SECRET', "")
 SLACK_VERIFICATION_TOKEN = os.environ.get('SLACK_VERIFICATION_TOKEN', "")
 SLACK_BOT_USER_TOKEN = os.environ.get('SLACK_BOT_USER_TOKEN', "")
+SLACK_API_URL = os.environ.get('SLACK_API_URL', "https://www.slack.com/api/")
+SLACK_OAUTH_REDIRECT_URI = os.environ.get('SLACK_OAUTH_REDIRECT_URI')  # defaults to the one set up in Slack
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', "")
@@ -44,9 +47,12 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',             # <== add this line
     'events',                     # <== add this line
+    'oauth',
+    'stats',
 ]
 
 MIDDLEWARE = [
+    'davalon.fastpath.SlackFastPathMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -113,6 +119,94 @@ CACHES = {
     },
 }
 
+# Games are kept in a store with compare-and-swap updates
+# Set MEMCACHED_SERVERS (comma separated host:port) to share games and caches between worker processes
+
+MEMCACHED_SERVERS = [server for server in os.environ.get('MEMCACHED_SERVERS', '').split(',') if server]
+
+# Otherwise the GAME_STORE_MAX_GAMES most recently used games are kept in memory and the
+# rest in the sqlite database; finished games and lobbies expire sooner than games in play
+
+GAME_STORE = {
+    'BACKEND': 'botcommands.store.TieredGameStore',
+    'OPTIONS': {
+        'timeout': 6 * 60 * 60,
+        'path': os.environ.get('GAME_STORE_PATH') or DATABASES['default']['NAME'],
+        'max_games': int(os.environ.get('GAME_STORE_MAX_GAMES', 1000)),
+        'finished_timeout': int(os.environ.get('GAME_FINISHED_TIMEOUT', 15 * 60)),
+        'lobby_timeout': int(os.environ.get('GAME_LOBBY_TIMEOUT', 60 * 60)),
+    },
+}
+
+if MEMCACHED_SERVERS:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': MEMCACHED_SERVERS,
+    }
+    GAME_STORE = {
+        'BACKEND': 'botcommands.store.MemcachedGameStore',
+        'OPTIONS': {
+            'timeout': 6 * 60 * 60,
+            'servers': MEMCACHED_SERVERS,
+        },
+    }
+
+# Clicks are applied one at a time per channel, channels in parallel on a pool of workers
+DISPATCHER_WORKERS = int(os.environ.get('DISPATCHER_WORKERS', 8))
+DISPATCHER_GAMES = int(os.environ.get('DISPATCHER_GAMES', 1000))
+
+# Board updates for a channel are held for BOARD_UPDATE_WINDOW seconds (never more than
+# BOARD_UPDATE_MAX_DELAY) so a burst of clicks sends only the latest board
+BOARD_UPDATE_WINDOW = float(os.environ.get('BOARD_UPDATE_WINDOW', 0.25))
+BOARD_UPDATE_MAX_DELAY = float(os.environ.get('BOARD_UPDATE_MAX_DELAY', 1.0))
+
+# Outbound Slack calls
+# Handlers enqueue Slack API calls which are sent by a pool of background workers
+
+OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', 4))
+OUTBOUND_QUEUE_SIZE = int(os.environ.get('OUTBOUND_QUEUE_SIZE', 1000))
+OUTBOUND_MAX_RETRIES = int(os.environ.get('OUTBOUND_MAX_RETRIES', 3))
+OUTBOUND_RETRY_DELAY = float(os.environ.get('OUTBOUND_RETRY_DELAY', 0.5))
+OUTBOUND_FAN_OUT_WORKERS = int(os.environ.get('OUTBOUND_FAN_OUT_WORKERS', 10))
+
+# Every outbound HTTP call to Slack goes through one pooled keep-alive session
+SLACK_HTTP_POOL_SIZE = int(os.environ.get('SLACK_HTTP_POOL_SIZE', 20))
+SLACK_HTTP_CONNECT_TIMEOUT = float(os.environ.get('SLACK_HTTP_CONNECT_TIMEOUT', 3.05))
+SLACK_HTTP_READ_TIMEOUT = float(os.environ.get('SLACK_HTTP_READ_TIMEOUT', 10))
+
+# Each workspace's bot token comes from its install, clients are kept for
+# the most recently active SLACK_CLIENT_POOL_SIZE workspaces
+SLACK_CLIENT_POOL_SIZE = int(os.environ.get('SLACK_CLIENT_POOL_SIZE', 100))
+
+# Slack API calls are paced to Slack's rate limits; a call that would have to
+# wait longer than this many seconds is put back on the outbound queue instead
+SLACK_RATE_LIMIT_MAX_WAIT = float(os.environ.get('SLACK_RATE_LIMIT_MAX_WAIT', 1.0))
+OUTBOUND_MAX_THROTTLES = int(os.environ.get('OUTBOUND_MAX_THROTTLES', 20))
+
+# Direct message channel ids are remembered per user
+DM_CHANNEL_CACHE_SIZE = int(os.environ.get('DM_CHANNEL_CACHE_SIZE', 5000))
+DM_CHANNEL_CACHE_TTL = int(os.environ.get('DM_CHANNEL_CACHE_TTL', 7 * 24 * 60 * 60))
+
+# Event ids already handled, so Slack's retries of them are only acknowledged
+EVENT_DEDUPE_CACHE_SIZE = int(os.environ.get('EVENT_DEDUPE_CACHE_SIZE', 10000))
+EVENT_DEDUPE_TTL = int(os.environ.get('EVENT_DEDUPE_TTL', 60 * 60))
+
+# Every game is logged to the sqlite database so it can be recovered if the
+# game store loses it; writes are batched every flush interval
+GAME_JOURNAL_PATH = os.environ.get('GAME_JOURNAL_PATH')  # defaults to the sqlite database
+GAME_JOURNAL_SNAPSHOT_EVERY = int(os.environ.get('GAME_JOURNAL_SNAPSHOT_EVERY', 50))
+GAME_JOURNAL_FLUSH_INTERVAL = float(os.environ.get('GAME_JOURNAL_FLUSH_INTERVAL', 0.5))
+
+# The rules games are played by; GAME_RULESETS is a JSON list of variants,
+# each described like botcommands.engine.STANDARD_RULES
+GAME_RULESET = os.environ.get('GAME_RULESET', 'standard')
+GAME_RULESETS = json.loads(os.environ.get('GAME_RULESETS', '[]'))
+
+# Build the Slack client and connect to Slack as soon as the app starts,
+# rather than on the first request that needs them; turn it off under a
+# server that preloads the application before forking workers
+WARM_UP_ON_START = os.environ.get('WARM_UP_ON_START', 'true').lower() in ('1', 'true', 'yes')
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 
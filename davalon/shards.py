@@ -0,0 +1,264 @@
+"""Sharded serving: each game lives in one worker process's memory.
+
+Run instead of ``manage.py runserver``:
+
+    python -m davalon.shards 0.0.0.0:$PORT --shards 4
+
+This starts ``--shards`` workers, each a ``runserver`` on a local port. In
+front of them is a small router that reads just enough of each Slack request
+to know its game (the team and channel of a click, slash command or event)
+and forwards it to the worker that key hashes to, over kept-alive
+connections. Every request for a game therefore lands on the same process,
+and so do its coalesced board updates and retried events. The game the
+dispatcher holds in memory is then never behind the store, so clicks are
+applied to it without reloading the game or losing a compare-and-swap to
+another worker.
+
+Keys are placed on a consistent hash ring, so changing the number of shards
+only moves about ``1/shards`` of the games; a moved game is picked up by its
+new worker from the game journal. Requests that aren't about a game (the
+admin, OAuth, ``/metrics``) go to the first shard; each worker's own metrics
+can be scraped from its local port.
+"""
+import argparse
+import bisect
+import hashlib
+import http.client
+import json
+import os
+import re
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, quote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+MANAGE_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'manage.py')
+
+GAME_SHARDS = int(os.environ.get('GAME_SHARDS', os.cpu_count() or 1))
+GAME_SHARD_BASE_PORT = int(os.environ.get('GAME_SHARD_BASE_PORT', 9100))
+GAME_SHARD_REPLICAS = 100
+
+# not passed on to the workers, each hop has its own
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'te', 'trailer', 'upgrade'}
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, ``replicas`` points per node."""
+
+    def __init__(self, nodes, replicas=GAME_SHARD_REPLICAS):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, node in points]
+        self._nodes = [node for point, node in points]
+
+    def node_for(self, key):
+        i = bisect.bisect(self._hashes, _hash(key))
+        return self._nodes[i % len(self._nodes)]
+
+
+def _game_key(team_id, channel):
+    # botcommands.store.game_key, without loading Django into the router
+    return f"{team_id}:{channel}" if team_id else channel
+
+
+# The still url encoded '"team":{...}' and '"channel":{...}' of a click's
+# payload, and the id in each; decoding the whole payload costs far more
+_CLICK_OBJECT = re.compile(rb'%22(team|channel)%22(?:\+|%20)*%3[Aa](?:\+|%20)*%7[Bb](.*?)%7[Dd]')
+_CLICK_ID = re.compile(rb'%22id%22(?:\+|%20)*%3[Aa](?:\+|%20)*%22([0-9A-Za-z]+)%22')
+
+
+def _click_key(body):
+    ids = {}
+    for match in _CLICK_OBJECT.finditer(body):
+        found = _CLICK_ID.search(match.group(2))
+        # one of each or it's not what it looks like
+        if match.group(1) in ids or not found:
+            return None
+        ids[match.group(1)] = found.group(1).decode('ascii')
+    if b'channel' not in ids:
+        return None
+    return _game_key(ids.get(b'team'), ids[b'channel'])
+
+
+def shard_key(path, body):
+    """The game a Slack request is about, or None if it isn't about one."""
+    try:
+        if path == '/actions/':
+            key = _click_key(body)
+            if key:
+                return key
+            payload = json.loads(parse_qs(body.decode('utf-8')).get('payload', ['{}'])[0])
+            return _game_key((payload.get('team') or {}).get('id'), (payload.get('channel') or {}).get('id'))
+        if path == '/commands/start/':
+            form = parse_qs(body.decode('utf-8'))
+            return _game_key(form.get('team_id', [None])[0], form.get('channel_id', [None])[0])
+        if path == '/events/':
+            message = json.loads(body)
+            channel = (message.get('event') or {}).get('channel')
+            # events without a channel, e.g. an uninstall, go by workspace
+            return _game_key(message.get('team_id'), channel) if channel else message.get('team_id')
+    except (ValueError, AttributeError):
+        pass
+    return None
+
+
+class ShardRouter:
+    """WSGI application forwarding each request to its game's worker."""
+
+    def __init__(self, addresses, replicas=GAME_SHARD_REPLICAS):
+        self.addresses = addresses
+        self.ring = HashRing(range(len(addresses)), replicas)
+        self._local = threading.local()
+
+    def shard_for(self, path, body):
+        key = shard_key(path, body)
+        return self.ring.node_for(key) if key else 0
+
+    def __call__(self, environ, start_response):
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+        path = environ.get('PATH_INFO', '/')
+        shard = self.shard_for(path, body)
+
+        url = quote(path)
+        if environ.get('QUERY_STRING'):
+            url = url + '?' + environ['QUERY_STRING']
+        headers = {key[5:].replace('_', '-').title(): value
+                   for key, value in environ.items() if key.startswith('HTTP_')}
+        headers = {key: value for key, value in headers.items() if key.lower() not in HOP_BY_HOP}
+        if environ.get('CONTENT_TYPE'):
+            headers['Content-Type'] = environ['CONTENT_TYPE']
+        headers['Content-Length'] = str(len(body))
+
+        try:
+            response = self.forward(shard, environ['REQUEST_METHOD'], url, body, headers)
+        except (OSError, http.client.HTTPException):
+            start_response('502 Bad Gateway', [('Content-Type', 'text/plain')])
+            return [b'shard unavailable']
+        status, response_headers, data = response
+        start_response(status, response_headers)
+        return [data]
+
+    def forward(self, shard, method, url, body, headers):
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        for attempt in range(2):
+            connection = connections.get(shard)
+            reused = connection is not None
+            if not reused:
+                host, port = self.addresses[shard]
+                connection = connections[shard] = http.client.HTTPConnection(host, port, timeout=30)
+            try:
+                connection.request(method, url, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                del connections[shard]
+                # only a kept-alive connection the worker had already closed
+                # is retried, anything else may have been handled
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+                del connections[shard]
+            response_headers = [(key, value) for key, value in response.getheaders()
+                                if key.lower() not in HOP_BY_HOP]
+            return f"{response.status} {response.reason}", response_headers, data
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class Worker:
+    def __init__(self, shard, port):
+        self.shard = shard
+        self.port = port
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, MANAGE_PY, 'runserver', f"127.0.0.1:{self.port}", '--noreload'])
+
+    def wait_until_up(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"shard {self.shard} exited with {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"shard {self.shard} didn't start listening on {self.port}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def supervise(workers, stopping):
+    """Restart any worker that exits; its games come back from the journal."""
+    while not stopping.wait(1):
+        for worker in workers:
+            if worker.process.poll() is not None:
+                print(f"shard {worker.shard} exited with {worker.process.returncode}, restarting", file=sys.stderr)
+                worker.start()
+
+
+def address(value):
+    host, _, port = value.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('addrport', type=address, nargs='?', default=('0.0.0.0', 8000))
+    parser.add_argument('--shards', type=int, default=GAME_SHARDS)
+    parser.add_argument('--base-port', type=int, default=GAME_SHARD_BASE_PORT,
+                        help="workers listen on 127.0.0.1 from this port up")
+    args = parser.parse_args()
+
+    # stop the workers too when the platform stops us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    workers = [Worker(shard, args.base_port + shard) for shard in range(args.shards)]
+    stopping = threading.Event()
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.wait_until_up()
+        threading.Thread(target=supervise, args=(workers, stopping), name='shard-supervisor', daemon=True).start()
+
+        router = ShardRouter([('127.0.0.1', worker.port) for worker in workers])
+        server = make_server(*args.addrport, router, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        print(f"routing {args.addrport[0]}:{args.addrport[1]} to {args.shards} shard(s)", file=sys.stderr)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopping.set()
+        for worker in workers:
+            worker.stop()
+
+
+if __name__ == '__main__':
+    main()
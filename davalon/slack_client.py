@@ -0,0 +1,86 @@
+"""The Slack clients shared by every view and outbound worker.
+
+Each workspace that installs the app grants its own bot token, so there is
+a client per team, built from the team's ``oauth.Installation``. The most
+recently used ``SLACK_CLIENT_POOL_SIZE`` are kept, which keeps the token
+lookup off the path of all but a team's first call. Clients are cheap, they
+share the one transport and its connection pool. A team that hasn't
+installed the app, or a call with no team, uses ``SLACK_BOT_USER_TOKEN``
+if one is configured, as a single workspace deployment always has.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+SLACK_BOT_USER_TOKEN = getattr(settings, 'SLACK_BOT_USER_TOKEN', None)
+SLACK_API_URL = getattr(settings, 'SLACK_API_URL', 'https://www.slack.com/api/')
+SLACK_CLIENT_POOL_SIZE = getattr(settings, 'SLACK_CLIENT_POOL_SIZE', 100)
+
+_client = None
+_clients = OrderedDict()
+_client_lock = threading.Lock()
+
+
+class NotInstalled(Exception):
+    def __init__(self, team_id):
+        super().__init__(f"no bot token for team {team_id}")
+        self.team_id = team_id
+
+
+def new_client(token, team_id=None):
+    """A client for ``token``, built on first use so a process that hasn't
+    called Slack yet hasn't imported slackclient either."""
+    from davalon.transport import SLACK_HTTP_READ_TIMEOUT
+    from davalon.web_client import PooledWebClient
+    return PooledWebClient(token, team_id=team_id, base_url=SLACK_API_URL, timeout=SLACK_HTTP_READ_TIMEOUT)
+
+
+def bot_token(team_id):
+    from oauth.models import Installation
+    try:
+        installation = Installation.objects.filter(team_id=team_id).only('bot_token').first()
+    except DatabaseError:
+        # not migrated yet, only SLACK_BOT_USER_TOKEN can be used
+        logger.warning("couldn't look up the bot token for %s", team_id, exc_info=True)
+        return None
+    return installation.bot_token if installation else None
+
+
+def get_client(team_id=None):
+    """Return the client for the team's workspace."""
+    global _client
+    if team_id is None:
+        if _client is None:
+            with _client_lock:
+                if _client is None:
+                    _client = new_client(SLACK_BOT_USER_TOKEN)
+        return _client
+
+    with _client_lock:
+        client = _clients.get(team_id)
+        if client is not None:
+            _clients.move_to_end(team_id)
+            return client
+
+    token = bot_token(team_id) or SLACK_BOT_USER_TOKEN
+    if not token:
+        raise NotInstalled(team_id)
+    client = new_client(token, team_id)
+    with _client_lock:
+        # another thread may have got here first, either client will do
+        _clients[team_id] = client
+        _clients.move_to_end(team_id)
+        while len(_clients) > SLACK_CLIENT_POOL_SIZE:
+            _clients.popitem(last=False)
+    return client
+
+
+def forget(team_id):
+    """Drop the team's client, e.g. when its token has changed."""
+    with _client_lock:
+        _clients.pop(team_id, None)
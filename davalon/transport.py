@@ -0,0 +1,52 @@
+"""The one HTTP transport for outbound Slack traffic.
+
+All Web API calls and response_url posts share a single ``requests.Session``
+whose connection pool keeps connections to Slack alive between calls, so
+only the first call to a host pays for the TCP and TLS handshakes.
+"""
+import threading
+
+from django.conf import settings
+from davalon.metrics import SLACK_API_SECONDS, SLACK_RATE_LIMITED
+from davalon.ratelimit import RateLimited, retry_after
+
+SLACK_HTTP_POOL_SIZE = getattr(settings, 'SLACK_HTTP_POOL_SIZE', 20)
+SLACK_HTTP_CONNECT_TIMEOUT = getattr(settings, 'SLACK_HTTP_CONNECT_TIMEOUT', 3.05)
+SLACK_HTTP_READ_TIMEOUT = getattr(settings, 'SLACK_HTTP_READ_TIMEOUT', 10)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def new_session(pool_size=SLACK_HTTP_POOL_SIZE):
+    # requests is only needed once there is something to send
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = new_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    kwargs.setdefault('timeout', (SLACK_HTTP_CONNECT_TIMEOUT, SLACK_HTTP_READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
+
+
+def post(url, **kwargs):
+    with SLACK_API_SECONDS.labels('response_url').time():
+        response = request('POST', url, **kwargs)
+    if response.status_code == 429:
+        SLACK_RATE_LIMITED.labels('response_url').inc()
+        raise RateLimited('response_url', retry_after(response.headers))
+    return response
@@ -15,13 +15,18 @@ Including another URLconf
 """
 from django.conf.urls import url
 from django.contrib import admin
-from events.views import Events
-from botcommands.views import BotCommands
-from actions.views import Actions
+from events.views import slack_event
+from botcommands.views import slack_start_command
+from actions.views import slack_action
+from oauth.views import slack_install, slack_oauth_redirect
+from davalon.metrics import metrics_view
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
-    url(r'^commands/start/', BotCommands.as_view(command='start')),
-    url(r'^actions/', Actions.as_view()),
-    url(r'^events/', Events.as_view()),
+    url(r'^commands/start/', slack_start_command),
+    url(r'^actions/', slack_action),
+    url(r'^events/', slack_event),
+    url(r'^oauth/install/', slack_install),
+    url(r'^oauth/redirect/', slack_oauth_redirect),
+    url(r'^metrics$', metrics_view),
 ]
\ No newline at end of file
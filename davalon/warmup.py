@@ -0,0 +1,41 @@
+"""Load up front what a cold process would otherwise load on its first requests.
+
+A woken dyno serves whatever woke it straight away, and the first slash
+command then pays for importing slackclient, building the client and the
+TLS handshake with Slack. Unless ``WARM_UP_ON_START`` is turned off,
+``start`` does all of that, and loads the URLconf, on a background thread as
+soon as the WSGI application is built. Only web processes build it, so
+management commands aren't slowed down. Requests are served meanwhile;
+anything not warm yet is loaded by whichever needs it first, as it would
+have been anyway.
+
+Turn it off under a server that preloads the application before forking,
+or every worker would share the one pooled connection.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_ON_START = getattr(settings, 'WARM_UP_ON_START', True)
+
+
+def warm_up():
+    from davalon import transport
+    from davalon.slack_client import SLACK_API_URL, get_client
+
+    get_resolver().url_patterns
+    get_client()
+    try:
+        # leaves a connection in the pool for the first real call
+        transport.request('HEAD', SLACK_API_URL)
+    except Exception as e:
+        logger.warning("couldn't connect to Slack ahead of time: %s", e)
+
+
+def start():
+    if WARM_UP_ON_START:
+        threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -0,0 +1,59 @@
+"""The Slack Web API client, over the shared transport.
+
+Importing slackclient pulls in aiohttp and takes a good part of a cold
+start, so only ``davalon.slack_client.get_client`` imports this module, the
+first time a client is needed.
+"""
+from slack import WebClient
+from slack.web.slack_response import SlackResponse
+from davalon.metrics import SLACK_API_SECONDS, SLACK_RATE_LIMITED
+from davalon.ratelimit import RateLimited, limiter, retry_after
+from davalon.transport import SLACK_HTTP_CONNECT_TIMEOUT, request
+
+
+class PooledWebClient(WebClient):
+    """A WebClient that sends its calls over the shared session.
+
+    The stock client opens a new aiohttp session, and so a new connection,
+    for every call, and is tied to one thread's event loop. This one keeps
+    the same API methods and SlackResponse results, is safe to share
+    between threads, and reuses pooled connections. Calls are paced by the
+    Slack rate limiter, per ``team_id``, and a 429 raises ``RateLimited``.
+    """
+
+    def __init__(self, token, team_id=None, **kwargs):
+        super().__init__(token, **kwargs)
+        self.team_id = team_id
+
+    def api_call(self, api_method, *, http_verb='POST', files=None, data=None, params=None, json=None):
+        channel = (json or data or {}).get('channel')
+        limiter.acquire(api_method, channel, self.team_id)
+
+        api_url = self._get_url(api_method)
+        headers = self._get_headers(json is not None, files is not None)
+        if not self.token:
+            # oauth.access authenticates with the client id and secret instead
+            del headers['Authorization']
+        headers.update(self.headers)
+        with SLACK_API_SECONDS.labels(api_method).time():
+            response = request(http_verb, api_url, headers=headers, data=data, params=params,
+                               json=json, files=files, timeout=(SLACK_HTTP_CONNECT_TIMEOUT, self.timeout))
+        if response.status_code == 429:
+            SLACK_RATE_LIMITED.labels(api_method).inc()
+            wait = retry_after(response.headers)
+            limiter.block(api_method, channel, wait, self.team_id)
+            raise RateLimited(api_method, wait)
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {'ok': False, 'error': f"http_{response.status_code}"}
+
+        return SlackResponse(
+            client=self,
+            http_verb=http_verb,
+            api_url=api_url,
+            req_args={'data': data, 'params': params, 'json': json},
+            data=response_data,
+            headers=response.headers,
+            status_code=response.status_code,
+        ).validate()
@@ -0,0 +1,67 @@
+"""Recognizing Events API deliveries we've already handled.
+
+Slack retries an event it didn't get a quick 200 for, up to three times, with
+the same ``event_id`` and an ``X-Slack-Retry-Num`` header. The first delivery
+claims the event id here; later ones find it claimed and are acknowledged
+without being processed again. Claims live in a small per-process LRU and, so
+a retry landing on another worker is caught too, in the shared ``default``
+cache, and expire after ``ttl`` seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+EVENT_DEDUPE_CACHE_SIZE = getattr(settings, 'EVENT_DEDUPE_CACHE_SIZE', 10000)
+EVENT_DEDUPE_TTL = getattr(settings, 'EVENT_DEDUPE_TTL', 60 * 60)
+
+
+def event_key(message):
+    """The id Slack delivers every retry of an event under, or None."""
+    event_id = message.get('event_id')
+    if event_id:
+        return event_id
+    event = message.get('event') or {}
+    if event.get('event_ts'):
+        return f"{message.get('team_id')}:{event.get('channel')}:{event['event_ts']}"
+    return None
+
+
+class SeenEvents:
+    def __init__(self, maxsize=EVENT_DEDUPE_CACHE_SIZE, ttl=EVENT_DEDUPE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(key):
+        return f"event:{key}"
+
+    def claim(self, key):
+        """Return True the first time ``key`` is seen, False for repeats."""
+        now = time.monotonic()
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires and expires > now:
+                return False
+            self._entries[key] = now + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        # add only succeeds if no other worker has claimed it yet
+        if not caches['default'].add(self._key(key), 1, self.ttl):
+            return False
+        return True
+
+    def release(self, key):
+        """Give up a claim, so Slack's retry of the event gets processed."""
+        with self._lock:
+            self._entries.pop(key, None)
+        caches['default'].delete(self._key(key))
+
+
+seen_events = SeenEvents()
@@ -1,36 +1,69 @@
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
+import json
+from http import HTTPStatus
+
 from django.conf import settings
-from slack import WebClient
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from actions.jobs import post_message
+from davalon import outbound
+from events.idempotency import event_key, seen_events
+from oauth.installations import uninstall
 
 SLACK_VERIFICATION_TOKEN = getattr(settings, 'SLACK_VERIFICATION_TOKEN', None)
-SLACK_BOT_USER_TOKEN = getattr(settings,  # 2
-                               'SLACK_BOT_USER_TOKEN', None)  #
-Client = WebClient(SLACK_BOT_USER_TOKEN)  # 3
 
 
-class Events(APIView):
+@csrf_exempt
+@require_POST
+def slack_event(request):
+    """``/events/``, usually served ahead of the middleware by ``davalon.fastpath``."""
+    try:
+        slack_message = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=HTTPStatus.BAD_REQUEST)
+    code, data = Events().respond(slack_message)
+    if data is not None:
+        return JsonResponse(data, status=code)
+    return HttpResponse(status=code)
 
-    def post(self, request, *args, **kwargs):
 
-        slack_message = request.data
+class Events:
 
+    def respond(self, slack_message):
+        """Return the status code and body to answer ``slack_message`` with."""
         if slack_message.get('token') != SLACK_VERIFICATION_TOKEN:
-            return Response(status=status.HTTP_403_FORBIDDEN)
+            return HTTPStatus.FORBIDDEN, None
 
         # verification challenge
         if slack_message.get('type') == 'url_verification':
-            return Response(data=slack_message,
-                            status=status.HTTP_200_OK)
+            return HTTPStatus.OK, slack_message
+
+        # Slack retries events we're slow to acknowledge, only handle each once
+        key = event_key(slack_message)
+        if key and not seen_events.claim(key):
+            return HTTPStatus.OK, None
+        try:
+            self.handle_event(slack_message)
+        except Exception:
+            if key:
+                seen_events.release(key)
+            raise
+        return HTTPStatus.OK, None
 
+    def handle_event(self, slack_message):
         # greet bot
         if 'event' in slack_message:  # 4
             event_message = slack_message.get('event')  #
 
             # ignore bot's own message
             if event_message.get('subtype') == 'bot_message':  # 5
-                return Response(status=status.HTTP_200_OK)  #
+                return  #
+
+            # the workspace removed the app, forget its token
+            if event_message.get('type') == 'app_uninstalled' or \
+                    event_message.get('type') == 'tokens_revoked' and event_message.get('tokens', {}).get('bot'):
+                uninstall(slack_message.get('team_id'))
+                return
 
             # process user's message
             user = event_message.get('user')  # 6
@@ -38,9 +71,4 @@ class Events(APIView):
             channel = event_message.get('channel')  #
             bot_text = 'Hi <@{}> :wave:'.format(user)  #
             if 'hi' in text.lower():  # 7
-                Client.chat_postMessage(channel=channel,  #
-                                text=bot_text)  #
-                return Response(status=status.HTTP_200_OK)  # 9
-
-        return Response(status=status.HTTP_200_OK)
-
+                outbound.submit(post_message, slack_message.get('team_id'), channel, bot_text)  #
@@ -0,0 +1,24 @@
+"""Recording and removing workspace installs."""
+from davalon import slack_client
+from oauth.models import Installation
+
+
+def install(access):
+    """Save the bot token from an ``oauth.access`` or ``oauth.v2.access`` response."""
+    team = access.get('team') or {}
+    bot = access.get('bot') or {}
+    installation, created = Installation.objects.update_or_create(
+        team_id=access.get('team_id') or team['id'],
+        defaults={
+            'team_name': access.get('team_name') or team.get('name', ''),
+            'bot_user_id': bot.get('bot_user_id') or access.get('bot_user_id', ''),
+            'bot_token': bot.get('bot_access_token') or access['access_token'],
+        })
+    # the team may have a client built with its old token
+    slack_client.forget(installation.team_id)
+    return installation
+
+
+def uninstall(team_id):
+    Installation.objects.filter(team_id=team_id).delete()
+    slack_client.forget(team_id)
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.5 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Installation',
+            fields=[
+                ('team_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('team_name', models.CharField(blank=True, max_length=255)),
+                ('bot_user_id', models.CharField(blank=True, max_length=32)),
+                ('bot_token', models.CharField(max_length=255)),
+                ('installed', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
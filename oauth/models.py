@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class Installation(models.Model):
+    """A workspace the app is installed in, and the bot token it granted."""
+    team_id = models.CharField(max_length=32, primary_key=True)
+    team_name = models.CharField(max_length=255, blank=True)
+    bot_user_id = models.CharField(max_length=32, blank=True)
+    bot_token = models.CharField(max_length=255)
+    installed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.team_name or self.team_id
@@ -0,0 +1,62 @@
+import logging
+import secrets
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseRedirect
+from davalon.slack_client import new_client
+from oauth.installations import install
+
+logger = logging.getLogger(__name__)
+
+SLACK_CLIENT_ID = getattr(settings, 'SLACK_CLIENT_ID', None)
+SLACK_CLIENT_SECRET = getattr(settings, 'SLACK_CLIENT_SECRET', None)
+SLACK_OAUTH_SCOPES = getattr(settings, 'SLACK_OAUTH_SCOPES', 'bot,commands')
+SLACK_OAUTH_REDIRECT_URI = getattr(settings, 'SLACK_OAUTH_REDIRECT_URI', None)
+SLACK_OAUTH_AUTHORIZE_URL = getattr(settings, 'SLACK_OAUTH_AUTHORIZE_URL', 'https://slack.com/oauth/authorize')
+
+# the state sent to Slack is also kept in a signed cookie, so only the
+# browser that started an install can finish it
+STATE_COOKIE = 'slack_oauth_state'
+STATE_MAX_AGE = 10 * 60
+
+# the pages below are plain messages, some quoting what Slack or the
+# workspace sent, so they're never served as HTML
+PLAIN = 'text/plain; charset=utf-8'
+
+
+def slack_install(request):
+    """``/oauth/install/``, sends the user to Slack to add the app to their workspace."""
+    state = secrets.token_urlsafe(16)
+    params = {'client_id': SLACK_CLIENT_ID, 'scope': SLACK_OAUTH_SCOPES, 'state': state}
+    if SLACK_OAUTH_REDIRECT_URI:
+        params['redirect_uri'] = SLACK_OAUTH_REDIRECT_URI
+    response = HttpResponseRedirect(SLACK_OAUTH_AUTHORIZE_URL + '?' + urlencode(params))
+    response.set_signed_cookie(STATE_COOKIE, state, salt=STATE_COOKIE, max_age=STATE_MAX_AGE, httponly=True)
+    return response
+
+
+def slack_oauth_redirect(request):
+    """``/oauth/redirect/``, where Slack sends the user back with a code for the bot token."""
+    if 'error' in request.GET:
+        return HttpResponseBadRequest(f"DAvalot wasn't installed: {request.GET['error']}", content_type=PLAIN)
+    state = request.get_signed_cookie(STATE_COOKIE, None, salt=STATE_COOKIE, max_age=STATE_MAX_AGE)
+    if not state or request.GET.get('state') != state:
+        return HttpResponseForbidden("This install link has expired, please start again.", content_type=PLAIN)
+
+    params = {'client_id': SLACK_CLIENT_ID, 'client_secret': SLACK_CLIENT_SECRET, 'code': request.GET.get('code')}
+    if SLACK_OAUTH_REDIRECT_URI:
+        params['redirect_uri'] = SLACK_OAUTH_REDIRECT_URI
+    from slack.errors import SlackApiError  # loaded along with the client
+    try:
+        access = new_client(None).oauth_access(**params)
+    except SlackApiError as e:
+        logger.warning("oauth.access failed: %s", e.response.get('error'))
+        return HttpResponseBadRequest("Slack didn't accept the install, please start again.", content_type=PLAIN)
+
+    installation = install(access.data)
+    logger.info("installed in %s (%s)", installation.team_name, installation.team_id)
+    response = HttpResponse(f"DAvalot is installed in {installation.team_name}, start a game with `/davalot`.",
+                            content_type=PLAIN)
+    response.delete_cookie(STATE_COOKIE)
+    return response
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.5 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CharacterStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_id', models.CharField(blank=True, max_length=32)),
+                ('user_id', models.CharField(blank=True, max_length=32)),
+                ('character', models.CharField(max_length=16)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FinishedGame',
+            fields=[
+                ('game_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('team_id', models.CharField(blank=True, max_length=32)),
+                ('channel_id', models.CharField(max_length=32)),
+                ('finished', models.DateTimeField(auto_now_add=True)),
+                ('good_won', models.BooleanField()),
+                ('players', models.TextField()),
+                ('quests', models.TextField()),
+                ('assassinated', models.PositiveSmallIntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('team_id', models.CharField(blank=True, max_length=32)),
+                ('user_id', models.CharField(max_length=32)),
+                ('username', models.CharField(blank=True, max_length=255)),
+                ('games', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('good_games', models.PositiveIntegerField(default=0)),
+                ('good_wins', models.PositiveIntegerField(default=0)),
+                ('quests', models.PositiveIntegerField(default=0)),
+                ('quests_failed', models.PositiveIntegerField(default=0)),
+                ('fail_cards', models.PositiveIntegerField(default=0)),
+                ('assassinations', models.PositiveIntegerField(default=0)),
+                ('assassinations_hit', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playerstats',
+            index=models.Index(fields=['team_id', '-wins'], name='stats_leaderboard'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='playerstats',
+            unique_together={('team_id', 'user_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='characterstats',
+            unique_together={('team_id', 'user_id', 'character')},
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import models
+
+
+class FinishedGame(models.Model):
+    """A game that was won or lost, kept compact.
+
+    ``players`` is JSON, ``[user id, username, character id]`` by seat;
+    ``quests`` is ``[questers, fail cards, succeeded]`` for each quest
+    played, the first two bitmasks over seats. ``assassinated`` is the seat
+    the assassin chose, if it came to that.
+    """
+    game_id = models.CharField(max_length=32, primary_key=True)
+    team_id = models.CharField(max_length=32, blank=True)
+    channel_id = models.CharField(max_length=32)
+    finished = models.DateTimeField(auto_now_add=True)
+    good_won = models.BooleanField()
+    players = models.TextField()
+    quests = models.TextField()
+    assassinated = models.PositiveSmallIntegerField(null=True)
+
+
+class PlayerStats(models.Model):
+    """A player's totals over every game they've finished in a workspace."""
+    team_id = models.CharField(max_length=32, blank=True)
+    user_id = models.CharField(max_length=32)
+    username = models.CharField(max_length=255, blank=True)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    good_games = models.PositiveIntegerField(default=0)
+    good_wins = models.PositiveIntegerField(default=0)
+    quests = models.PositiveIntegerField(default=0)
+    quests_failed = models.PositiveIntegerField(default=0)
+    fail_cards = models.PositiveIntegerField(default=0)
+    assassinations = models.PositiveIntegerField(default=0)
+    assassinations_hit = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('team_id', 'user_id')]
+        indexes = [models.Index(fields=['team_id', '-wins'], name='stats_leaderboard')]
+
+    @property
+    def evil_games(self):
+        return self.games - self.good_games
+
+    @property
+    def evil_wins(self):
+        return self.wins - self.good_wins
+
+    def __str__(self):
+        return self.username or self.user_id
+
+
+class CharacterStats(models.Model):
+    """Games and wins as a character, for a player or, with no user id, the whole workspace."""
+    team_id = models.CharField(max_length=32, blank=True)
+    user_id = models.CharField(max_length=32, blank=True)
+    character = models.CharField(max_length=16)
+    games = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [('team_id', 'user_id', 'character')]
@@ -0,0 +1,105 @@
+"""Recording finished games.
+
+Each finished game is kept as one compact ``FinishedGame`` row and added to
+its players' running totals as it's recorded, so reading anyone's stats
+never goes back over the games.
+"""
+import json
+from collections import Counter, defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import F
+
+from botcommands.engine import QUESTS, Character, GameStage
+from stats.models import CharacterStats, FinishedGame, PlayerStats
+
+FINISHED = (GameStage.Won, GameStage.Lost)
+
+# What's kept of a finished game, plain values so it can be recorded in the background
+GameSummary = namedtuple('GameSummary', ['game_id', 'team_id', 'channel_id', 'good_won', 'players', 'quests',
+                                         'assassinated'])
+
+
+def summarize(game):
+    """The ``GameSummary`` of a game that has just been won or lost."""
+    quests = []
+    for round_num in range(QUESTS):
+        if game.quest_played[round_num]:
+            succeeded, succeeds, fails = game.count_quest(round_num)
+            quests.append((game.quest_played[round_num], game.quest_failed[round_num], succeeded))
+    # only a game that went to the assassin, with three quests passed, ended
+    # by an assassination; a target left from any earlier click doesn't count
+    target = game.assassination_target if sum(1 for quest in quests if quest[2]) >= 3 else None
+    return GameSummary(
+        game_id=game.game_id,
+        team_id=game.team_id or '',
+        channel_id=game.channel_id,
+        good_won=game.game_stage == GameStage.Won,
+        players=tuple((player.id, player.username, player.character.id) for player in game.player_list),
+        quests=tuple(quests),
+        assassinated=game.seats.get(target.username) if target else None,
+    )
+
+
+def record_game(summary):
+    """Add a finished game to the stats; False if it already was."""
+    with transaction.atomic():
+        _, created = FinishedGame.objects.get_or_create(game_id=summary.game_id, defaults={
+            'team_id': summary.team_id,
+            'channel_id': summary.channel_id,
+            'good_won': summary.good_won,
+            'players': json.dumps(summary.players, separators=(',', ':')),
+            'quests': json.dumps(summary.quests, separators=(',', ':')),
+            'assassinated': summary.assassinated,
+        })
+        if not created:
+            return False
+
+        merlin_found = (summary.assassinated is not None
+                        and summary.players[summary.assassinated][2] == Character.Merlin.id)
+        players = {}
+        characters = defaultdict(Counter)
+        for seat, (user_id, username, character_id) in enumerate(summary.players):
+            good = Character.from_id(character_id).good
+            won = good == summary.good_won
+            bit = 1 << seat
+            assassin = character_id == Character.Assassin.id and summary.assassinated is not None
+            players[(user_id,)] = ({'username': username}, {
+                'games': 1,
+                'wins': won,
+                'good_games': good,
+                'good_wins': good and won,
+                'quests': sum(1 for questers, fails, succeeded in summary.quests if questers & bit),
+                'quests_failed': sum(1 for questers, fails, succeeded in summary.quests
+                                     if questers & bit and not succeeded),
+                'fail_cards': sum(1 for questers, fails, succeeded in summary.quests if fails & bit),
+                'assassinations': assassin,
+                'assassinations_hit': assassin and merlin_found,
+            })
+            # the workspace's row for each character is under no user
+            for player in (user_id, ''):
+                characters[(player, character_id)].update(games=1, wins=won)
+        _add(PlayerStats, summary.team_id, ('user_id',), players)
+        _add(CharacterStats, summary.team_id, ('user_id', 'character'),
+             {key: ({}, increments) for key, increments in characters.items()})
+    return True
+
+
+def _add(model, team_id, fields, rows):
+    """Add to the totals in ``rows``, ``{key: (values, increments)}`` with the key over ``fields``.
+
+    Missing rows are made first, then each is added to in place so
+    recordings running side by side can't lose each other's games.
+    """
+    lookup = {f"{fields[0]}__in": [key[0] for key in rows]}
+    existing = {tuple(getattr(row, field) for field in fields): row.pk
+                for row in model.objects.filter(team_id=team_id, **lookup)}
+    missing = [model(team_id=team_id, **dict(zip(fields, key)), **values)
+               for key, (values, increments) in rows.items() if key not in existing]
+    if missing:
+        model.objects.bulk_create(missing)
+        existing.update({tuple(getattr(row, field) for field in fields): row.pk
+                         for row in model.objects.filter(team_id=team_id, **lookup)})
+    for key, (values, increments) in rows.items():
+        changes = {field: F(field) + int(amount) for field, amount in increments.items() if amount}
+        model.objects.filter(pk=existing[key]).update(**values, **changes)
@@ -0,0 +1,47 @@
+"""The ``/davalot stats`` reply.
+
+Everything comes from the running totals by index: one player row, their
+rows by character, and the first few of the workspace's leaderboard, so
+it takes the same time however many games have been played.
+"""
+from botcommands.engine import Character
+from stats.models import CharacterStats, PlayerStats
+
+LEADERBOARD_SIZE = 5
+
+
+def _rate(count, total):
+    return f"{count}/{total} ({count / total:.0%})" if total else "0/0"
+
+
+def player_lines(team_id, user_id):
+    player = PlayerStats.objects.filter(team_id=team_id, user_id=user_id).first()
+    if player is None:
+        return [f"<@{user_id}> hasn't finished a game yet."]
+
+    lines = [f"*Stats for <@{user_id}>*",
+             f"Won {_rate(player.wins, player.games)}",
+             f"Good: won {_rate(player.good_wins, player.good_games)}, "
+             f"evil: won {_rate(player.evil_wins, player.evil_games)}"]
+    characters = CharacterStats.objects.filter(team_id=team_id, user_id=user_id).order_by('-games')
+    lines.append("By character: " + ", ".join(
+        f"{Character.from_id(row.character).name} {_rate(row.wins, row.games)}" for row in characters))
+    if player.quests:
+        lines.append(f"Quests: {_rate(player.quests_failed, player.quests)} failed, "
+                     f"{player.fail_cards} fail card(s) played")
+    if player.assassinations:
+        lines.append(f"Assassinations: found Merlin {_rate(player.assassinations_hit, player.assassinations)}")
+    return lines
+
+
+def leaderboard_lines(team_id):
+    leaders = PlayerStats.objects.filter(team_id=team_id).order_by('-wins', 'games')[:LEADERBOARD_SIZE]
+    lines = ["*Leaderboard*"]
+    for place, player in enumerate(leaders, 1):
+        lines.append(f"{place}. <@{player.user_id}> {player.wins} win(s), {_rate(player.wins, player.games)}")
+    return lines if len(lines) > 1 else []
+
+
+def stats_message(team_id, user_id):
+    """A player's win rates by team and character, quest and assassination record, and the leaderboard."""
+    return "\n".join(player_lines(team_id, user_id) + [""] + leaderboard_lines(team_id)).strip()
@@ -0,0 +1 @@
+"""Tests, run from the repository root with ``python manage.py test``."""
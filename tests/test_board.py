@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase
+
+from actions import board_management as board
+from actions.renderer import render
+from botcommands import engine
+from botcommands.engine import Action, Character
+from botcommands.models import Game, GameStage
+from tests.test_engine import new_game, play_quest, propose, seated, vote_all
+
+# quest sizes for five players
+UNPLAYED = ["_1) 2 questers_", "_2) 3 questers_", "_3) 2 questers_", "_4) 3 questers_", "_5) 3 questers_"]
+
+
+def team(game, good=True):
+    """Usernames for this round's quest, evil first unless ``good``."""
+    players = sorted(game.player_list, key=lambda player: player.character.good != good)
+    return [player.username for player in players[:game.get_quester_count()]]
+
+
+def play_round(game, good=True):
+    propose(game, team(game, good))
+    vote_all(game, True)
+    play_quest(game, False)
+
+
+class GameInfoTests(SimpleTestCase):
+    def setUp(self):
+        self.game = new_game(game_class=Game)
+
+    def turn_order(self):
+        return board.game_info(self.game)['fields'][0]['text'].split('\n')[1:]
+
+    def quests(self):
+        return board.game_info(self.game)['fields'][1]['text'].split('\n')[1:]
+
+    def assertShown(self, stage, quests):
+        self.assertEqual(self.game.game_stage, stage)
+        self.assertEqual(self.quests(), quests)
+        # and the whole board renders with it
+        self.assertIn(board.game_info(self.game), render(self.game).blocks)
+
+    def test_choose_quest(self):
+        self.assertShown(GameStage.ChooseQuest, UNPLAYED)
+        leader = self.game.player_list[0].username
+        self.assertEqual(self.turn_order()[0], f"_*<@{leader}>*_")
+        self.assertEqual(self.turn_order()[1:], [f"_<@{player.username}>_" for player in self.game.player_list[1:]])
+
+    def test_vote_on_quest(self):
+        propose(self.game)
+        self.assertShown(GameStage.VoteOnQuest, UNPLAYED)
+
+    def test_complete_quest(self):
+        propose(self.game)
+        vote_all(self.game, True)
+        self.assertShown(GameStage.CompleteQuest, UNPLAYED)
+
+    def test_quest_being_played(self):
+        propose(self.game, team(self.game, good=False))
+        vote_all(self.game, True)
+        self.game.record_quest_card(0, self.game.seats[self.game.questers[0].username], False)
+        self.assertShown(GameStage.CompleteQuest, UNPLAYED)
+
+    def test_next_round(self):
+        play_round(self.game)
+        self.assertShown(GameStage.ChooseQuest, ["*1) Passed* _(2-0)_"] + UNPLAYED[1:])
+        leader = self.game.player_list[1].username
+        self.assertEqual(self.turn_order()[1], f"_*<@{leader}>*_")
+
+    def test_assassinate(self):
+        for round_num in range(3):
+            play_round(self.game)
+        self.assertShown(GameStage.Assassinate,
+                         ["*1) Passed* _(2-0)_", "*2) Passed* _(3-0)_", "*3) Passed* _(2-0)_"] + UNPLAYED[3:])
+
+    def test_won(self):
+        for round_num in range(3):
+            play_round(self.game)
+        assassin = seated(self.game, Character.Assassin).username
+        engine.apply(self.game, Action(engine.TOGGLE_TARGET, assassin, seated(self.game, Character.Servant).username))
+        engine.apply(self.game, Action(engine.ASSASSINATE, assassin))
+        self.assertShown(GameStage.Won,
+                         ["*1) Passed* _(2-0)_", "*2) Passed* _(3-0)_", "*3) Passed* _(2-0)_"] + UNPLAYED[3:])
+
+    def test_lost_by_quests(self):
+        play_round(self.game, good=False)
+        play_round(self.game)
+        play_round(self.game, good=False)
+        play_round(self.game, good=False)
+        self.assertShown(GameStage.Lost, ["*1) Failed* _(0-2)_", "*2) Passed* _(3-0)_", "*3) Failed* _(0-2)_",
+                                          "*4) Failed* _(1-2)_", "_5) 3 questers_"])
+
+    def test_lost_to_the_hammer(self):
+        play_round(self.game)
+        for turn in range(5):
+            propose(self.game)
+            vote_all(self.game, False)
+        self.assertShown(GameStage.Lost, ["*1) Passed* _(2-0)_"] + UNPLAYED[1:])
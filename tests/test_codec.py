@@ -0,0 +1,123 @@
+import json
+
+from django.test import SimpleTestCase
+
+from botcommands import codec, engine
+from botcommands.codec import CodecError
+from botcommands.engine import Action
+from botcommands.models import Character, Game, GameStage
+
+# fields each format version's body ends after
+V1_FIELDS = 14
+V2_FIELDS = 17
+
+
+def voting_game():
+    """A game part way through a vote, after a quest."""
+    game = Game()
+    game.channel_id = 'C1'
+    game.slack_message_ts = '1500000000.000100'
+    game.team_id = 'T1'
+    for i in range(5):
+        engine.apply(game, Action(engine.JOIN, f"player{i}", f"U{i}"))
+    engine.apply(game, Action(engine.START, None, 1))
+    leader = game.player_list[0].username
+    for player in game.player_list[:2]:
+        engine.apply(game, Action(engine.TOGGLE_QUESTER, leader, player.username))
+    engine.apply(game, Action(engine.SEND_QUEST, leader))
+    for player in game.player_list:
+        engine.apply(game, Action(engine.VOTE, player.username, True))
+    for player in list(game.questers):
+        engine.apply(game, Action(engine.QUEST, player.username, True))
+    leader = game.player_list[1].username
+    for player in game.player_list[1:4]:
+        engine.apply(game, Action(engine.TOGGLE_QUESTER, leader, player.username))
+    engine.apply(game, Action(engine.SEND_QUEST, leader))
+    engine.apply(game, Action(engine.VOTE, 'player0', False))
+    engine.apply(game, Action(engine.VOTE, 'player3', True))
+    game.version = 12
+    game.board_fingerprint = 'abc'
+    return game
+
+
+def usernames(players):
+    return [player.username for player in players]
+
+
+def old_value(game, version, fields):
+    """``game`` as a deploy writing format ``version`` would have stored it."""
+    body = codec.to_body(game)[:fields]
+    return bytes((version, 0)) + json.dumps(body).encode('utf-8')
+
+
+class CodecTests(SimpleTestCase):
+    def assertSameGame(self, game, other):
+        self.assertEqual(codec.to_body(game), codec.to_body(other))
+
+    def test_round_trip(self):
+        game = voting_game()
+        decoded = codec.decode(codec.encode(game))
+        self.assertSameGame(decoded, game)
+        self.assertEqual(decoded.game_stage, GameStage.VoteOnQuest)
+        self.assertEqual((decoded.votes_for, decoded.votes_against), (1, 1))
+        self.assertEqual(decoded.count_quest(0), (True, 2, 0))
+        self.assertEqual(decoded.seats, game.seats)
+        self.assertEqual(usernames(decoded.questers), usernames(game.player_list[1:4]))
+
+    def test_new_game_round_trip(self):
+        game = Game()
+        self.assertSameGame(codec.decode(codec.encode(game)), game)
+
+    def test_header(self):
+        value = codec.encode(voting_game(), compress=False)
+        self.assertEqual(value[:2], bytes((codec.VERSION, 0)))
+
+    def test_compressed(self):
+        game = voting_game()
+        game.message = "a long message " * 100
+        value = codec.encode(game)
+        self.assertTrue(value[1] & codec.FLAG_ZLIB)
+        self.assertLess(len(value), len(codec.encode(game, compress=False)))
+        self.assertSameGame(codec.decode(value), game)
+
+    def test_migrate_from_v1(self):
+        game = voting_game()
+        decoded = codec.decode(old_value(game, 1, V1_FIELDS))
+        self.assertEqual(codec.to_body(decoded)[:V1_FIELDS], codec.to_body(game)[:V1_FIELDS])
+        # a fresh game id, and nothing on the board yet
+        self.assertEqual(len(decoded.game_id), 32)
+        self.assertNotEqual(decoded.game_id, game.game_id)
+        self.assertEqual((decoded.version, decoded.board_fingerprint, decoded.team_id), (0, None, None))
+
+    def test_migrate_from_v2(self):
+        game = voting_game()
+        decoded = codec.decode(old_value(game, 2, V2_FIELDS))
+        self.assertEqual(codec.to_body(decoded)[:V2_FIELDS], codec.to_body(game)[:V2_FIELDS])
+        self.assertIsNone(decoded.team_id)
+
+    def test_references_to_non_players_are_dropped(self):
+        game = voting_game()
+        body = codec.to_body(game)
+        body[9].append('spectator')
+        body[10].append(['spectator', 1])
+        body[11][0].append([99, 0])
+        body[12] = 'spectator'
+        decoded = codec.decode(bytes((1, 0)) + json.dumps(body[:V1_FIELDS]).encode('utf-8'))
+        self.assertEqual(usernames(decoded.questers), usernames(game.player_list[1:4]))
+        self.assertEqual((decoded.votes_for, decoded.votes_against), (1, 1))
+        self.assertEqual(decoded.count_quest(0), (True, 2, 0))
+        self.assertIsNone(decoded.assassination_target)
+
+    def test_characters_are_kept(self):
+        game = Game()
+        engine.apply(game, Action(engine.TOGGLE_CHARACTER, None, Character.Percival.id))
+        self.assertEqual(codec.decode(codec.encode(game)).character_list,
+                         {Character.Merlin, Character.Assassin, Character.Percival, Character.Morgana})
+
+    def test_newer_version(self):
+        with self.assertRaises(CodecError):
+            codec.decode(bytes((codec.VERSION + 1, 0)) + b'[]')
+
+    def test_truncated(self):
+        with self.assertRaises(CodecError):
+            codec.decode(b'\x03')
@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from actions import dispatcher as dispatcher_module
+from actions.dispatcher import ChannelDispatcher
+from botcommands.journal import GameJournal
+from botcommands.models import Game, User
+from botcommands.store import ConflictError, LocalGameStore
+
+CHANNEL = 'C1'
+
+
+class RacingStore(LocalGameStore):
+    """A store where another process writes the game just before the next ``races`` saves."""
+
+    def __init__(self, races=0, **options):
+        super().__init__(**options)
+        self.races = races
+        self.loads_done = 0
+
+    def load(self, channel):
+        self.loads_done = self.loads_done + 1
+        return super().load(channel)
+
+    def save(self, channel, game, token):
+        if self.races:
+            self.races = self.races - 1
+            other, other_token = super().load(channel)
+            other.message = f"written elsewhere {self.races}"
+            super().save(channel, other, other_token)
+        return super().save(channel, game, token)
+
+
+def new_game(store, players=5):
+    game = Game()
+    game.channel_id = CHANNEL
+    game.seat_players([User({'username': f"player{i}", 'id': f"U{i}"}) for i in range(players)])
+    store.set(CHANNEL, game)
+
+
+def vote(username, approve=True):
+    def mutate(game):
+        game.record_vote(game.seats[username], approve)
+        return game.votes_for
+    return mutate
+
+
+class DispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.store = RacingStore(max_retries=5)
+        new_game(self.store)
+        self.dispatcher = ChannelDispatcher(workers=4, store=self.store)
+
+    def tearDown(self):
+        self.dispatcher._pool.shutdown()
+
+    def submit(self, mutate, on_commit=None):
+        return self.dispatcher.submit(CHANNEL, mutate, on_commit).result(timeout=10)
+
+    def test_applies_and_saves(self):
+        committed = []
+        self.assertEqual(self.submit(vote('player0'), committed.append), 1)
+        self.assertEqual(self.store.get(CHANNEL).votes_for, 1)
+        self.assertEqual(len(committed), 1)
+
+    def test_retries_on_a_concurrent_write(self):
+        self.store.races = 2
+        calls = []
+        committed = []
+
+        def mutate(game):
+            calls.append(game.message)
+            return vote('player0')(game)
+
+        self.assertEqual(self.submit(mutate, committed.append), 1)
+        # re-applied to a fresh copy each time, keeping the other writes
+        self.assertEqual(calls, [None, "written elsewhere 1", "written elsewhere 0"])
+        game = self.store.get(CHANNEL)
+        self.assertEqual((game.votes_for, game.message), (1, "written elsewhere 0"))
+        self.assertEqual(len(committed), 1)
+
+    def test_gives_up(self):
+        self.store.races = 5
+        committed = []
+        with self.assertRaises(ConflictError):
+            self.submit(vote('player0'), committed.append)
+        self.assertEqual(self.store.get(CHANNEL).votes_for, 0)
+        self.assertEqual(committed, [])
+
+    def test_held_game_is_reused(self):
+        self.submit(vote('player0'))
+        loads = self.store.loads_done
+        self.submit(vote('player1'))
+        self.assertEqual(self.store.loads_done, loads)
+        self.assertEqual(self.store.get(CHANNEL).votes_for, 2)
+
+    def test_held_game_changed_elsewhere(self):
+        self.submit(vote('player0'))
+        game, token = self.store.load(CHANNEL)
+        game.record_vote(game.seats['player1'], True)
+        self.store.save(CHANNEL, game, token)
+
+        self.assertEqual(self.submit(vote('player2')), 3)
+        self.assertEqual(self.store.get(CHANNEL).votes_for, 3)
+
+    def test_failed_mutate_leaves_the_game(self):
+        self.submit(vote('player0'))
+
+        def fail(game):
+            vote('player1')(game)
+            raise ValueError("half way")
+
+        with self.assertRaises(ValueError):
+            self.submit(fail)
+        self.assertEqual(self.submit(vote('player2')), 2)
+        game = self.store.get(CHANNEL)
+        self.assertEqual(game.votes(), [(game.player_list[0], True), (game.player_list[2], True)])
+
+    def test_failing_commit_hook(self):
+        def hook(game):
+            raise ValueError("board")
+
+        with self.assertLogs('actions.dispatcher', 'ERROR'):
+            self.assertEqual(self.submit(vote('player0'), hook), 1)
+        self.assertEqual(self.store.get(CHANNEL).votes_for, 1)
+
+    def test_simultaneous_clicks(self):
+        store = LocalGameStore(max_retries=1000)
+        new_game(store, players=10)
+        # one per process, sharing the store
+        dispatchers = [ChannelDispatcher(workers=2, max_games=0, store=store) for i in range(3)]
+        start = threading.Barrier(10)
+        futures = []
+
+        def click(i):
+            start.wait()
+            futures.append(dispatchers[i % 3].submit(CHANNEL, vote(f"player{i}")))
+
+        threads = [threading.Thread(target=click, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            future.result(timeout=10)
+        for dispatcher in dispatchers:
+            dispatcher._pool.shutdown()
+        self.assertEqual(store.get(CHANNEL).votes_for, 10)
+
+
+class MissingGameTests(SimpleTestCase):
+    def setUp(self):
+        self.store = LocalGameStore()
+        self.dispatcher = ChannelDispatcher(workers=1, store=self.store)
+
+    def tearDown(self):
+        self.dispatcher._pool.shutdown()
+
+    def test_no_game(self):
+        with mock.patch.object(dispatcher_module, 'journal', GameJournal(None)):
+            self.assertIsNone(self.dispatcher.submit(CHANNEL, vote('player0')).result(timeout=10))
+
+    def test_restored_from_the_journal(self):
+        directory = tempfile.mkdtemp()
+        journal = GameJournal(os.path.join(directory, 'journal.sqlite3'))
+        try:
+            other = LocalGameStore()
+            new_game(other)
+            journal.snapshot(CHANNEL, other.get(CHANNEL))
+            with mock.patch.object(dispatcher_module, 'journal', journal):
+                self.assertEqual(self.dispatcher.submit(CHANNEL, vote('player0')).result(timeout=10), 1)
+            self.assertEqual(self.store.get(CHANNEL).votes_for, 1)
+        finally:
+            journal.stop()
+            shutil.rmtree(directory)
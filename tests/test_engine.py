@@ -0,0 +1,338 @@
+import unittest
+
+from botcommands import engine
+from botcommands.engine import Action, Character, GameStage, GameState, IllegalAction
+
+
+class DebugGame(GameState):
+    __slots__ = ()
+    debug = True
+
+
+def new_game(players=5, seed=1, game_class=GameState):
+    """A started game of ``players`` with just Merlin and the Assassin."""
+    state = game_class()
+    for i in range(players):
+        engine.apply(state, Action(engine.JOIN, f"player{i}", f"U{i}"))
+    engine.apply(state, Action(engine.START, None, seed))
+    return state
+
+
+def leader(state):
+    return state.player_list[state.player_turn_index].username
+
+
+def propose(state, usernames=None):
+    if usernames is None:
+        usernames = [player.username for player in state.player_list[:state.get_quester_count()]]
+    for username in usernames:
+        engine.apply(state, Action(engine.TOGGLE_QUESTER, leader(state), username))
+    engine.apply(state, Action(engine.SEND_QUEST, leader(state)))
+
+
+def vote_all(state, approve):
+    for player in list(state.player_list):
+        engine.apply(state, Action(engine.VOTE, player.username, approve))
+
+
+def play_quest(state, succeed):
+    for player in list(state.questers):
+        engine.apply(state, Action(engine.QUEST, player.username, succeed))
+
+
+def seated(state, character):
+    return next(player for player in state.player_list if player.character == character)
+
+
+class LobbyTests(unittest.TestCase):
+    def test_join_and_leave(self):
+        state = GameState()
+        engine.apply(state, Action(engine.JOIN, 'alice', 'U1'))
+        engine.apply(state, Action(engine.JOIN, 'bob', 'U2'))
+        engine.apply(state, Action(engine.JOIN, 'alice', 'U1'))
+        self.assertEqual([player.username for player in state.player_list], ['bob', 'alice'])
+        self.assertEqual(state.seats, {'bob': 0, 'alice': 1})
+
+        engine.apply(state, Action(engine.LEAVE, 'bob'))
+        self.assertEqual(state.seats, {'alice': 0})
+
+    def test_games_dont_share_state(self):
+        first = GameState()
+        second = GameState()
+        engine.apply(first, Action(engine.TOGGLE_CHARACTER, None, Character.Percival.id))
+        self.assertNotIn(Character.Percival, second.character_list)
+
+    def test_toggle_character_brings_its_partner(self):
+        state = GameState()
+        engine.apply(state, Action(engine.TOGGLE_CHARACTER, None, Character.Percival.id))
+        self.assertEqual(state.character_list, {Character.Merlin, Character.Assassin,
+                                                Character.Percival, Character.Morgana})
+        engine.apply(state, Action(engine.TOGGLE_CHARACTER, None, Character.Morgana.id))
+        self.assertEqual(state.character_list, {Character.Merlin, Character.Assassin})
+
+    def test_always_present_characters_cant_be_toggled(self):
+        state = GameState()
+        with self.assertRaises(IllegalAction):
+            engine.apply(state, Action(engine.TOGGLE_CHARACTER, None, Character.Merlin.id))
+        self.assertIn(Character.Merlin, state.character_list)
+
+    def test_start_needs_enough_players(self):
+        state = GameState()
+        for i in range(4):
+            engine.apply(state, Action(engine.JOIN, f"player{i}", f"U{i}"))
+        with self.assertRaises(IllegalAction):
+            engine.apply(state, Action(engine.START, None, 1))
+        self.assertEqual(state.game_stage, GameStage.Lobby)
+
+    def test_start_deals_every_role(self):
+        state = new_game(players=5)
+        self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+        self.assertEqual((state.player_turn_index, state.hammer_index), (0, 4))
+        characters = [player.character for player in state.player_list]
+        self.assertEqual(characters.count(Character.Merlin), 1)
+        self.assertEqual(characters.count(Character.Assassin), 1)
+        self.assertEqual(sum(1 for character in characters if character.evil), 2)
+        self.assertEqual(state.seats, {player.username: seat for seat, player in enumerate(state.player_list)})
+
+    def test_start_is_seeded(self):
+        deal = [(player.username, player.character) for player in new_game(seed=7).player_list]
+        self.assertEqual(deal, [(player.username, player.character) for player in new_game(seed=7).player_list])
+
+    def test_repeated_start(self):
+        state = new_game(seed=1)
+        deal = [(player.username, player.character) for player in state.player_list]
+        with self.assertRaises(IllegalAction):
+            engine.apply(state, Action(engine.START, None, 2))
+        self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+        self.assertEqual([(player.username, player.character) for player in state.player_list], deal)
+
+    def test_lobby_is_closed_once_started(self):
+        state = new_game()
+        for action in (Action(engine.JOIN, 'latecomer', 'U9'), Action(engine.LEAVE, 'player0'),
+                       Action(engine.TOGGLE_CHARACTER, None, Character.Percival.id)):
+            with self.assertRaises(IllegalAction):
+                engine.apply(state, action)
+        self.assertEqual(len(state.player_list), 5)
+        self.assertNotIn(Character.Percival, state.character_list)
+
+
+class RoundTests(unittest.TestCase):
+    def test_only_the_leader_proposes(self):
+        state = new_game()
+        other = state.player_list[1].username
+        with self.assertRaises(IllegalAction):
+            engine.apply(state, Action(engine.TOGGLE_QUESTER, other, other))
+        self.assertEqual(state.questers, [])
+
+    def test_send_quest_needs_a_full_team(self):
+        state = new_game()
+        engine.apply(state, Action(engine.TOGGLE_QUESTER, leader(state), leader(state)))
+        engine.apply(state, Action(engine.SEND_QUEST, leader(state)))
+        self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+
+    def test_toggle_quester_twice_takes_them_off(self):
+        state = new_game()
+        engine.apply(state, Action(engine.TOGGLE_QUESTER, leader(state), 'player0'))
+        engine.apply(state, Action(engine.TOGGLE_QUESTER, leader(state), 'player0'))
+        self.assertEqual(state.questers, [])
+
+    def test_changed_vote_is_counted_once(self):
+        state = new_game()
+        propose(state)
+        voter = state.player_list[0].username
+        engine.apply(state, Action(engine.VOTE, voter, True))
+        engine.apply(state, Action(engine.VOTE, voter, False))
+        self.assertEqual((state.votes_for, state.votes_against), (0, 1))
+
+    def test_approved_quest(self):
+        state = new_game()
+        propose(state)
+        self.assertEqual(state.game_stage, GameStage.VoteOnQuest)
+        vote_all(state, True)
+        self.assertEqual(state.game_stage, GameStage.CompleteQuest)
+        self.assertTrue(state.message.startswith("Vote *passed*"))
+
+    def test_rejected_quest_passes_the_lead(self):
+        state = new_game()
+        propose(state)
+        vote_all(state, False)
+        self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+        self.assertEqual(state.player_turn_index, 1)
+        self.assertEqual((state.questers, state.voted), ([], 0))
+
+    def test_only_questers_play(self):
+        state = new_game()
+        propose(state)
+        vote_all(state, True)
+        outsider = next(player.username for player in state.player_list if player not in state.questers)
+        with self.assertRaises(IllegalAction):
+            engine.apply(state, Action(engine.QUEST, outsider, False))
+
+    def test_good_players_cant_fail_a_quest(self):
+        state = new_game()
+        good = [player.username for player in state.player_list if player.character.good]
+        propose(state, good[:state.get_quester_count()])
+        vote_all(state, True)
+        play_quest(state, False)
+        self.assertEqual(state.message, "*Quest SUCCEEDED!*")
+        self.assertEqual(state.count_quest(0), (True, 2, 0))
+        self.assertEqual((state.game_stage, state.round, state.player_turn_index), (GameStage.ChooseQuest, 1, 1))
+
+    def test_hammer_loss(self):
+        state = new_game()
+        for turn in range(4):
+            propose(state)
+            vote_all(state, False)
+            self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+        self.assertEqual(state.player_turn_index, state.hammer_index)
+        propose(state)
+        vote_all(state, False)
+        self.assertEqual(state.game_stage, GameStage.Lost)
+        self.assertIsNone(state.count_quest(state.round))
+
+    def test_hammer_moves_with_the_round(self):
+        state = new_game()
+        propose(state)
+        vote_all(state, True)
+        play_quest(state, True)
+        self.assertEqual((state.player_turn_index, state.hammer_index), (1, 0))
+
+    def test_three_failed_quests_lose(self):
+        state = new_game()
+        evil = [player.username for player in state.player_list if player.character.evil]
+        for round_num in range(3):
+            self.assertEqual(state.game_stage, GameStage.ChooseQuest)
+            team = evil + [player.username for player in state.player_list if player.username not in evil]
+            propose(state, team[:state.get_quester_count()])
+            vote_all(state, True)
+            play_quest(state, False)
+        self.assertEqual(state.game_stage, GameStage.Lost)
+
+    def test_three_good_quests_go_to_the_assassin(self):
+        state = new_game()
+        good = [player.username for player in state.player_list if player.character.good]
+        for round_num in range(3):
+            propose(state, good[:state.get_quester_count()])
+            vote_all(state, True)
+            play_quest(state, True)
+        self.assertEqual(state.game_stage, GameStage.Assassinate)
+
+
+class AssassinationTests(unittest.TestCase):
+    def setUp(self):
+        self.state = new_game()
+        good = [player.username for player in self.state.player_list if player.character.good]
+        for round_num in range(3):
+            propose(self.state, good[:self.state.get_quester_count()])
+            vote_all(self.state, True)
+            play_quest(self.state, True)
+        self.assassin = seated(self.state, Character.Assassin).username
+
+    def assassinate(self, target):
+        engine.apply(self.state, Action(engine.TOGGLE_TARGET, self.assassin, target.username))
+        engine.apply(self.state, Action(engine.ASSASSINATE, self.assassin))
+
+    def test_only_the_assassin_picks(self):
+        merlin = seated(self.state, Character.Merlin)
+        with self.assertRaises(IllegalAction):
+            engine.apply(self.state, Action(engine.TOGGLE_TARGET, merlin.username, merlin.username))
+
+    def test_assassinate_needs_a_target(self):
+        engine.apply(self.state, Action(engine.ASSASSINATE, self.assassin))
+        self.assertEqual(self.state.game_stage, GameStage.Assassinate)
+
+    def test_finding_merlin_loses(self):
+        self.assassinate(seated(self.state, Character.Merlin))
+        self.assertEqual(self.state.game_stage, GameStage.Lost)
+
+    def test_missing_merlin_wins(self):
+        self.assassinate(seated(self.state, Character.Servant))
+        self.assertEqual(self.state.game_stage, GameStage.Won)
+
+
+def fields(state):
+    return (state.game_stage, state.round, state.player_turn_index, list(state.questers), state.voted,
+            state.approved, list(state.quest_played), list(state.quest_failed), state.assassination_target)
+
+
+class StageTests(unittest.TestCase):
+    """Every action but the stage's own is refused, whoever's turn it is."""
+
+    def assertRefused(self, state, *actions):
+        before = fields(state)
+        for action in actions:
+            with self.assertRaises(IllegalAction):
+                engine.apply(state, action)
+        self.assertEqual(fields(state), before)
+
+    def out_of_stage(self, state, allowed):
+        """An action of each kind the stage doesn't allow, each by someone who could act in its own stage."""
+        assassin = seated(state, Character.Assassin).username
+        actions = {
+            engine.TOGGLE_QUESTER: Action(engine.TOGGLE_QUESTER, leader(state), assassin),
+            engine.SEND_QUEST: Action(engine.SEND_QUEST, leader(state)),
+            engine.VOTE: Action(engine.VOTE, leader(state), False),
+            engine.QUEST: Action(engine.QUEST, (state.questers or state.player_list)[0].username, False),
+            engine.TOGGLE_TARGET: Action(engine.TOGGLE_TARGET, assassin, leader(state)),
+            engine.ASSASSINATE: Action(engine.ASSASSINATE, assassin),
+        }
+        return [action for kind, action in actions.items() if kind not in allowed]
+
+    def test_choose_quest(self):
+        state = new_game()
+        self.assertRefused(state, *self.out_of_stage(state, (engine.TOGGLE_QUESTER, engine.SEND_QUEST)))
+
+    def test_vote_on_quest(self):
+        state = new_game()
+        propose(state)
+        self.assertRefused(state, *self.out_of_stage(state, (engine.VOTE,)))
+
+    def test_complete_quest(self):
+        state = new_game()
+        propose(state)
+        vote_all(state, True)
+        self.assertRefused(state, *self.out_of_stage(state, (engine.QUEST,)))
+
+    def test_assassinate(self):
+        state = new_game()
+        good = [player.username for player in state.player_list if player.character.good]
+        for round_num in range(3):
+            propose(state, good[:state.get_quester_count()])
+            vote_all(state, True)
+            play_quest(state, True)
+        self.assertRefused(state, *self.out_of_stage(state, (engine.TOGGLE_TARGET, engine.ASSASSINATE)))
+
+    def test_finished(self):
+        state = new_game()
+        for turn in range(5):
+            propose(state)
+            vote_all(state, False)
+        self.assertEqual(state.game_stage, GameStage.Lost)
+        self.assertRefused(state, *self.out_of_stage(state, ()))
+
+    def test_lobby(self):
+        state = GameState()
+        engine.apply(state, Action(engine.JOIN, 'alice', 'U1'))
+        self.assertRefused(state, Action(engine.VOTE, 'alice', True), Action(engine.QUEST, 'alice', False),
+                           Action(engine.TOGGLE_TARGET, 'alice', 'alice'), Action(engine.ASSASSINATE, 'alice'))
+
+    def test_no_assassination_during_a_vote(self):
+        state = new_game()
+        propose(state)
+        assassin = seated(state, Character.Assassin).username
+        self.assertRefused(state, Action(engine.TOGGLE_TARGET, assassin, seated(state, Character.Merlin).username),
+                           Action(engine.ASSASSINATE, assassin))
+        self.assertIsNone(state.assassination_target)
+
+    def test_debug_keeps_to_the_stage(self):
+        state = new_game(game_class=DebugGame)
+        propose(state)
+        self.assertRefused(state, *self.out_of_stage(state, (engine.VOTE,)))
+
+
+class DebugTests(unittest.TestCase):
+    def test_debug_acts_out_of_turn(self):
+        state = new_game(game_class=DebugGame)
+        other = state.player_list[1].username
+        engine.apply(state, Action(engine.TOGGLE_QUESTER, other, other))
+        self.assertEqual([player.username for player in state.questers], [other])
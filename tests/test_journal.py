@@ -0,0 +1,148 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.test import SimpleTestCase
+
+from botcommands import codec, engine
+from botcommands.engine import Action
+from botcommands.journal import GameJournal
+from botcommands.models import Game, GameStage
+from botcommands.store import LocalGameStore
+
+CHANNEL = 'C1'
+
+
+class JournalTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.journal = GameJournal(os.path.join(self.directory, 'journal.sqlite3'),
+                                   snapshot_every=5, flush_interval=0.01)
+        self.game = Game()
+        self.game.channel_id = CHANNEL
+        self.journal.append(CHANNEL, self.game, [])
+
+    def tearDown(self):
+        self.journal.stop()
+        shutil.rmtree(self.directory)
+
+    def click(self, *actions):
+        """Apply ``actions`` as one click would, and log them."""
+        for action in actions:
+            engine.apply(self.game, action)
+        self.game.version = self.game.version + 1
+        self.journal.append(CHANNEL, self.game, list(actions))
+
+    def fill(self, players=5):
+        for i in range(players):
+            self.click(Action(engine.JOIN, f"player{i}", f"U{i}"))
+
+    def rows(self, table):
+        self.journal.flush()
+        connection = sqlite3.connect(self.journal.path)
+        try:
+            return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        finally:
+            connection.close()
+
+    def assertRecovered(self, game, version):
+        self.assertIsNotNone(game)
+        self.assertEqual(game.version, version)
+        self.assertEqual(game.game_id, self.game.game_id)
+
+    def test_recover_replays_the_log(self):
+        self.fill(3)
+        game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 3)
+        self.assertEqual(list(game.seats), ['player0', 'player1', 'player2'])
+
+    def test_recover_replays_a_seeded_start(self):
+        self.fill()
+        self.click(Action(engine.START, None, 42))
+        game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 6)
+        self.assertEqual(codec.to_body(game)[:14], codec.to_body(self.game)[:14])
+
+    def test_snapshots_every_few_versions(self):
+        self.fill(7)
+        # the snapshot at version 5 dropped the log before it
+        self.assertEqual(self.rows('game_event'), 2)
+        game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 7)
+        self.assertEqual(len(game.player_list), 7)
+
+    def test_click_that_changed_nothing_moves_the_version(self):
+        self.click()
+        self.assertRecovered(self.journal.recover(CHANNEL), 1)
+
+    def test_recover_forces_the_board_out(self):
+        self.game.board_fingerprint = 'abc'
+        self.fill(1)
+        self.assertIsNone(self.journal.recover(CHANNEL).board_fingerprint)
+
+    def test_replay_stops_at_the_last_version_that_applies(self):
+        self.fill()
+        self.click(Action(engine.START, None, 42))
+        # logged against rules that allowed it, say
+        self.game.version = 7
+        self.journal.append(CHANNEL, self.game, [Action(engine.JOIN, 'latecomer', 'U9')])
+        self.game.version = 8
+        self.journal.append(CHANNEL, self.game, [Action(engine.LEAVE, 'player0')])
+
+        with self.assertLogs('botcommands.journal', 'WARNING'):
+            game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 6)
+        self.assertEqual(game.game_stage, GameStage.ChooseQuest)
+        self.assertNotIn('latecomer', game.seats)
+        # and the log starts again from there
+        self.assertEqual(self.rows('game_event'), 0)
+        self.assertRecovered(self.journal.recover(CHANNEL), 6)
+
+    def test_replay_drops_a_partly_applied_version(self):
+        self.fill(4)
+        self.click(Action(engine.JOIN, 'player4', 'U4'))
+        self.game.version = 6
+        self.journal.append(CHANNEL, self.game, [Action(engine.JOIN, 'player5', 'U5'),
+                                                 Action(engine.TOGGLE_CHARACTER, None, 'unknown')])
+        with self.assertLogs('botcommands.journal', 'WARNING'):
+            game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 5)
+        self.assertNotIn('player5', game.seats)
+
+    def test_new_game_in_the_channel(self):
+        self.fill(3)
+        self.game = Game()
+        self.game.channel_id = CHANNEL
+        self.journal.append(CHANNEL, self.game, [])
+        self.assertEqual(self.rows('game_event'), 0)
+        game = self.journal.recover(CHANNEL)
+        self.assertRecovered(game, 0)
+        self.assertEqual(game.player_list, [])
+
+    def test_forget(self):
+        self.fill(2)
+        self.journal.forget(CHANNEL, self.game.game_id)
+        self.assertIsNone(self.journal.recover(CHANNEL))
+        self.assertEqual(self.rows('game_event'), 0)
+
+    def test_forget_leaves_a_newer_game(self):
+        old_id = self.game.game_id
+        self.game = Game()
+        self.journal.append(CHANNEL, self.game, [])
+        self.journal.forget(CHANNEL, old_id)
+        self.assertRecovered(self.journal.recover(CHANNEL), 0)
+
+    def test_restore(self):
+        self.fill(2)
+        store = LocalGameStore()
+        self.assertTrue(self.journal.restore(store, CHANNEL))
+        self.assertEqual(list(store.get(CHANNEL).seats), ['player0', 'player1'])
+        self.assertFalse(self.journal.restore(store, 'C2'))
+        self.assertIsNone(store.get('C2'))
+
+    def test_disabled(self):
+        journal = GameJournal(None)
+        journal.append(CHANNEL, self.game, [])
+        self.assertIsNone(journal.recover(CHANNEL))
+        self.assertFalse(journal.restore(LocalGameStore(), CHANNEL))
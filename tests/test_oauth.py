@@ -0,0 +1,39 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.test import TestCase
+
+from oauth.models import Installation
+
+SCRIPT = '<script>alert(1)</script>'
+
+
+class OAuthRedirectTests(TestCase):
+    def start_install(self):
+        response = self.client.get('/oauth/install/')
+        return parse_qs(urlparse(response['Location']).query)['state'][0]
+
+    def assertPlain(self, response):
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+    def test_error_is_not_html(self):
+        response = self.client.get('/oauth/redirect/', {'error': SCRIPT})
+        self.assertEqual(response.status_code, 400)
+        self.assertPlain(response)
+
+    def test_state_must_match(self):
+        self.start_install()
+        response = self.client.get('/oauth/redirect/', {'code': 'c', 'state': 'forged'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Installation.objects.exists())
+
+    def test_installed(self):
+        state = self.start_install()
+        access = mock.Mock(data={'team_id': 'T1', 'team_name': SCRIPT, 'access_token': 'xoxb-1',
+                                 'bot': {'bot_user_id': 'B1', 'bot_access_token': 'xoxb-1'}})
+        with mock.patch('oauth.views.new_client') as new_client:
+            new_client.return_value.oauth_access.return_value = access
+            response = self.client.get('/oauth/redirect/', {'code': 'c', 'state': state})
+        self.assertEqual(response.status_code, 200)
+        self.assertPlain(response)
+        self.assertEqual(Installation.objects.get().bot_token, 'xoxb-1')
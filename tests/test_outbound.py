@@ -0,0 +1,78 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from actions import jobs
+from davalon import outbound
+from davalon.outbound import fan_out
+from davalon.ratelimit import RateLimited
+
+
+class Flaky:
+    """Rate limited ``throttles`` times for each arg in ``limited``, then fine."""
+
+    def __init__(self, limited, throttles=1, retry_after=0.2):
+        self.limited = dict.fromkeys(limited, throttles)
+        self.retry_after = retry_after
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, arg):
+        with self._lock:
+            if self.limited.get(arg):
+                self.limited[arg] = self.limited[arg] - 1
+                raise RateLimited('im.open', self.retry_after)
+            self.sent.append(arg)
+
+
+class FanOutTests(SimpleTestCase):
+    def tearDown(self):
+        outbound.outbound.join()
+
+    def test_throttled_call_is_queued_not_waited_for(self):
+        func = Flaky(['b'], retry_after=0.5)
+        start = time.perf_counter()
+        self.assertEqual(fan_out(func, [('a',), ('b',), ('c',)]), [None, None, None])
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(sorted(func.sent), ['a', 'c'])
+
+        outbound.outbound.join()
+        self.assertEqual(sorted(func.sent), ['a', 'b', 'c'])
+
+    def test_gives_up_when_still_throttled(self):
+        func = Flaky(['b'], throttles=10, retry_after=0.01)
+        missed = []
+        with mock.patch.object(outbound.outbound, 'max_throttles', 2), \
+                self.assertLogs('davalon.outbound', 'ERROR'):
+            fan_out(func, [('a',), ('b',)], on_give_up=lambda args, error: missed.append(args))
+            outbound.outbound.join()
+        self.assertEqual(missed, [('b',)])
+        self.assertEqual(func.sent, ['a'])
+
+    def test_failure(self):
+        def fail(arg):
+            raise ValueError(arg)
+
+        with self.assertLogs('davalon.outbound', 'WARNING'):
+            errors = fan_out(fail, [('a',)], retries=0)
+        self.assertIsInstance(errors[0], ValueError)
+
+
+class RoleMessageTests(SimpleTestCase):
+    def test_throttled_dm_is_reported_if_it_never_goes_out(self):
+        messages = [('U1', 'alice', "you're Merlin"), ('U2', 'bob', "you're the Assassin")]
+
+        def send(team_id, user_id, text):
+            if user_id == 'U2':
+                raise RateLimited('im.open', 0.01)
+
+        with mock.patch.object(jobs, 'send_direct_message', send), \
+                mock.patch.object(jobs, 'post_message') as post_message, \
+                mock.patch.object(outbound.outbound, 'max_throttles', 1), \
+                self.assertLogs('davalon.outbound', 'ERROR'):
+            self.assertEqual(jobs.send_role_messages('T1', 'C1', messages), [])
+            outbound.outbound.join()
+        post_message.assert_called_once_with(
+            'T1', 'C1', "Couldn't send roles to <@bob>, start a new game with `/davalot force`")
@@ -0,0 +1,71 @@
+from django.test import SimpleTestCase
+
+from actions import renderer
+from botcommands import engine
+from botcommands.engine import Action, Character
+from botcommands.models import Game
+from davalon.metrics import RENDER_MEMO_HITS
+from tests.test_board import play_round
+from tests.test_engine import new_game, propose, seated, vote_all
+
+
+def hits():
+    return RENDER_MEMO_HITS.labels().value
+
+
+class RenderMemoTests(SimpleTestCase):
+    def setUp(self):
+        renderer._sections.clear()
+
+    def assertFresh(self, game):
+        """The board rendered with the memo is the one drawn from scratch."""
+        board = renderer.render(game)
+        sections = dict(renderer._sections)
+        renderer._sections.clear()
+        self.assertEqual(board.json, renderer.render(game).json)
+        renderer._sections.update(sections)
+
+    def test_every_stage(self):
+        game = new_game(game_class=Game)
+        self.assertFresh(game)
+        propose(game)
+        self.assertFresh(game)
+        vote_all(game, False)
+        self.assertFresh(game)
+        for round_num in range(3):
+            play_round(game)
+            self.assertFresh(game)
+        assassin = seated(game, Character.Assassin).username
+        engine.apply(game, Action(engine.TOGGLE_TARGET, assassin, seated(game, Character.Merlin).username))
+        self.assertFresh(game)
+        engine.apply(game, Action(engine.ASSASSINATE, assassin))
+        self.assertFresh(game)
+
+    def test_lobby(self):
+        game = Game()
+        self.assertFresh(game)
+        engine.apply(game, Action(engine.JOIN, 'alice', 'U1'))
+        self.assertFresh(game)
+        engine.apply(game, Action(engine.TOGGLE_CHARACTER, None, Character.Percival.id))
+        self.assertFresh(game)
+
+    def test_click_reuses_unchanged_sections(self):
+        game = new_game(game_class=Game)
+        propose(game)
+        first = renderer.render(game)
+        before = hits()
+        engine.apply(game, Action(engine.VOTE, game.player_list[0].username, True))
+        second = renderer.render(game)
+        # nothing on the board changes until the vote is in
+        self.assertEqual(second.fingerprint, first.fingerprint)
+        self.assertEqual(hits() - before, 5)
+
+    def test_new_round_keeps_the_options(self):
+        game = new_game(game_class=Game)
+        renderer.render(game)
+        play_round(game)
+        before = hits()
+        renderer.render(game)
+        # the options, and the empty proposal from the first round
+        self.assertEqual(hits() - before, 2)
+        self.assertFresh(game)
@@ -0,0 +1,65 @@
+from django.test import TestCase
+
+from botcommands import engine
+from botcommands.engine import Action, Character
+from botcommands.models import Game, GameStage
+from stats.models import FinishedGame, PlayerStats
+from stats.records import record_game, summarize
+from tests.test_board import play_round
+from tests.test_engine import new_game, seated
+
+
+def finished_game(good_quests):
+    """A five player game that ends after three quests go evil's way, or three go good's."""
+    game = new_game(game_class=Game)
+    game.team_id = 'T1'
+    game.channel_id = 'C1'
+    for round_num in range(3):
+        play_round(game, good=good_quests)
+    return game
+
+
+def assassinate(game, character):
+    assassin = seated(game, Character.Assassin).username
+    engine.apply(game, Action(engine.TOGGLE_TARGET, assassin, seated(game, character).username))
+    engine.apply(game, Action(engine.ASSASSINATE, assassin))
+
+
+class RecordTests(TestCase):
+    def assassin_stats(self, game):
+        return PlayerStats.objects.values_list('assassinations', 'assassinations_hit').get(
+            user_id=seated(game, Character.Assassin).id)
+
+    def test_merlin_found(self):
+        game = finished_game(good_quests=True)
+        assassinate(game, Character.Merlin)
+        summary = summarize(game)
+        self.assertFalse(summary.good_won)
+        self.assertEqual(summary.assassinated, game.seats[seated(game, Character.Merlin).username])
+        self.assertTrue(record_game(summary))
+        self.assertEqual(self.assassin_stats(game), (1, 1))
+
+    def test_merlin_missed(self):
+        game = finished_game(good_quests=True)
+        assassinate(game, Character.Servant)
+        summary = summarize(game)
+        self.assertTrue(summary.good_won)
+        self.assertTrue(record_game(summary))
+        self.assertEqual(self.assassin_stats(game), (1, 0))
+
+    def test_lost_on_quests_is_no_assassination(self):
+        game = finished_game(good_quests=False)
+        self.assertEqual(game.game_stage, GameStage.Lost)
+        # a target left on a game from before the engine checked the stage
+        game.assassination_target = seated(game, Character.Merlin)
+        summary = summarize(game)
+        self.assertIsNone(summary.assassinated)
+        self.assertTrue(record_game(summary))
+        self.assertIsNone(FinishedGame.objects.get().assassinated)
+        self.assertEqual(self.assassin_stats(game), (0, 0))
+
+    def test_recorded_once(self):
+        game = finished_game(good_quests=False)
+        self.assertTrue(record_game(summarize(game)))
+        self.assertFalse(record_game(summarize(game)))
+        self.assertEqual(PlayerStats.objects.get(user_id=game.player_list[0].id).games, 1)
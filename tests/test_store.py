@@ -0,0 +1,104 @@
+import itertools
+import sys
+import types
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from botcommands.models import Game, User
+from botcommands.store import MemcachedGameStore
+
+CHANNEL = 'C1'
+
+
+class StubClient:
+    """python3-memcached's ``Client`` in front of a dict, down to how it keys cas ids.
+
+    ``gets`` records the cas id under the encoded key while ``cas`` looks it
+    up by the key it is given, and without one ``cas`` is a plain ``set``.
+    """
+
+    servers = {}
+    unique = itertools.count(1)
+
+    def __init__(self, servers, cache_cas=False):
+        self.cache_cas = cache_cas
+        self.cas_ids = {}
+        self.data = self.servers.setdefault(tuple(servers), {})
+
+    def gets(self, key):
+        entry = self.data.get(key.encode())
+        if entry is None:
+            return None
+        value, cas_id = entry
+        if self.cache_cas:
+            self.cas_ids[key.encode()] = cas_id
+        return value
+
+    def set(self, key, val, time=0):
+        self.data[key.encode()] = (val, next(self.unique))
+        return True
+
+    def cas(self, key, val, time=0):
+        if key not in self.cas_ids:
+            return self.set(key, val, time)
+        entry = self.data.get(key.encode())
+        if entry is None or entry[1] != self.cas_ids[key]:
+            return False
+        return self.set(key, val, time)
+
+
+def new_game(message=''):
+    game = Game()
+    game.channel_id = CHANNEL
+    game.seat_players([User({'username': f"player{i}", 'id': f"U{i}"}) for i in range(5)])
+    game.message = message
+    return game
+
+
+class MemcachedGameStoreTests(SimpleTestCase):
+    def setUp(self):
+        StubClient.servers.clear()
+        memcache = types.SimpleNamespace(Client=StubClient)
+        with mock.patch.dict(sys.modules, {'memcache': memcache}):
+            self.store = MemcachedGameStore(['127.0.0.1:11211'])
+            # another worker process, sharing the server
+            self.other = MemcachedGameStore(['127.0.0.1:11211'])
+        self.store.set(CHANNEL, new_game('first'))
+
+    def test_no_game(self):
+        self.assertEqual(self.store.load('C2'), (None, None))
+        self.assertFalse(self.store.save('C2', new_game(), None))
+
+    def test_fresh_token_saves(self):
+        game, token = self.store.load(CHANNEL)
+        self.assertEqual(game.message, 'first')
+        self.assertIsNotNone(token)
+        game.message = 'second'
+        new_token = self.store.save(CHANNEL, game, token)
+        self.assertNotIn(new_token, (False, True))
+        self.assertEqual(self.other.get(CHANNEL).message, 'second')
+
+        # the token handed back is good for the next save
+        game.message = 'third'
+        self.assertTrue(self.store.save(CHANNEL, game, new_token))
+        self.assertEqual(self.other.get(CHANNEL).message, 'third')
+        self.assertEqual(self.store._client.cas_ids, {})
+
+    def test_stale_token_conflicts(self):
+        game, token = self.store.load(CHANNEL)
+        other, other_token = self.other.load(CHANNEL)
+        other.message = 'written elsewhere'
+        self.assertTrue(self.other.save(CHANNEL, other, other_token))
+
+        game.message = 'second'
+        self.assertFalse(self.store.save(CHANNEL, game, token))
+        self.assertEqual(self.store.get(CHANNEL).message, 'written elsewhere')
+
+    def test_token_is_not_left_behind(self):
+        game, token = self.store.load(CHANNEL)
+        self.assertEqual(self.store._client.cas_ids, {})
+        # a later cas without the token would otherwise be checked against it
+        self.store.load(CHANNEL)
+        self.other.set(CHANNEL, new_game('written elsewhere'))
+        self.assertFalse(self.store.save(CHANNEL, game, token))